@@ -9,25 +9,32 @@ import json
 import datetime
 
 import math_util
+import metrics
 import serialization
 
 
-def render_orrery_status(record, render_full):
+@metrics.timed_render
+def render_orrery_status(record, render_full, today=None):
     """
     Render the status of the orrery as a JSON document in a string.
 
     @param record: The orrery status record to serialize to a JSON string.
     @type record: models.OrreryStatus
+    @param today: The date to render as the real date or None for the
+        current date.
+    @type today: datetime.date
     @return: The given record as a JSON document.
     @rtype: str
     """
     orrery_date = math_util.calc_orrery_date(record)
+    if today is None:
+        today = datetime.date.today()
 
     if render_full:
         return json.dumps(
                 {
                     "orrery_date": str(orrery_date),
-                    "real_date": str(datetime.date.today()),
+                    "real_date": str(today),
                     "motor_speed": record.motor_speed,
                     "motor_draw": record.motor_draw,
                     "rotations": record.rotations,
@@ -39,12 +46,13 @@ def render_orrery_status(record, render_full):
         return json.dumps(
             {
                 "orrery_date": str(orrery_date),
-                "real_date": str(datetime.date.today()),
+                "real_date": str(today),
                 "rotations": record.rotations
             }
         )
 
 
+@metrics.timed_render
 def render_orrery_config(record):
     """
     Render the status of the orrery configuration settings as a JSON document.
@@ -55,3 +63,129 @@ def render_orrery_config(record):
     @rtype: str
     """
     return json.dumps(serialization.orrery_config_to_dict(record))
+
+
+@metrics.timed_render
+def render_orrery_status_batch(num_accepted, record):
+    """
+    Render the result of a batch status upload as a JSON document.
+
+    @param num_accepted: The number of status samples recorded.
+    @type num_accepted: int
+    @param record: The orrery status record as persisted after the upload.
+    @type record: models.OrreryStatus
+    @return: JSON document with the number of samples recorded and the
+        current orrery status.
+    @rtype: str
+    """
+    return json.dumps(
+        {
+            "accepted": num_accepted,
+            "status": json.loads(render_orrery_status(record, True))
+        }
+    )
+
+
+@metrics.timed_render
+def render_orrery_sync(status_record, config_record, today=None):
+    """
+    Render the result of a device sync as a JSON document.
+
+    @param status_record: The orrery status record as persisted after the
+        report.
+    @type status_record: models.OrreryStatus
+    @param config_record: The orrery configuration settings or None if the
+        orrery has none.
+    @type config_record: models.OrreryConfig
+    @param today: The date to render as the real date or None for the
+        current date.
+    @type today: datetime.date
+    @return: JSON document with the concise orrery status and the
+        configuration settings.
+    @rtype: str
+    """
+    if config_record is None:
+        config_dict = None
+    else:
+        config_dict = serialization.orrery_config_to_dict(config_record)
+    return json.dumps(
+        {
+            "status": json.loads(
+                render_orrery_status(status_record, False, today)
+            ),
+            "config": config_dict
+        }
+    )
+
+
+@metrics.timed_render
+def render_orrery_status_rollup(start, end, bucket_seconds, rollups):
+    """
+    Render a summary of the orrery status history as a JSON document.
+
+    @param start: The start of the summarized time range.
+    @type start: datetime.datetime
+    @param end: The end of the summarized time range (exclusive).
+    @type end: datetime.datetime
+    @param bucket_seconds: The width of each summarized interval in seconds.
+    @type bucket_seconds: float
+    @param rollups: Summaries of each interval with at least one sample.
+    @type rollups: list of models.OrreryStatusRollup
+    @return: JSON document with the time range and a summary per interval.
+    @rtype: str
+    """
+    buckets = []
+    for rollup in rollups:
+        rollup_dict = serialization.orrery_status_rollup_to_dict(rollup)
+        rollup_dict["bucket_start"] = str(rollup_dict["bucket_start"])
+        buckets.append(rollup_dict)
+
+    return json.dumps(
+        {
+            "start": str(start),
+            "end": str(end),
+            "bucket_seconds": bucket_seconds,
+            "buckets": buckets
+        }
+    )
+
+
+@metrics.timed_render
+def render_orrery_forecast(status_entry, config_entry, step_seconds,
+    forecast):
+    """
+    Render projected orrery dates as a JSON document.
+
+    @param status_entry: The orrery status the forecast starts from.
+    @type status_entry: models.OrreryStatus
+    @param config_entry: The orrery user configuration the forecast assumes.
+    @type config_entry: models.OrreryConfig
+    @param step_seconds: Seconds between projected points.
+    @type step_seconds: float
+    @param forecast: The projected times, rotations, and orrery dates.
+    @type forecast: forecast.OrreryForecast
+    @return: JSON document with the forecast basis and a list of points.
+    @rtype: str
+    """
+    points = [
+        {
+            "datetime": str(point_datetime),
+            "rotations": rotations,
+            "orrery_date": str(orrery_date)
+        }
+        for (point_datetime, rotations, orrery_date) in zip(
+            forecast.datetimes.tolist(),
+            forecast.rotations.tolist(),
+            forecast.orrery_dates.tolist()
+        )
+    ]
+
+    return json.dumps(
+        {
+            "update_datetime": str(status_entry.update_datetime),
+            "rotations": status_entry.rotations,
+            "motor_speed": config_entry.motor_speed,
+            "step_seconds": step_seconds,
+            "points": points
+        }
+    )
@@ -15,3 +15,74 @@ DB_NAME = os.environ.get("DATABASE_NAME", "dev")
 
 DEFAULT_RELAY_STATUS = False
 DEFAULT_ORRERY_CONFIG_SPEED = 400
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", 300))
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 60))
+DB_PREPARED_STATEMENTS = os.environ.get("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+HISTORY_INSERT_CHUNK_SIZE = int(os.environ.get("HISTORY_INSERT_CHUNK_SIZE", 1000))
+HISTORY_BATCH_SIZE = int(os.environ.get("HISTORY_BATCH_SIZE", 500))
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", 1))
+HISTORY_MAX_PENDING = int(os.environ.get("HISTORY_MAX_PENDING", 50000))
+
+STATUS_WRITE_BEHIND = os.environ.get("STATUS_WRITE_BEHIND", "false").lower() == "true"
+STATUS_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("STATUS_WRITE_BEHIND_BATCH_SIZE", 20))
+STATUS_WRITE_BEHIND_INTERVAL = float(os.environ.get("STATUS_WRITE_BEHIND_INTERVAL", 0.5))
+STATUS_WRITE_BEHIND_MAX_PENDING = int(os.environ.get("STATUS_WRITE_BEHIND_MAX_PENDING", 1000))
+STATUS_WRITE_BEHIND_TIMEOUT = float(os.environ.get("STATUS_WRITE_BEHIND_TIMEOUT", 5))
+
+CONFIG_CACHE_TTL = float(os.environ.get("CONFIG_CACHE_TTL", 30))
+CONFIG_CACHE_LISTEN = os.environ.get("CONFIG_CACHE_LISTEN", "true").lower() == "true"
+CONFIG_CACHE_LISTEN_POLL = float(os.environ.get("CONFIG_CACHE_LISTEN_POLL", 5))
+CONFIG_CACHE_LISTEN_RETRY = float(os.environ.get("CONFIG_CACHE_LISTEN_RETRY", 5))
+CONFIG_CACHE_LOAD_WAIT = float(os.environ.get("CONFIG_CACHE_LOAD_WAIT", 1))
+CONFIG_LONG_POLL_MAX_WAIT = float(os.environ.get("CONFIG_LONG_POLL_MAX_WAIT", 30))
+
+STATUS_RESPONSE_CACHE = os.environ.get("STATUS_RESPONSE_CACHE", "true").lower() == "true"
+
+STATUS_BATCH_MAX_SAMPLES = int(os.environ.get("STATUS_BATCH_MAX_SAMPLES", 20000))
+
+GEVENT_MAX_CONCURRENT_REQUESTS = int(os.environ.get("GEVENT_MAX_CONCURRENT_REQUESTS", 1000))
+
+HISTORY_DEFAULT_RANGE = float(os.environ.get("HISTORY_DEFAULT_RANGE", 86400))
+HISTORY_EXPORT_FETCH_SIZE = int(os.environ.get("HISTORY_EXPORT_FETCH_SIZE", 2000))
+ROLLUP_DEFAULT_BUCKET = float(os.environ.get("ROLLUP_DEFAULT_BUCKET", 60))
+ROLLUP_MAX_BUCKETS = int(os.environ.get("ROLLUP_MAX_BUCKETS", 10000))
+
+FORECAST_ROTATIONS_PER_SPEED_HOUR = float(os.environ.get("FORECAST_ROTATIONS_PER_SPEED_HOUR", 0.001))
+FORECAST_DEFAULT_RANGE = float(os.environ.get("FORECAST_DEFAULT_RANGE", 86400))
+FORECAST_DEFAULT_STEP = float(os.environ.get("FORECAST_DEFAULT_STEP", 3600))
+FORECAST_MAX_POINTS = int(os.environ.get("FORECAST_MAX_POINTS", 10000))
+FORECAST_CACHE_MAX_ENTRIES = int(os.environ.get("FORECAST_CACHE_MAX_ENTRIES", 64))
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "postgres")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "orrery.db")
+SQLITE_TIMEOUT = float(os.environ.get("SQLITE_TIMEOUT", 30))
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", 5))
+METRICS_BUCKETS = os.environ.get("METRICS_BUCKETS", "0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10")
+
+QUERY_TRACE_ENABLED = os.environ.get("QUERY_TRACE_ENABLED", "false").lower() == "true"
+QUERY_TRACE_SLOW_SECONDS = float(os.environ.get("QUERY_TRACE_SLOW_SECONDS", 0.1))
+QUERY_TRACE_EXPLAIN_RATE = float(os.environ.get("QUERY_TRACE_EXPLAIN_RATE", 0))
+
+DEFAULT_ORRERY_ID = int(os.environ.get("DEFAULT_ORRERY_ID", 1))
+
+HISTORY_PARTITION_PERIOD = os.environ.get("HISTORY_PARTITION_PERIOD", "day")
+HISTORY_PARTITIONS_AHEAD = int(os.environ.get("HISTORY_PARTITIONS_AHEAD", 3))
+HISTORY_RAW_RETENTION_DAYS = float(os.environ.get("HISTORY_RAW_RETENTION_DAYS", 30))
+HISTORY_COMPACT_BUCKET = float(os.environ.get("HISTORY_COMPACT_BUCKET", 3600))
+HISTORY_COMPACT_RETENTION_DAYS = float(os.environ.get("HISTORY_COMPACT_RETENTION_DAYS", 365))
+HISTORY_MAINTENANCE = os.environ.get("HISTORY_MAINTENANCE", "true").lower() == "true"
+HISTORY_MAINTENANCE_INTERVAL = float(os.environ.get("HISTORY_MAINTENANCE_INTERVAL", 3600))
+
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ENCODINGS = os.environ.get("COMPRESSION_ENCODINGS", "zstd,gzip")
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", 3))
@@ -0,0 +1,346 @@
+"""
+Per-process cache of the orrery user configuration.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2.extensions
+
+import config
+import models
+import sql_statements
+
+
+logger = logging.getLogger(__name__)
+
+
+# Named tuple to model a cached user configuration record, its version, and
+# when it was read.
+CachedOrreryConfig = collections.namedtuple(
+    "CachedOrreryConfig",
+    [
+        "config",
+        "version",
+        "loaded_at"
+    ]
+)
+
+
+class OrreryConfigCache:
+    """
+    Cache of each orrery's user configuration shared by a process' threads.
+
+    Entries are kept per orrery ID and expire after a fixed time to live. When
+    listening is enabled, a background thread also listens for change
+    notifications sent by other processes through PostgreSQL LISTEN / NOTIFY
+    and drops the changed orrery's entry as soon as one arrives, so the time to
+    live only bounds staleness while the listener is disconnected.
+    """
+
+    def __init__(self, load_func, ttl, listen):
+        """
+        Create a new, empty configuration cache.
+
+        @param load_func: Function that reads the OrreryConfig of an orrery
+            ID from the database.
+        @type load_func: function
+        @param ttl: Maximum number of seconds an entry is served.
+        @type ttl: float
+        @param listen: True if change notifications should be listened for and
+            False otherwise.
+        @type listen: bool
+        """
+        self.load_func = load_func
+        self.ttl = ttl
+        self.listen = listen
+
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.entries = {}
+        self.generation = 0
+        self.loading = set()
+        self.listener_pid = None
+        self.listener_connected = False
+
+        self.num_waiting = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_invalidations = 0
+        self.num_notifications = 0
+        self.num_listener_errors = 0
+        self.max_served_age = 0.0
+        self.last_notify_delay = None
+        self.max_notify_delay = 0.0
+
+    def ensure_listener(self):
+        """
+        Start the notification listener thread for this process if needed.
+
+        @note: Must be called with the cache lock held.
+        """
+        if not self.listen:
+            return
+        pid = os.getpid()
+        if self.listener_pid == pid:
+            return
+        self.listener_pid = pid
+        self.listener_connected = False
+        listener = threading.Thread(target=self.run_listener)
+        listener.daemon = True
+        listener.start()
+
+    def get(self, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Get an orrery's user configuration, reading it only if not cached.
+
+        @param orrery_id: The orrery to get the configuration of.
+        @type orrery_id: int
+        @return: Record of the orrery system user configuration.
+        @rtype: models.OrreryConfig
+        """
+        return self.get_versioned(orrery_id)[0]
+
+    def get_versioned(self, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Get an orrery's user configuration and its version.
+
+        @param orrery_id: The orrery to get the configuration of.
+        @type orrery_id: int
+        @return: Tuple of the user configuration record and its version as
+            given by models.get_orrery_config_version.
+        @rtype: tuple
+        """
+        now = time.time()
+        with self.lock:
+            self.ensure_listener()
+            while True:
+                entry = self.entries.get(orrery_id)
+                if entry is not None and now - entry.loaded_at < self.ttl:
+                    self.num_hits += 1
+                    self.max_served_age = max(
+                        self.max_served_age,
+                        now - entry.loaded_at
+                    )
+                    return (entry.config, entry.version)
+                if orrery_id not in self.loading:
+                    break
+                self.changed.wait(config.CONFIG_CACHE_LOAD_WAIT)
+                now = time.time()
+            self.loading.add(orrery_id)
+            self.num_misses += 1
+            generation = self.generation
+
+        entry = None
+        try:
+            entry = self.create_entry(self.load_func(orrery_id), now)
+        finally:
+            with self.lock:
+                self.loading.discard(orrery_id)
+                if entry is not None and self.generation == generation:
+                    self.entries[orrery_id] = entry
+                self.changed.notify_all()
+        return (entry.config, entry.version)
+
+    def wait_for_change(self, is_known_version, timeout,
+        orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Block until an orrery's configuration differs from the client's copy.
+
+        Waiting threads do not hold database connections. When the cached entry
+        is invalidated, a single waiting thread reads the new configuration and
+        the others are served from the cache.
+
+        @param is_known_version: Function taking a configuration version that
+            returns True if the client already has that version.
+        @type is_known_version: function
+        @param timeout: Maximum number of seconds to wait.
+        @type timeout: float
+        @param orrery_id: The orrery to wait on the configuration of.
+        @type orrery_id: int
+        @return: Tuple of the user configuration record and its version. The
+            version is still known to the client if the timeout expired.
+        @rtype: tuple
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            self.num_waiting += 1
+        try:
+            while True:
+                (config_entry, version) = self.get_versioned(orrery_id)
+                if not is_known_version(version):
+                    return (config_entry, version)
+
+                with self.lock:
+                    entry = self.entries.get(orrery_id)
+                    if entry is None or entry.version != version:
+                        continue
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return (config_entry, version)
+                    self.changed.wait(min(remaining, self.ttl))
+        finally:
+            with self.lock:
+                self.num_waiting -= 1
+
+    def create_entry(self, config_entry, loaded_at):
+        """
+        Create a cache entry for a user configuration record.
+
+        @param config_entry: The user configuration record to cache.
+        @type config_entry: models.OrreryConfig
+        @param loaded_at: Time at which the record was read.
+        @type loaded_at: float
+        @return: The new cache entry.
+        @rtype: CachedOrreryConfig
+        """
+        if config_entry is None:
+            version = None
+        else:
+            version = models.get_orrery_config_version(config_entry)
+        return CachedOrreryConfig(config_entry, version, loaded_at)
+
+    def set(self, config_entry, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Replace the cached entry after this process changed the configuration.
+
+        @param config_entry: Record of the user configuration as persisted.
+        @type config_entry: models.OrreryConfig
+        @param orrery_id: The orrery the configuration belongs to.
+        @type orrery_id: int
+        """
+        entry = self.create_entry(config_entry, time.time())
+        with self.lock:
+            self.generation += 1
+            self.entries[orrery_id] = entry
+            self.changed.notify_all()
+
+    def invalidate(self, orrery_id=None):
+        """
+        Drop cached entries so that the next reads go to the database.
+
+        @param orrery_id: The orrery to drop the entry of or None to drop the
+            entries of every orrery.
+        @type orrery_id: int
+        """
+        with self.lock:
+            self.generation += 1
+            if orrery_id is None:
+                self.entries = {}
+            else:
+                self.entries.pop(orrery_id, None)
+            self.num_invalidations += 1
+            self.changed.notify_all()
+
+    def handle_notification(self, notify):
+        """
+        Drop cached entries in response to a change notification.
+
+        Payloads name the changed orrery before a colon, leaving it empty if
+        every orrery changed. Payloads holding only a time are treated as a
+        change to every orrery.
+
+        @param notify: The notification received from the database.
+        @type notify: psycopg2.extensions.Notify
+        """
+        (orrery_id, unused_sep, sent_at) = notify.payload.rpartition(":")
+        try:
+            orrery_id = int(orrery_id)
+        except ValueError:
+            orrery_id = None
+        self.invalidate(orrery_id)
+        try:
+            delay = time.time() - float(sent_at)
+        except ValueError:
+            delay = None
+        with self.lock:
+            self.num_notifications += 1
+            if delay is not None:
+                self.last_notify_delay = delay
+                self.max_notify_delay = max(self.max_notify_delay, delay)
+
+    def listen_once(self):
+        """
+        Connect to the database and handle notifications until an error.
+
+        The cache is invalidated once listening starts because changes made
+        while disconnected were not seen.
+        """
+        conn = models.open_db_connection()
+        try:
+            conn.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            cursor = conn.cursor()
+            cursor.execute(sql_statements.LISTEN_ORRERY_CONFIG_SQL)
+            with self.lock:
+                self.listener_connected = True
+            self.invalidate()
+
+            while True:
+                select.select([conn], [], [], config.CONFIG_CACHE_LISTEN_POLL)
+                conn.poll()
+                while conn.notifies:
+                    self.handle_notification(conn.notifies.pop(0))
+        finally:
+            with self.lock:
+                self.listener_connected = False
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def run_listener(self):
+        """Listen for change notifications, reconnecting after errors."""
+        while True:
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception("Config change listener disconnected.")
+                with self.lock:
+                    self.num_listener_errors += 1
+            self.invalidate()
+            time.sleep(config.CONFIG_CACHE_LISTEN_RETRY)
+
+    def get_stats(self):
+        """
+        Get cache effectiveness and staleness statistics.
+
+        @return: Dictionary of cache statistics for this process.
+        @rtype: dict
+        """
+        with self.lock:
+            if self.entries:
+                oldest_load = min(x.loaded_at for x in self.entries.values())
+                entry_age = time.time() - oldest_load
+            else:
+                entry_age = None
+            return {
+                "entries": len(self.entries),
+                "waiting": self.num_waiting,
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "invalidations": self.num_invalidations,
+                "notifications": self.num_notifications,
+                "listener_connected": self.listener_connected,
+                "listener_errors": self.num_listener_errors,
+                "entry_age": entry_age,
+                "max_served_age": self.max_served_age,
+                "last_notify_delay": self.last_notify_delay,
+                "max_notify_delay": self.max_notify_delay
+            }
+
+
+# Process-wide cache of the orrery user configuration
+orrery_config_cache = OrreryConfigCache(
+    models.read_orrery_config,
+    config.CONFIG_CACHE_TTL,
+    config.CONFIG_CACHE_LISTEN and config.STORAGE_BACKEND == "postgres"
+)
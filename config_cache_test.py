@@ -0,0 +1,118 @@
+"""
+Tests for the per-process orrery user configuration cache.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import threading
+import time
+import unittest
+
+import config_cache
+import models
+
+
+# Stand-in for a psycopg2 notification.
+FakeNotify = collections.namedtuple("FakeNotify", ["channel", "payload"])
+
+
+class TestOrreryConfigCache(unittest.TestCase):
+    """Test hits, expiry, and invalidation of the cached configuration."""
+
+    def setUp(self):
+        self.stored_config = models.OrreryConfig(400, True)
+        self.num_loads = 0
+        self.cache = config_cache.OrreryConfigCache(self.load, 3600, False)
+
+    def load(self, orrery_id):
+        self.num_loads += 1
+        if orrery_id != models.DEFAULT_ORRERY_ID:
+            return models.OrreryConfig(orrery_id, False)
+        return self.stored_config
+
+    def test_hit(self):
+        self.assertEqual(self.cache.get(), self.stored_config)
+        self.assertEqual(self.cache.get(), self.stored_config)
+        self.assertEqual(self.num_loads, 1)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_ttl(self):
+        self.cache.ttl = 0
+        self.cache.get()
+        self.cache.get()
+        self.assertEqual(self.num_loads, 2)
+
+    def test_notification(self):
+        self.cache.get()
+        self.stored_config = models.OrreryConfig(300, False)
+        self.cache.handle_notification(FakeNotify("", "%.6f" % time.time()))
+        self.assertEqual(self.cache.get(), self.stored_config)
+        self.assertEqual(self.cache.get_stats()["notifications"], 1)
+
+    def test_orrery_notification(self):
+        self.cache.get()
+        self.cache.get(2)
+        self.cache.handle_notification(FakeNotify("", "2:%.6f" % time.time()))
+        self.cache.get()
+        self.cache.get(2)
+        self.assertEqual(self.num_loads, 3)
+
+        self.cache.handle_notification(FakeNotify("", ":%.6f" % time.time()))
+        self.cache.get()
+        self.cache.get(2)
+        self.assertEqual(self.num_loads, 5)
+        self.assertTrue(self.cache.get_stats()["last_notify_delay"] < 5)
+
+    def test_fleet(self):
+        self.assertEqual(self.cache.get(2), models.OrreryConfig(2, False))
+        self.assertEqual(self.cache.get(), self.stored_config)
+        self.cache.invalidate(2)
+        self.cache.get()
+        self.assertEqual(self.num_loads, 2)
+        self.assertEqual(self.cache.get_stats()["entries"], 1)
+
+    def test_set(self):
+        self.cache.get()
+        new_config = models.OrreryConfig(300, False)
+        self.cache.set(new_config)
+        self.assertEqual(self.cache.get(), new_config)
+        self.assertEqual(self.num_loads, 1)
+
+    def test_wait_timeout(self):
+        version = self.cache.get_versioned()[1]
+        start = time.time()
+        (config_entry, new_version) = self.cache.wait_for_change(
+            lambda x: x == version,
+            0.05
+        )
+        self.assertEqual(new_version, version)
+        self.assertTrue(time.time() - start >= 0.05)
+
+    def test_wait_for_change(self):
+        version = self.cache.get_versioned()[1]
+        new_config = models.OrreryConfig(300, False)
+        results = []
+
+        def wait():
+            results.append(self.cache.wait_for_change(
+                lambda x: x == version,
+                5
+            ))
+
+        waiters = [threading.Thread(target=wait) for i in range(20)]
+        for waiter in waiters:
+            waiter.start()
+
+        self.stored_config = new_config
+        self.cache.invalidate()
+        for waiter in waiters:
+            waiter.join()
+
+        self.assertEqual([x[0] for x in results], [new_config] * 20)
+        self.assertEqual(self.num_loads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,38 +7,201 @@ Controllers that handle web requests for both the API and human interfaces.
 
 import datetime
 import json
+import math
 import os
+import time
 
 import flask
 
 import api_view
+import config
+import config_cache
+import device_protocol
+import forecast
+import history_export
+import history_partitions
+import history_retention
+import http_cache
 import math_util
+import metrics
 import models
+import query_trace
+import response_compression
 import serialization
+import status_batch
+import status_history
+import status_response_cache
+import status_write_behind
 
 
 app = flask.Flask(__name__)
 app.debug = True
+app.url_map.redirect_defaults = False
 
+# URL rule segment naming one orrery of the fleet
+ORRERY_ID_RULE = "<int(min=1, max=%d):orrery_id>" % models.MAX_ORRERY_ID
 
-@app.route("/api/concise_status.json")
-def api_simple_status():
+# Route defaults for the original URLs, which serve the default orrery
+DEFAULT_ORRERY_ROUTE = {"orrery_id": models.DEFAULT_ORRERY_ID}
+
+
+@app.before_request
+def start_request_metrics():
+    """Begin timing the request for /metrics."""
+    metrics.start_request()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """
+    Record the request's route, status, and duration for /metrics.
+
+    @param response: The response being sent.
+    @type response: flask.Response
+    @return: The given response.
+    @rtype: flask.Response
+    """
+    metrics.finish_request(
+        get_metrics_route(),
+        flask.request.method,
+        response.status_code
+    )
+    return response
+
+
+@app.teardown_request
+def finish_failed_request_metrics(exception=None):
+    """
+    Record requests that failed with an unhandled exception for /metrics.
+
+    @param exception: The unhandled exception or None.
+    @type exception: Exception
+    """
+    if exception is not None:
+        metrics.finish_request(get_metrics_route(), flask.request.method, 500)
+
+
+@app.before_request
+def start_query_trace():
+    """Begin collecting the statements run for the request if tracing."""
+    query_trace.start_request(flask.request.path)
+
+
+@app.teardown_request
+def finish_query_trace(exception=None):
+    """
+    Log the statements run for the request if tracing.
+
+    @param exception: The unhandled exception or None.
+    @type exception: Exception
+    """
+    query_trace.finish_request()
+
+
+@app.before_request
+def start_history_maintenance():
+    """Start the status history retention job in this process if enabled."""
+    if config.HISTORY_MAINTENANCE:
+        history_retention.history_maintenance.ensure_runner()
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compress large and streamed responses if the client accepts it.
+
+    @param response: The response being sent.
+    @type response: flask.Response
+    @return: The given response, compressed if negotiated.
+    @rtype: flask.Response
+    """
+    return response_compression.compress_response(
+        flask.request,
+        response,
+        get_metrics_route()
+    )
+
+
+def get_metrics_route():
+    """
+    Get the route to report the current request under.
+
+    @return: The matched URL rule so that paths with parameters share one
+        series, or "unmatched" if no rule matched.
+    @rtype: str
+    """
+    if flask.request.url_rule is None:
+        return "unmatched"
+    return flask.request.url_rule.rule
+
+
+def render_conditional_status(orrery_status, render_full, orrery_id):
+    """
+    Render the orrery status unless the client already has the current copy.
+
+    The validators are derived from the record so a 304 is answered without
+    rendering. Otherwise the encoded document is served from the status
+    response cache if this process already rendered it for the same status
+    today.
+
+    @param orrery_status: The orrery status record to render.
+    @type orrery_status: models.OrreryStatus
+    @param render_full: True if the full status should be rendered and False
+        if the concise status should be rendered.
+    @type render_full: bool
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @return: Response with the rendered status or an empty 304 response.
+    @rtype: flask.Response
+    """
+    today = datetime.date.today()
+    etag = http_cache.get_status_etag(orrery_status, render_full, today)
+    last_modified = http_cache.get_status_last_modified(orrery_status, today)
+
+    if http_cache.is_not_modified(flask.request, etag, last_modified):
+        return http_cache.create_not_modified_response(etag, last_modified)
+
+    rendered = status_response_cache.status_response_cache.get(
+        orrery_status,
+        render_full,
+        today,
+        orrery_id
+    )
+    return http_cache.create_validated_response(
+        rendered.body,
+        rendered.etag,
+        rendered.last_modified
+    )
+
+
+@app.route("/api/concise_status.json", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/concise_status.json" % ORRERY_ID_RULE)
+def api_simple_status(orrery_id):
     """
     Render a summary subset of the orrery system status.
 
     Render a subset of the orrery system status that includes the current date
     on the server, the number of rotations, and the "Earth" date in the orrery
-    display given that rotation count.
+    display given that rotation count. Supports conditional requests through
+    If-None-Match and If-Modified-Since.
 
+    @param orrery_id: The orrery to render the status of.
+    @type orrery_id: int
     @return: JSON document as a string containing the simple status summary.
     @rtype: str
     """
-    orrery_status = models.read_orrery_status()
-    return api_view.render_orrery_status(orrery_status, False)
+    orrery_status = status_write_behind.read_orrery_status(orrery_id)
+    if orrery_status:
+        return render_conditional_status(orrery_status, False, orrery_id)
+    else:
+        flask.abort(404)
 
 
-@app.route("/api/status.json", methods=["GET", "POST"])
-def api_full_status():
+@app.route("/api/status.json", methods=["GET", "POST"],
+    defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/status.json" % ORRERY_ID_RULE,
+    methods=["GET", "POST"])
+def api_full_status(orrery_id):
     """
     API endpoint to read and update the orrery system status.
 
@@ -46,51 +209,430 @@ def api_full_status():
     motor draw, and number of orrery shaft rotations as form parameters if a
     POST (encoded as motor_speed, motor_draw, and rotations respectively). All
     paramters on a GET request are ignored. POST updates and GET reads current
-    state.
-
+    state. A GET supports conditional requests through If-None-Match and
+    If-Modified-Since. A POST creates the status entry if needed and otherwise keeps its
+    original start date, all in a single database statement. If write-behind is
+    enabled, the POST is acknowledged before the status reaches the database
+    and fails with 503 if too many reports are waiting to be written. Reported
+    statuses are also queued for batched writes to the status history.
+
+    @param orrery_id: The orrery to read or update the status of.
+    @type orrery_id: int
     @return: JSON document with orrery system status. Will reflect changes from
         update if POST.
     @rtype: str
     """
     if flask.request.method == "GET":
-        orrery_status = models.read_orrery_status()
+        orrery_status = status_write_behind.read_orrery_status(orrery_id)
         if orrery_status:
-            return api_view.render_orrery_status(orrery_status, True)
+            return render_conditional_status(orrery_status, True, orrery_id)
         else:
             flask.abort(404)
 
     else:
-        old_status_entry = models.read_orrery_status()
-    
-        motor_speed = float(flask.request.form["motor_speed"])
-        motor_draw = float(flask.request.form["motor_draw"])
-        rotations = float(flask.request.form["rotations"])
+        try:
+            stored_status_entry = status_write_behind.store_orrery_status(
+                read_status_report(),
+                orrery_id
+            )
+        except status_write_behind.WriteBehindFullError:
+            flask.abort(503)
+        finish_status_report(stored_status_entry, orrery_id)
 
-        status_entry_exists = old_status_entry != None
+        return api_view.render_orrery_status(stored_status_entry, True)
 
-        if status_entry_exists:
-            start_date = old_status_entry.start_date
-        else:
-            start_date = datetime.date.today()
-        
-        new_status_entry = models.OrreryStatus(
-            motor_speed,
-            motor_draw,
-            rotations,
-            start_date,
-            datetime.datetime.now()
+
+def read_status_report():
+    """
+    Read a status report from the motor_speed, motor_draw, and rotations form
+    parameters.
+
+    @return: Record of the reported status updated now.
+    @rtype: models.OrreryStatus
+    """
+    return models.OrreryStatus(
+        float(flask.request.form["motor_speed"]),
+        float(flask.request.form["motor_draw"]),
+        float(flask.request.form["rotations"]),
+        datetime.date.today(),
+        datetime.datetime.now()
+    )
+
+
+def finish_status_report(stored_status_entry, orrery_id):
+    """
+    Update caches and queue the history sample after a status report.
+
+    @param stored_status_entry: Record of the orrery status as persisted.
+    @type stored_status_entry: models.OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    """
+    status_response_cache.status_response_cache.invalidate(orrery_id)
+    status_history.history_buffer.append(stored_status_entry, orrery_id)
+
+
+def sync_status_report(orrery_id):
+    """
+    Record the status report of the current request and read the orrery's
+    user configuration.
+
+    Without write-behind, both happen in a single database statement. With
+    write-behind, the report is buffered and the configuration is served
+    from the configuration cache so the database is not touched.
+
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @return: Tuple of the orrery status as persisted (or as it will be
+        persisted) and the user configuration, which is None if the orrery
+        has none.
+    @rtype: tuple
+    """
+    new_status_entry = read_status_report()
+    if config.STATUS_WRITE_BEHIND:
+        try:
+            stored_status_entry = status_write_behind.store_orrery_status(
+                new_status_entry,
+                orrery_id
+            )
+        except status_write_behind.WriteBehindFullError:
+            flask.abort(503)
+        config_entry = config_cache.orrery_config_cache.get(orrery_id)
+    else:
+        (stored_status_entry, config_entry) = models.sync_orrery_status(
+            new_status_entry,
+            orrery_id
         )
+    finish_status_report(stored_status_entry, orrery_id)
+    return (stored_status_entry, config_entry)
 
-        if status_entry_exists:
-            models.update_orrery_status(new_status_entry)
-        else:
-            models.create_orrery_status(new_status_entry)
 
-        return api_view.render_orrery_status(new_status_entry, True)
+@app.route("/api/sync.json", methods=["POST"], defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/sync.json" % ORRERY_ID_RULE, methods=["POST"])
+def api_sync(orrery_id):
+    """
+    API endpoint for a device to report its status and get its configuration.
+
+    Takes the same form parameters as a POST to /api/status.json and records
+    the status the same way, but answers with the concise status and the
+    current user configuration so that a device needs one request per cycle
+    instead of two. The status and configuration are written and read in one
+    database statement unless write-behind is enabled.
+
+    @param orrery_id: The orrery reporting its status.
+    @type orrery_id: int
+    @return: JSON document with the concise status and the configuration,
+        which is null if the orrery has no configuration.
+    @rtype: str
+    """
+    (status_entry, config_entry) = sync_status_report(orrery_id)
+    return api_view.render_orrery_sync(status_entry, config_entry)
+
+
+def is_known_config_version(config_version):
+    """
+    Determine if the requesting client already has a configuration version.
+
+    @param config_version: The configuration version to check.
+    @type config_version: str
+    @return: True if the client reported having this version and False
+        otherwise.
+    @rtype: bool
+    """
+    known_version = flask.request.args.get("version", None)
+    if known_version != None:
+        return known_version == config_version
+    etag = http_cache.get_config_etag(config_version)
+    return http_cache.is_not_modified(flask.request, etag)
+
+
+@app.route("/api/status_batch.json", methods=["POST"],
+    defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/status_batch.json" % ORRERY_ID_RULE,
+    methods=["POST"])
+def api_status_batch(orrery_id):
+    """
+    API endpoint to upload many timestamped orrery status samples at once.
+
+    Accepts either a newline delimited JSON body (Content-Type
+    application/x-ndjson) with one object per sample or form parameters
+    repeated once per sample. Each sample needs motor_speed, motor_draw,
+    rotations, and update_datetime (seconds since the epoch or local
+    "YYYY-MM-DD HH:MM:SS"). All samples are validated before any are written
+    and are then recorded in one transaction. The newest sample becomes the
+    current status unless a newer status was already reported.
+
+    @param orrery_id: The orrery the samples belong to.
+    @type orrery_id: int
+    @return: JSON document with the number of samples recorded and the current
+        orrery system status.
+    @rtype: str
+    """
+    try:
+        statuses = status_batch.parse_status_batch(flask.request)
+    except status_batch.StatusBatchError:
+        flask.abort(400)
+
+    stored_status_entry = models.ingest_orrery_status_batch(
+        statuses,
+        orrery_id
+    )
+    status_response_cache.status_response_cache.invalidate(orrery_id)
+    return api_view.render_orrery_status_batch(
+        len(statuses),
+        stored_status_entry
+    )
+
+
+def parse_history_range():
+    """
+    Read the requested status history time range from the query parameters.
+
+    Reads start and end parameters in any format accepted for update_datetime
+    by status_batch. The range defaults to the config.HISTORY_DEFAULT_RANGE
+    seconds ending now.
+
+    @return: Tuple of the start and (exclusive) end of the range.
+    @rtype: tuple
+    @raises ValueError: Raised if a parameter is malformed or out of range or
+        the range is empty.
+    """
+    end = flask.request.args.get("end", None)
+    if end == None:
+        end = datetime.datetime.now()
+    else:
+        end = status_batch.parse_update_datetime(end)
+
+    start = flask.request.args.get("start", None)
+    if start == None:
+        try:
+            start = end - datetime.timedelta(
+                seconds=config.HISTORY_DEFAULT_RANGE
+            )
+        except OverflowError:
+            raise ValueError("History range starts out of range.")
+    else:
+        start = status_batch.parse_update_datetime(start)
+
+    if start >= end:
+        raise ValueError("History range is empty.")
+    return (start, end)
+
+
+@app.route("/api/history/rollup.json", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/history/rollup.json" % ORRERY_ID_RULE)
+def api_history_rollup(orrery_id):
+    """
+    API endpoint to summarize the orrery status history over time.
+
+    Summarizes status samples between the start and end query parameters
+    (defaulting to the last day) in intervals of bucket seconds (defaulting to
+    config.ROLLUP_DEFAULT_BUCKET). Every interval with at least one sample
+    reports the sample count and the minimum, maximum, and mean motor speed,
+    motor draw, and rotations. History older than
+    config.HISTORY_RAW_RETENTION_DAYS is only kept compacted, so intervals
+    that old are built from the compacted summaries.
+
+    @param orrery_id: The orrery to summarize the status history of.
+    @type orrery_id: int
+    @return: JSON document with the time range and a summary per interval.
+    @rtype: str
+    """
+    try:
+        (start, end) = parse_history_range()
+        bucket_seconds = float(
+            flask.request.args.get("bucket", config.ROLLUP_DEFAULT_BUCKET)
+        )
+    except ValueError:
+        flask.abort(400)
+
+    if bucket_seconds <= 0 or math.isnan(bucket_seconds) or \
+        math.isinf(bucket_seconds):
+        flask.abort(400)
+    num_buckets = (end - start).total_seconds() / bucket_seconds
+    if num_buckets > config.ROLLUP_MAX_BUCKETS:
+        flask.abort(400)
+
+    rollups = models.rollup_orrery_status_history(
+        start,
+        end,
+        bucket_seconds,
+        orrery_id
+    )
+    raw_cutoff = history_partitions.get_retention_cutoffs(
+        datetime.datetime.now()
+    )[0]
+    if start < raw_cutoff:
+        compacted = models.read_compacted_orrery_status_history(
+            start,
+            end,
+            orrery_id
+        )
+        rollups = models.merge_orrery_status_rollups(
+            compacted + rollups,
+            start,
+            bucket_seconds
+        )
+    return api_view.render_orrery_status_rollup(
+        start,
+        end,
+        bucket_seconds,
+        rollups
+    )
+
+
+@app.route("/api/history/export.<export_format>",
+    defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/history/export.<export_format>" % ORRERY_ID_RULE)
+def api_history_export(export_format, orrery_id):
+    """
+    API endpoint to download the orrery status history.
+
+    Streams every status sample between the start and end query parameters
+    (defaulting to the last day) as CSV (export.csv) with a header row or as
+    newline delimited JSON (export.ndjson). Samples are read in chunks while
+    the response is written so memory use does not depend on the range.
+
+    @param export_format: Either "csv" or "ndjson".
+    @type export_format: str
+    @param orrery_id: The orrery to export the status history of.
+    @type orrery_id: int
+    @return: Streamed response with one line per sample ordered by time.
+    @rtype: flask.Response
+    """
+    if export_format not in history_export.ENCODERS:
+        flask.abort(404)
+
+    try:
+        (start, end) = parse_history_range()
+    except ValueError:
+        flask.abort(400)
+
+    statuses = models.stream_orrery_status_history(start, end, orrery_id)
+    response = flask.Response(
+        history_export.ENCODERS[export_format](statuses),
+        content_type=history_export.CONTENT_TYPES[export_format]
+    )
+    response.headers["Content-Disposition"] = \
+        "attachment; filename=orrery_history.%s" % export_format
+    return response
+
+
+def parse_forecast_range():
+    """
+    Read the requested forecast times from the query parameters.
+
+    Reads start, end, and step parameters with times in any format accepted
+    for update_datetime by status_batch. The start defaults to now rounded
+    down to a multiple of step so that repeat requests share a cached
+    forecast, the end to config.FORECAST_DEFAULT_RANGE seconds after the
+    start, and step to config.FORECAST_DEFAULT_STEP. A single at parameter
+    requests just one point.
+
+    @return: Tuple of the first time, last time (inclusive), and seconds
+        between points.
+    @rtype: tuple
+    @raises ValueError: Raised if a parameter is malformed or out of range,
+        the range is reversed, or it has too many points.
+    """
+    step_seconds = float(
+        flask.request.args.get("step", config.FORECAST_DEFAULT_STEP)
+    )
+    if step_seconds < forecast.MIN_STEP_SECONDS or \
+        math.isnan(step_seconds) or math.isinf(step_seconds):
+        raise ValueError("Forecast step must be at least a microsecond.")
+
+    at = flask.request.args.get("at", None)
+    if at != None:
+        at = status_batch.parse_update_datetime(at)
+        return (at, at, step_seconds)
+
+    start = flask.request.args.get("start", None)
+    if start == None:
+        now = time.time()
+        start = datetime.datetime.fromtimestamp(
+            now - now % step_seconds
+        )
+    else:
+        start = status_batch.parse_update_datetime(start)
+
+    end = flask.request.args.get("end", None)
+    if end == None:
+        try:
+            end = start + datetime.timedelta(
+                seconds=config.FORECAST_DEFAULT_RANGE
+            )
+        except OverflowError:
+            raise ValueError("Forecast range ends out of range.")
+    else:
+        end = status_batch.parse_update_datetime(end)
+
+    if start > end:
+        raise ValueError("Forecast range is reversed.")
+    num_points = (end - start).total_seconds() / step_seconds + 1
+    if num_points > config.FORECAST_MAX_POINTS:
+        raise ValueError("Forecast has too many points.")
+    return (start, end, step_seconds)
+
+
+@app.route("/api/forecast.json", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/forecast.json" % ORRERY_ID_RULE)
+def api_forecast(orrery_id):
+    """
+    API endpoint to project orrery dates forward at the configured speed.
+
+    Rotations are extrapolated from the last reported status assuming the
+    motor keeps running at the configured motor speed. Rendered forecasts are
+    cached until the status or configuration changes. Forecasts with orrery
+    dates outside of the range of datetime.date are answered with 400.
+
+    @param orrery_id: The orrery to forecast.
+    @type orrery_id: int
+    @return: JSON document with the forecast basis and a list of points, each
+        with a wall time, projected rotations, and projected orrery date.
+    @rtype: str
+    """
+    try:
+        (start, end, step_seconds) = parse_forecast_range()
+    except ValueError:
+        flask.abort(400)
+
+    orrery_status = status_write_behind.read_orrery_status(orrery_id)
+    (orrery_config, config_version) = \
+        config_cache.orrery_config_cache.get_versioned(orrery_id)
+    if orrery_status == None or orrery_config == None:
+        flask.abort(404)
+
+    def render_forecast():
+        series = forecast.forecast_orrery_dates(
+            orrery_status,
+            orrery_config,
+            start,
+            end,
+            step_seconds
+        )
+        return api_view.render_orrery_forecast(
+            orrery_status,
+            orrery_config,
+            step_seconds,
+            series
+        )
+
+    try:
+        return forecast.forecast_cache.get(
+            (orrery_status, config_version),
+            (orrery_id, start, end, step_seconds),
+            render_forecast
+        )
+    except forecast.ForecastRangeError:
+        flask.abort(400)
 
 
-@app.route("/api/config.json", methods=["GET", "POST"])
-def api_set_config():
+@app.route("/api/config.json", methods=["GET", "POST"],
+    defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/config.json" % ORRERY_ID_RULE,
+    methods=["GET", "POST"])
+def api_set_config(orrery_id):
     """
     API endpoint to read and update the orrery user configuration.
 
@@ -98,19 +640,61 @@ def api_set_config():
     POST updates system settings and READ returns current state. Updated motor
     speed and desired relay enabled state are optional as form parameters during
     a POST (motor_speed and relay_enabled respectively). Leaving out a form
-    parameter will preserve the existing value.
-
+    parameter will preserve the existing value. GET is served from a cache that
+    is invalidated when any process changes the configuration and supports
+    If-None-Match against the configuration version. A GET with a wait
+    parameter long polls: it blocks for up to that many seconds until the
+    configuration differs from the version given by the client (through
+    If-None-Match or a version parameter matching X-Config-Version). A GET
+    for an orrery without a configuration is answered with 404 and a POST
+    creates it, filling left out values from the defaults in config.
+
+    @param orrery_id: The orrery to read or update the configuration of.
+    @type orrery_id: int
     @return: JSON document with current user configuration settings. Will
         reflect changes if a POST.
     @rtype: str
     """
 
     if flask.request.method == "GET":
-        config_entry = models.read_orrery_config()
-        return api_view.render_orrery_config(config_entry)
+        cache = config_cache.orrery_config_cache
+        wait = flask.request.args.get("wait", None)
+        if wait == None:
+            (config_entry, config_version) = cache.get_versioned(orrery_id)
+        else:
+            try:
+                wait = float(wait)
+            except ValueError:
+                flask.abort(400)
+            if wait < 0 or math.isnan(wait) or math.isinf(wait):
+                flask.abort(400)
+            wait = min(wait, config.CONFIG_LONG_POLL_MAX_WAIT)
+            (config_entry, config_version) = cache.wait_for_change(
+                is_known_config_version,
+                wait,
+                orrery_id
+            )
+        if config_entry == None:
+            flask.abort(404)
+        etag = http_cache.get_config_etag(config_version)
+
+        if http_cache.is_not_modified(flask.request, etag):
+            response = http_cache.create_not_modified_response(etag)
+        else:
+            body = api_view.render_orrery_config(config_entry)
+            response = http_cache.create_validated_response(body, etag)
+
+        response.headers["X-Config-Version"] = config_version
+        return response
 
     else:
-        old_config_entry = models.read_orrery_config()
+        old_config_entry = models.read_orrery_config(orrery_id)
+        is_new = old_config_entry == None
+        if is_new:
+            old_config_entry = models.OrreryConfig(
+                config.DEFAULT_ORRERY_CONFIG_SPEED,
+                config.DEFAULT_RELAY_STATUS
+            )
 
         new_motor_speed = flask.request.form.get("motor_speed", None)
         if new_motor_speed == None:
@@ -128,23 +712,137 @@ def api_set_config():
             new_motor_speed,
             new_relay_enabled
         )
-        models.update_orrery_config(new_config_entry)
+        if is_new:
+            models.create_orrery_config(new_config_entry, orrery_id)
+        else:
+            models.update_orrery_config(new_config_entry, orrery_id)
+        config_cache.orrery_config_cache.set(new_config_entry, orrery_id)
 
         return api_view.render_orrery_config(new_config_entry)
 
 
-@app.route("/human/system_status")
-def system_status():
+@app.route("/api/device/config.txt", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/device/config.txt" % ORRERY_ID_RULE)
+def device_config(orrery_id):
+    """
+    Render the orrery user configuration in the compact device layout.
+
+    Serves the same values as a GET to /api/config.json in the fixed-width
+    layout documented in device_protocol. Supports If-None-Match.
+
+    @param orrery_id: The orrery to render the configuration of.
+    @type orrery_id: int
+    @return: Fixed-width configuration document.
+    @rtype: flask.Response
+    """
+    cache = config_cache.orrery_config_cache
+    (config_entry, config_version) = cache.get_versioned(orrery_id)
+    if config_entry == None:
+        flask.abort(404)
+    etag = http_cache.get_config_etag(config_version)
+
+    if http_cache.is_not_modified(flask.request, etag):
+        return http_cache.create_not_modified_response(etag)
+
+    body = device_protocol.encode_orrery_config(config_entry, config_version)
+    response = http_cache.create_validated_response(body, etag)
+    response.headers["Content-Type"] = device_protocol.CONTENT_TYPE
+    return response
+
+
+@app.route("/api/device/concise_status.txt", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/device/concise_status.txt" % ORRERY_ID_RULE)
+def device_concise_status(orrery_id):
+    """
+    Render the orrery status summary in the compact device layout.
+
+    Serves the same values as /api/concise_status.json in the fixed-width
+    layout documented in device_protocol.
+
+    @param orrery_id: The orrery to render the status of.
+    @type orrery_id: int
+    @return: Fixed-width concise status document.
+    @rtype: flask.Response
+    """
+    orrery_status = status_write_behind.read_orrery_status(orrery_id)
+    if not orrery_status:
+        flask.abort(404)
+
+    body = device_protocol.encode_orrery_concise_status(
+        orrery_status,
+        datetime.date.today()
+    )
+    response = flask.make_response(body)
+    response.headers["Content-Type"] = device_protocol.CONTENT_TYPE
+    return response
+
+
+@app.route("/api/device/sync.txt", methods=["POST"],
+    defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/api/orreries/%s/device/sync.txt" % ORRERY_ID_RULE,
+    methods=["POST"])
+def device_sync(orrery_id):
+    """
+    Record a device status report and answer in the compact device layout.
+
+    Serves the same values as /api/sync.json in the fixed-width layout
+    documented in device_protocol. The status is recorded even if the orrery
+    has no configuration, which is answered with 404.
+
+    @param orrery_id: The orrery reporting its status.
+    @type orrery_id: int
+    @return: Fixed-width sync document.
+    @rtype: flask.Response
+    """
+    (status_entry, config_entry) = sync_status_report(orrery_id)
+    if config_entry == None:
+        flask.abort(404)
+
+    body = device_protocol.encode_orrery_sync(
+        status_entry,
+        config_entry,
+        models.get_orrery_config_version(config_entry),
+        datetime.date.today()
+    )
+    response = flask.make_response(body)
+    response.headers["Content-Type"] = device_protocol.CONTENT_TYPE
+    return response
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Report request, storage, and connection pool measurements.
+
+    Covers all worker processes sharing config.METRICS_DIR or only this
+    process if it is not set.
+
+    @return: Measurements in the Prometheus text exposition format.
+    @rtype: flask.Response
+    """
+    return flask.Response(
+        metrics.render_all_processes(),
+        content_type=metrics.CONTENT_TYPE
+    )
+
+
+@app.route("/human/system_status", defaults=DEFAULT_ORRERY_ROUTE)
+@app.route("/human/orreries/%s/system_status" % ORRERY_ID_RULE)
+def system_status(orrery_id):
     """
     Display a web page with a summary of raw system values.
 
     Renders a web page with the raw values for the orrery system status and user
     configuration entries.
 
+    @param orrery_id: The orrery to display the values of.
+    @type orrery_id: int
     @return: HTML page
     @rtype: str
     """
-    (config_entry, status_entry) = models.get_orrery_config_and_status()
+    (config_entry, status_entry) = models.get_orrery_config_and_status(
+        orrery_id
+    )
     config_entry_dict = serialization.orrery_config_to_dict(config_entry)
     status_entry_dict = serialization.orrery_status_to_dict(status_entry)
     template_vals = dict(config_entry_dict.items() + status_entry_dict.items())
@@ -0,0 +1,349 @@
+"""
+Load benchmark of the API endpoints reporting throughput and tail latency.
+
+Drives controllers.app with a mix of status and configuration reads and writes
+either through the WSGI test client (no network) or through a real local HTTP
+server. Storage can be any of the storage backends, so that framework
+overhead can be measured apart from database cost with the in-memory backend.
+
+Usage: python controllers_benchmark.py [--driver wsgi|server]
+    [--store memory|sqlite|postgres] [--requests N] [--threads N]
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import argparse
+import collections
+import datetime
+import random
+import threading
+import time
+
+try:
+    import httplib
+    from urllib import urlencode
+except ImportError:
+    import http.client as httplib
+    from urllib.parse import urlencode
+
+import werkzeug.serving
+
+import config
+import config_cache
+import controllers
+import models
+import status_history
+
+
+DEFAULT_NUM_REQUESTS = 10000
+DEFAULT_NUM_THREADS = 4
+
+# (weight, method, path) of each kind of request in the benchmark mix
+REQUEST_MIX = [
+    (40, "GET", "/api/concise_status.json"),
+    (20, "GET", "/api/status.json"),
+    (25, "GET", "/api/config.json"),
+    (14, "POST", "/api/status.json"),
+    (1, "POST", "/api/config.json")
+]
+
+PERCENTILES = [50, 95, 99]
+
+
+class WsgiClient:
+    """Sends requests to the application through the WSGI test client."""
+
+    def __init__(self):
+        self.client = controllers.app.test_client()
+
+    def request(self, method, path, form):
+        if method == "GET":
+            response = self.client.get(path)
+        else:
+            response = self.client.post(path, data=form)
+        response.data
+        return response.status_code
+
+
+class HttpClient:
+    """Sends requests to a local server over HTTP."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def request(self, method, path, form):
+        conn = httplib.HTTPConnection(self.host, self.port)
+        try:
+            if method == "GET":
+                conn.request(method, path)
+            else:
+                conn.request(
+                    method,
+                    path,
+                    urlencode(form),
+                    {"Content-Type": "application/x-www-form-urlencoded"}
+                )
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+
+class QuietRequestHandler(werkzeug.serving.WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_server():
+    """
+    Start a threaded local HTTP server for the application.
+
+    @return: Tuple of the server and its port.
+    @rtype: tuple
+    """
+    server = werkzeug.serving.make_server(
+        "127.0.0.1",
+        0,
+        controllers.app,
+        threaded=True,
+        request_handler=QuietRequestHandler
+    )
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return (server, server.server_address[1])
+
+
+def create_form(method, path, generator):
+    """
+    Create the form values to send with a request.
+
+    @param method: The HTTP method of the request.
+    @type method: str
+    @param path: The path requested.
+    @type path: str
+    @param generator: Source of random values.
+    @type generator: random.Random
+    @return: Form values or None for requests without a body.
+    @rtype: dict
+    """
+    if method != "POST":
+        return None
+    if path == "/api/status.json":
+        return {
+            "motor_speed": generator.uniform(300, 500),
+            "motor_draw": generator.uniform(10, 20),
+            "rotations": generator.uniform(0, 1000)
+        }
+    return {"motor_speed": generator.choice([400, 401])}
+
+
+def choose_requests(num_requests, seed):
+    """
+    Pick a weighted random sequence of requests from the benchmark mix.
+
+    @param num_requests: The number of requests to pick.
+    @type num_requests: int
+    @param seed: Seed for the random choices.
+    @type seed: int
+    @return: List of (method, path, form) tuples.
+    @rtype: list
+    """
+    generator = random.Random(seed)
+    choices = []
+    for (weight, method, path) in REQUEST_MIX:
+        choices.extend([(method, path)] * weight)
+
+    requests = []
+    for i in range(num_requests):
+        (method, path) = generator.choice(choices)
+        requests.append((method, path, create_form(method, path, generator)))
+    return requests
+
+
+def run_worker(client, requests, latencies, errors):
+    """
+    Send requests one after another recording each one's latency.
+
+    @param client: The client to send requests with.
+    @type client: WsgiClient or HttpClient
+    @param requests: List of (method, path, form) tuples to send.
+    @type requests: list
+    @param latencies: Dictionary from "METHOD path" to a list of latencies in
+        seconds to add to.
+    @type latencies: dict
+    @param errors: Dictionary from "METHOD path" to error counts to add to.
+    @type errors: dict
+    """
+    for (method, path, form) in requests:
+        key = "%s %s" % (method, path)
+        start = time.time()
+        status_code = client.request(method, path, form)
+        latencies[key].append(time.time() - start)
+        if status_code >= 400:
+            errors[key] += 1
+
+
+def run_benchmark(create_client, num_requests, num_threads):
+    """
+    Send the benchmark mix from several threads at once.
+
+    @param create_client: Function taking no arguments that creates a client
+        for one thread.
+    @type create_client: function
+    @param num_requests: Total number of requests to send.
+    @type num_requests: int
+    @param num_threads: Number of threads sending requests concurrently.
+    @type num_threads: int
+    @return: Tuple of wall time in seconds, latencies by request kind, and
+        error counts by request kind.
+    @rtype: tuple
+    """
+    thread_results = []
+    threads = []
+    for thread_num in range(num_threads):
+        requests = choose_requests(num_requests // num_threads, thread_num)
+        latencies = collections.defaultdict(list)
+        errors = collections.defaultdict(int)
+        thread_results.append((latencies, errors))
+        threads.append(threading.Thread(
+            target=run_worker,
+            args=(create_client(), requests, latencies, errors)
+        ))
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.time() - start
+
+    all_latencies = collections.defaultdict(list)
+    all_errors = collections.defaultdict(int)
+    for (latencies, errors) in thread_results:
+        for (key, values) in latencies.items():
+            all_latencies[key].extend(values)
+        for (key, count) in errors.items():
+            all_errors[key] += count
+    return (wall_time, all_latencies, all_errors)
+
+
+def calc_percentile(sorted_values, percentile):
+    """
+    Get the nearest-rank percentile of sorted values.
+
+    @param sorted_values: Values in ascending order.
+    @type sorted_values: list of float
+    @param percentile: The percentile to get from 0 to 100.
+    @type percentile: float
+    @return: The value at the given percentile.
+    @rtype: float
+    """
+    index = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def format_row(name, latencies, num_errors, wall_time):
+    """
+    Format throughput and latency percentiles of one kind of request.
+
+    @param name: Label for the row.
+    @type name: str
+    @param latencies: Latencies of the requests in seconds.
+    @type latencies: list of float
+    @param num_errors: Number of requests answered with an error status.
+    @type num_errors: int
+    @param wall_time: Seconds the whole benchmark took.
+    @type wall_time: float
+    @return: The formatted row.
+    @rtype: str
+    """
+    sorted_latencies = sorted(latencies)
+    percentiles = [
+        "%9.2f" % (calc_percentile(sorted_latencies, x) * 1000)
+        for x in PERCENTILES
+    ]
+    return "%-32s %7d %6d %9.1f %s" % (
+        name,
+        len(latencies),
+        num_errors,
+        len(latencies) / wall_time,
+        " ".join(percentiles)
+    )
+
+
+def main():
+    """Run and report the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--driver", choices=["wsgi", "server"],
+        default="wsgi")
+    parser.add_argument("--store", choices=["memory", "sqlite", "postgres"],
+        default="memory")
+    parser.add_argument("--requests", type=int, default=DEFAULT_NUM_REQUESTS)
+    parser.add_argument("--threads", type=int, default=DEFAULT_NUM_THREADS)
+    args = parser.parse_args()
+
+    config.STORAGE_BACKEND = args.store
+    if args.store != "postgres":
+        config_cache.orrery_config_cache.listen = False
+    models.initalize_database()
+
+    # Make sure a status exists so reads are not all 404s
+    models.upsert_orrery_status(models.OrreryStatus(
+        400,
+        15,
+        0,
+        datetime.date.today(),
+        datetime.datetime.now()
+    ))
+
+    server = None
+    if args.driver == "wsgi":
+        create_client = WsgiClient
+    else:
+        (server, port) = start_server()
+        create_client = lambda: HttpClient("127.0.0.1", port)
+
+    # Warm up caches, pooled connections, and prepared statements
+    run_benchmark(create_client, args.threads * 10, args.threads)
+    (wall_time, latencies, errors) = run_benchmark(
+        create_client,
+        args.requests,
+        args.threads
+    )
+    status_history.history_buffer.flush()
+    if server:
+        server.shutdown()
+
+    print("driver: %s  store: %s  threads: %d  prepared statements: %s" % (
+        args.driver,
+        args.store,
+        args.threads,
+        config.DB_PREPARED_STATEMENTS
+    ))
+    print("%-32s %7s %6s %9s %s" % (
+        "request",
+        "count",
+        "errors",
+        "req/s",
+        " ".join("%6s ms" % ("p%d" % x) for x in PERCENTILES)
+    ))
+    all_latencies = []
+    for key in sorted(latencies.keys()):
+        all_latencies.extend(latencies[key])
+        print(format_row(key, latencies[key], errors[key], wall_time))
+    print(format_row(
+        "total",
+        all_latencies,
+        sum(errors.values()),
+        wall_time
+    ))
+
+
+if __name__ == "__main__":
+    main()
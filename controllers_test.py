@@ -5,12 +5,18 @@ Tests for the orrery web control web service controllers.
 @license: GNU GPL v3
 """
 
+import datetime
+import gzip
 import json
 import unittest
 
 import config
+import config_cache
 import controllers
+import history_partitions
 import models
+import status_history
+import status_response_cache
 
 
 class TestAPI(unittest.TestCase):
@@ -18,12 +24,16 @@ class TestAPI(unittest.TestCase):
 
     def setUp(self):
         config.DB_NAME = "test"
+        config.HISTORY_MAINTENANCE = False
         models.initalize_database()
         self.app = controllers.app.test_client()
 
     def tearDown(self):
+        status_history.history_buffer.flush()
+        models.delete_orrery_status_history()
         models.delete_orrery_status()
         models.delete_orrery_config()
+        config_cache.orrery_config_cache.invalidate()
 
     def status_dicts_equal(self, dict1, dict2):
         """
@@ -98,6 +108,288 @@ class TestAPI(unittest.TestCase):
         ret_dict = json.loads(ret_str)
         self.assertTrue(self.status_dicts_equal(ret_dict, updated_entry_data))
 
+    def test_sync(self):
+        """Tests reporting status and reading configuration in one request."""
+        entry_data = {"motor_speed": 200, "motor_draw": 100, "rotations": 300}
+        ret_val = self.app.post("/api/sync.json", data=entry_data)
+        ret_dict = json.loads(ret_val.data)
+        self.assertEqual(ret_dict["status"]["rotations"], 300)
+        self.assertEqual(ret_dict["status"]["real_date"],
+            str(datetime.date.today()))
+        self.assertEqual(ret_dict["config"], {
+            "motor_speed": config.DEFAULT_ORRERY_CONFIG_SPEED,
+            "relay_enabled": config.DEFAULT_RELAY_STATUS
+        })
+
+        ret_val = self.app.get("/api/concise_status.json")
+        self.assertEqual(json.loads(ret_val.data)["rotations"], 300)
+
+        ret_val = self.app.post("/api/device/sync.txt", data=entry_data)
+        self.assertEqual(ret_val.status_code, 200)
+        self.assertEqual(len(ret_val.data), 39)
+
+        ret_val = self.app.post("/api/orreries/5/sync.json", data=entry_data)
+        self.assertEqual(json.loads(ret_val.data)["config"], None)
+        ret_val = self.app.post(
+            "/api/orreries/5/device/sync.txt",
+            data=entry_data
+        )
+        self.assertEqual(ret_val.status_code, 404)
+        ret_val = self.app.get("/api/orreries/5/concise_status.json")
+        self.assertEqual(ret_val.status_code, 200)
+
+    def test_status_history(self):
+        """Tests that reported statuses are recorded in the status history."""
+        start = datetime.datetime.now()
+        for rotations in [300, 301, 302]:
+            entry_data = {
+                "motor_speed": 200,
+                "motor_draw": 100,
+                "rotations": rotations
+            }
+            self.app.post("/api/status.json", data=entry_data)
+
+        status_history.history_buffer.flush()
+        history = models.read_orrery_status_history(
+            start,
+            datetime.datetime.now()
+        )
+        self.assertEqual([entry.rotations for entry in history], [300, 301, 302])
+
+    def test_status_batch(self):
+        """Tests uploading many status samples in one request."""
+        start = datetime.datetime.now() - datetime.timedelta(hours=1)
+        lines = []
+        for minute in range(60):
+            sample_time = start + datetime.timedelta(minutes=minute)
+            lines.append(json.dumps({
+                "motor_speed": 200,
+                "motor_draw": 100,
+                "rotations": minute,
+                "update_datetime": sample_time.strftime("%Y-%m-%d %H:%M:%S")
+            }))
+        ret_val = self.app.post(
+            "/api/status_batch.json",
+            data="\n".join(lines),
+            content_type="application/x-ndjson"
+        )
+        ret_dict = json.loads(ret_val.data)
+        self.assertEqual(ret_dict["accepted"], 60)
+        self.assertEqual(ret_dict["status"]["rotations"], 59)
+
+        history = models.read_orrery_status_history(
+            start - datetime.timedelta(seconds=1),
+            datetime.datetime.now()
+        )
+        self.assertEqual([x.rotations for x in history], list(range(60)))
+
+        ret_val = self.app.post(
+            "/api/status_batch.json",
+            data={
+                "motor_speed": ["200"],
+                "motor_draw": ["100", "100"],
+                "rotations": ["1"],
+                "update_datetime": ["0"]
+            }
+        )
+        self.assertEqual(ret_val.status_code, 400)
+
+        ret_val = self.app.post(
+            "/api/status_batch.json",
+            data={
+                "motor_speed": ["200"],
+                "motor_draw": ["100"],
+                "rotations": ["1"],
+                "update_datetime": ["1e20"]
+            }
+        )
+        self.assertEqual(ret_val.status_code, 400)
+
+    def test_history_rollup(self):
+        """Tests summarizing the status history in intervals."""
+        start = datetime.datetime(2013, 2, 13, 10, 0, 0)
+        statuses = [
+            models.OrreryStatus(200 + x, 100, x, start.date(),
+                start + datetime.timedelta(seconds=x * 20))
+            for x in range(6)
+        ]
+        models.create_orrery_status_history(statuses)
+
+        ret_val = self.app.get(
+            "/api/history/rollup.json?start=2013-02-13 10:00:00&"
+            "end=2013-02-13 10:02:00&bucket=60"
+        )
+        ret_dict = json.loads(ret_val.data)
+        buckets = ret_dict["buckets"]
+        self.assertEqual([x["count"] for x in buckets], [3, 3])
+        self.assertEqual(buckets[0]["bucket_start"], "2013-02-13 10:00:00")
+        self.assertEqual(buckets[1]["rotations"]["min"], 3)
+        self.assertEqual(buckets[1]["rotations"]["max"], 5)
+        self.assertEqual(buckets[1]["motor_speed"]["mean"], 204)
+
+        ret_val = self.app.get("/api/history/rollup.json?bucket=0.001")
+        self.assertEqual(ret_val.status_code, 400)
+
+        for url_params in ["bucket=nan", "bucket=inf", "start=1e20"]:
+            ret_val = self.app.get("/api/history/rollup.json?" + url_params)
+            self.assertEqual(ret_val.status_code, 400)
+
+    def test_history_rollup_compacted(self):
+        """Tests summarizing status history older than the raw retention."""
+        now = datetime.datetime.now()
+        age = datetime.timedelta(days=config.HISTORY_RAW_RETENTION_DAYS + 2)
+        start = history_partitions.get_compact_bucket_start(
+            now - age,
+            config.HISTORY_COMPACT_BUCKET
+        )
+        models.create_orrery_status_history([
+            models.OrreryStatus(200 + x, 100, x, start.date(),
+                start + datetime.timedelta(seconds=x * 20))
+            for x in range(6)
+        ])
+        models.maintain_orrery_status_history(now)
+        end = start + datetime.timedelta(seconds=config.HISTORY_COMPACT_BUCKET)
+        self.assertEqual(models.read_orrery_status_history(start, end), [])
+
+        ret_val = self.app.get(
+            "/api/history/rollup.json?start=%s&end=%s&bucket=%d" % (
+                start.strftime("%Y-%m-%d %H:%M:%S"),
+                end.strftime("%Y-%m-%d %H:%M:%S"),
+                config.HISTORY_COMPACT_BUCKET
+            )
+        )
+        buckets = json.loads(ret_val.data)["buckets"]
+        self.assertEqual([x["count"] for x in buckets], [6])
+        self.assertEqual(buckets[0]["rotations"]["max"], 5)
+        self.assertAlmostEqual(buckets[0]["motor_speed"]["mean"], 202.5)
+
+    def test_history_export(self):
+        """Tests streaming the status history as CSV and NDJSON."""
+        start = datetime.datetime(2013, 2, 13, 10, 0, 0)
+        models.create_orrery_status_history([
+            models.OrreryStatus(200 + x, 100, x, start.date(),
+                start + datetime.timedelta(seconds=x * 20))
+            for x in range(6)
+        ])
+        url_params = "start=2013-02-13 10:00:00&end=2013-02-13 10:01:00"
+
+        ret_val = self.app.get("/api/history/export.csv?" + url_params)
+        self.assertTrue(ret_val.headers["Content-Type"].startswith("text/csv"))
+        lines = ret_val.data.decode("utf-8").splitlines()
+        self.assertEqual(
+            lines[0],
+            "update_datetime,start_date,motor_speed,motor_draw,rotations"
+        )
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("2013-02-13 10:00:00,2013-02-13,"))
+
+        ret_val = self.app.get("/api/history/export.ndjson?" + url_params)
+        samples = [
+            json.loads(line)
+            for line in ret_val.data.decode("utf-8").splitlines()
+        ]
+        self.assertEqual([x["rotations"] for x in samples], [0, 1, 2])
+        self.assertEqual(samples[2]["update_datetime"], "2013-02-13 10:00:40")
+
+        ret_val = self.app.get("/api/history/export.xml")
+        self.assertEqual(ret_val.status_code, 404)
+
+        ret_val = self.app.get("/api/history/export.csv?start=tomorrow")
+        self.assertEqual(ret_val.status_code, 400)
+
+        for url_params in ["start=1e20", "end=inf", "end=0001-01-01 00:00:00"]:
+            ret_val = self.app.get("/api/history/export.csv?" + url_params)
+            self.assertEqual(ret_val.status_code, 400)
+
+    def test_compression(self):
+        """Tests negotiating compression of large and streamed responses."""
+        start = datetime.datetime(2013, 2, 13, 10, 0, 0)
+        models.create_orrery_status_history([
+            models.OrreryStatus(200 + x, 100, x, start.date(),
+                start + datetime.timedelta(seconds=x * 20))
+            for x in range(60)
+        ])
+        url = "/api/history/export.csv?" + \
+            "start=2013-02-13 10:00:00&end=2013-02-13 10:20:00"
+        accept_gzip = {"Accept-Encoding": "gzip"}
+
+        plain = self.app.get(url)
+        self.assertNotIn("Content-Encoding", plain.headers)
+        ret_val = self.app.get(url, headers=accept_gzip)
+        self.assertEqual(ret_val.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", ret_val.headers["Vary"])
+        self.assertEqual(gzip.decompress(ret_val.data), plain.data)
+
+        ret_val = self.app.get(
+            "/api/history/rollup.json?bucket=20&" + url.split("?")[1],
+            headers=accept_gzip
+        )
+        self.assertEqual(ret_val.headers["Content-Encoding"], "gzip")
+        rollup = json.loads(gzip.decompress(ret_val.data).decode("utf-8"))
+        self.assertEqual(len(rollup["buckets"]), 60)
+
+        self.app.post("/api/config.json", data={"motor_speed": 400})
+        ret_val = self.app.get("/api/device/config.txt", headers=accept_gzip)
+        self.assertNotIn("Content-Encoding", ret_val.headers)
+
+        body = self.app.get("/metrics").data.decode("utf-8")
+        self.assertIn("orrery_http_compression_input_bytes_total", body)
+        self.assertIn('encoding="gzip"', body)
+
+    def test_forecast(self):
+        """Tests projecting orrery dates at the configured motor speed."""
+        ret_val = self.app.get("/api/forecast.json")
+        self.assertEqual(ret_val.status_code, 404)
+
+        self.app.post("/api/config.json", data={"motor_speed": 400})
+        self.app.post(
+            "/api/status.json",
+            data={"motor_speed": 400, "motor_draw": 100, "rotations": 10}
+        )
+
+        start = datetime.datetime.combine(
+            datetime.date.today() + datetime.timedelta(days=1),
+            datetime.time()
+        )
+        end = start + datetime.timedelta(days=1)
+        ret_val = self.app.get(
+            "/api/forecast.json?start=%s&end=%s&step=3600" % (start, end)
+        )
+        ret_dict = json.loads(ret_val.data)
+        points = ret_dict["points"]
+        self.assertEqual(len(points), 25)
+        self.assertEqual(points[0]["datetime"], str(start))
+        self.assertTrue(points[0]["rotations"] > 10)
+        self.assertTrue(points[-1]["orrery_date"] > points[0]["orrery_date"])
+
+        ret_val = self.app.get("/api/forecast.json?at=%s" % end)
+        self.assertEqual(len(json.loads(ret_val.data)["points"]), 1)
+
+        # Orrery dates a century out are beyond datetime.date.max
+        ret_val = self.app.get("/api/forecast.json?at=2100-01-01 15:00:00")
+        self.assertEqual(ret_val.status_code, 400)
+
+        ret_val = self.app.get("/api/forecast.json?step=0.001")
+        self.assertEqual(ret_val.status_code, 400)
+
+        for url_params in ["step=inf", "step=nan", "step=1e-9",
+            "step=1e-300", "at=1e20", "at=9999-12-31 00:00:00",
+            "start=9999-12-31 23:00:00"]:
+            ret_val = self.app.get("/api/forecast.json?" + url_params)
+            self.assertEqual(ret_val.status_code, 400)
+
+    def test_metrics(self):
+        """Tests reporting request and storage measurements."""
+        self.app.get("/api/status.json")
+        ret_val = self.app.get("/metrics")
+        self.assertEqual(ret_val.status_code, 200)
+        self.assertTrue(ret_val.headers["Content-Type"].startswith(
+            "text/plain; version=0.0.4"))
+        body = ret_val.data.decode("utf-8")
+        self.assertIn("# TYPE orrery_http_requests_total counter", body)
+        self.assertIn('route="/api/status.json",method="GET"', body)
+        self.assertIn('function="read_orrery_status"', body)
+
     def test_concise_status(self):
         """Tests getting system status summaries."""
         # Create initial entry
@@ -118,6 +410,81 @@ class TestAPI(unittest.TestCase):
         ret_dict = json.loads(ret_str)
         self.assertEqual(ret_dict["rotations"], initial_entry_data["rotations"])
 
+    def test_conditional_status(self):
+        """Tests that unchanged status documents are not sent again."""
+        entry_data = {
+            "motor_speed": 200,
+            "motor_draw": 100,
+            "rotations": 300
+        }
+        self.app.post("/api/status.json", data=entry_data)
+
+        for url in ["/api/status.json", "/api/concise_status.json"]:
+            ret_val = self.app.get(url)
+            etag = ret_val.headers["ETag"]
+            last_modified = ret_val.headers["Last-Modified"]
+            ret_val = self.app.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(ret_val.status_code, 304)
+            self.assertEqual(ret_val.data, b"")
+
+            ret_val = self.app.get(
+                url,
+                headers={"If-Modified-Since": last_modified}
+            )
+            self.assertEqual(ret_val.status_code, 304)
+
+            cache = status_response_cache.status_response_cache
+            cache.invalidate()
+            num_misses = cache.get_stats()["misses"]
+            ret_val = self.app.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(ret_val.status_code, 304)
+            self.assertEqual(cache.get_stats()["misses"], num_misses)
+
+        self.app.post("/api/status.json", data=entry_data)
+        ret_val = self.app.get(
+            "/api/status.json",
+            headers={"If-None-Match": etag}
+        )
+        self.assertEqual(ret_val.status_code, 200)
+
+    def test_conditional_config(self):
+        """Tests that unchanged configuration documents are not sent again."""
+        ret_val = self.app.get("/api/config.json")
+        etag = ret_val.headers["ETag"]
+        ret_val = self.app.get(
+            "/api/config.json",
+            headers={"If-None-Match": etag}
+        )
+        self.assertEqual(ret_val.status_code, 304)
+
+        self.app.post("/api/config.json", data={"motor_speed": 123})
+        ret_val = self.app.get(
+            "/api/config.json",
+            headers={"If-None-Match": etag}
+        )
+        self.assertEqual(ret_val.status_code, 200)
+
+    def test_long_poll_config(self):
+        """Tests waiting for configuration changes."""
+        ret_val = self.app.get("/api/config.json")
+        etag = ret_val.headers["ETag"]
+        version = ret_val.headers["X-Config-Version"]
+
+        ret_val = self.app.get(
+            "/api/config.json?wait=0.1",
+            headers={"If-None-Match": etag}
+        )
+        self.assertEqual(ret_val.status_code, 304)
+
+        self.app.post("/api/config.json", data={"motor_speed": 123})
+        ret_val = self.app.get("/api/config.json?wait=5&version=" + version)
+        self.assertEqual(ret_val.status_code, 200)
+        self.assertEqual(json.loads(ret_val.data)["motor_speed"], 123)
+
+        for wait in ["abc", "nan", "inf", "-1"]:
+            ret_val = self.app.get("/api/config.json?wait=" + wait)
+            self.assertEqual(ret_val.status_code, 400)
+
     def test_config(self):
         """Test getting and setting orrery user configuration settings."""
         # Create initial config
@@ -154,6 +521,50 @@ class TestAPI(unittest.TestCase):
         ret_dict = json.loads(ret_str)
         self.assertTrue(self.config_dicts_equal(ret_dict, updated_entry_data))
 
+    def test_fleet(self):
+        """Test that routes naming an orrery only touch that orrery."""
+        self.app.post("/api/status.json", data={
+            "motor_speed": 200,
+            "motor_draw": 100,
+            "rotations": 300
+        })
+        ret_val = self.app.post("/api/orreries/2/status.json", data={
+            "motor_speed": 400,
+            "motor_draw": 50,
+            "rotations": 7
+        })
+        self.assertEqual(ret_val.status_code, 200)
+
+        ret_val = self.app.get("/api/orreries/2/status.json")
+        self.assertEqual(json.loads(ret_val.data)["rotations"], 7)
+        ret_val = self.app.get("/api/orreries/1/status.json")
+        self.assertEqual(json.loads(ret_val.data)["rotations"], 300)
+        ret_val = self.app.get("/api/status.json")
+        self.assertEqual(json.loads(ret_val.data)["rotations"], 300)
+        ret_val = self.app.get("/api/orreries/3/concise_status.json")
+        self.assertEqual(ret_val.status_code, 404)
+
+        ret_val = self.app.get("/api/orreries/2/config.json")
+        self.assertEqual(ret_val.status_code, 404)
+        ret_val = self.app.post("/api/orreries/2/config.json",
+            data={"motor_speed": 123})
+        self.assertEqual(json.loads(ret_val.data)["motor_speed"], 123)
+        ret_val = self.app.get("/api/orreries/2/config.json")
+        self.assertEqual(json.loads(ret_val.data)["motor_speed"], 123)
+        ret_val = self.app.get("/api/config.json")
+        self.assertNotEqual(json.loads(ret_val.data)["motor_speed"], 123)
+
+        status_history.history_buffer.flush()
+        ret_val = self.app.get("/api/orreries/2/history/export.ndjson")
+        samples = ret_val.data.decode("utf-8").splitlines()
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(json.loads(samples[0])["rotations"], 7)
+
+        ret_val = self.app.get("/api/orreries/0/status.json")
+        self.assertEqual(ret_val.status_code, 404)
+        ret_val = self.app.get("/api/orreries/40000/status.json")
+        self.assertEqual(ret_val.status_code, 404)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+Thread-safe, fork-aware pool of database connections.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import os
+import threading
+import time
+
+import psycopg2.extensions
+
+
+class DbPoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes available in time."""
+    pass
+
+
+class DbConnectionPool:
+    """
+    Bounded pool of database connections with per-thread checkout.
+
+    Connections are checked out per thread so that nested operations on the
+    same thread share one connection (and one transaction). Idle connections
+    beyond the minimum pool size are closed after sitting unused for too long
+    and connections inherited across a fork are abandoned in the child.
+    """
+
+    def __init__(self, connect_func, min_size, max_size, timeout, max_idle,
+        ping_after):
+        """
+        Create a new, empty connection pool.
+
+        @param connect_func: Function taking no arguments that opens a new
+            database connection.
+        @type connect_func: function
+        @param min_size: Number of idle connections kept open when reaping.
+        @type min_size: int
+        @param max_size: Maximum number of open connections.
+        @type max_size: int
+        @param timeout: Seconds to wait for a connection before giving up.
+        @type timeout: float
+        @param max_idle: Seconds an idle connection may sit before it is closed.
+        @type max_idle: float
+        @param ping_after: Seconds an idle connection may sit before it is
+            checked with a round trip to the database on checkout.
+        @type ping_after: float
+        """
+        self.connect_func = connect_func
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+
+        self.condition = threading.Condition(threading.Lock())
+        self.thread_state = threading.local()
+        self.reset_state()
+
+    def reset_state(self):
+        """Forget all connections and statistics for the current process."""
+        self.pid = os.getpid()
+        self.idle_connections = collections.deque()
+        self.num_connections = 0
+        self.inherited_connections = []
+        self.thread_state = threading.local()
+
+        self.num_checkouts = 0
+        self.num_created = 0
+        self.num_discarded = 0
+        self.num_reaped = 0
+        self.num_timeouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def check_pid(self):
+        """
+        Abandon connections inherited from a parent process after a fork.
+
+        Connections are kept referenced but never used or closed in the child
+        because closing them would also terminate the parent's sessions.
+
+        @note: Must be called with the pool lock held.
+        """
+        if self.pid == os.getpid():
+            return
+        inherited = [conn for (conn, returned) in self.idle_connections]
+        checked_out = getattr(self.thread_state, "connection", None)
+        if checked_out is not None:
+            inherited.append(checked_out)
+        self.reset_state()
+        self.inherited_connections = inherited
+
+    def reap_idle_connections(self, now):
+        """
+        Close idle connections that have gone unused for too long.
+
+        @param now: The current time as given by time.time.
+        @type now: float
+        @note: Must be called with the pool lock held.
+        """
+        while len(self.idle_connections) > self.min_size:
+            (conn, returned) = self.idle_connections[0]
+            if now - returned < self.max_idle:
+                break
+            self.idle_connections.popleft()
+            self.num_connections -= 1
+            self.num_reaped += 1
+            close_quietly(conn)
+
+    def is_healthy(self, conn, returned, now):
+        """
+        Determine if an idle connection can be handed out.
+
+        @param conn: The idle connection to check.
+        @type conn: psycopg2.Connection
+        @param returned: Time at which the connection was returned to the pool.
+        @type returned: float
+        @param now: The current time as given by time.time.
+        @type now: float
+        @return: True if the connection is usable and False otherwise.
+        @rtype: bool
+        """
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if now - returned < self.ping_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+        except Exception:
+            return False
+        return True
+
+    def acquire_connection(self):
+        """
+        Take a connection out of the pool, opening one if allowed.
+
+        @return: A connection that is not checked out by any other thread.
+        @rtype: psycopg2.Connection
+        @raises DbPoolTimeoutError: Raised if no connection became available
+            before the pool timeout.
+        """
+        start = time.time()
+        deadline = start + self.timeout
+
+        while True:
+            conn = None
+            returned = None
+            with self.condition:
+                self.check_pid()
+                now = time.time()
+                self.reap_idle_connections(now)
+
+                while not self.idle_connections and \
+                    self.num_connections >= self.max_size:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.num_timeouts += 1
+                        raise DbPoolTimeoutError(
+                            "No database connection available after %.1fs." %
+                            self.timeout
+                        )
+                    self.condition.wait(remaining)
+                    now = time.time()
+
+                if self.idle_connections:
+                    (conn, returned) = self.idle_connections.pop()
+                else:
+                    self.num_connections += 1
+
+            if conn is None:
+                try:
+                    conn = self.connect_func()
+                except:
+                    with self.condition:
+                        self.num_connections -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.num_created += 1
+            elif not self.is_healthy(conn, returned, time.time()):
+                self.forget_connection(conn)
+                continue
+
+            wait_time = time.time() - start
+            with self.condition:
+                self.num_checkouts += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            return conn
+
+    def forget_connection(self, conn):
+        """
+        Close a connection and free its slot in the pool.
+
+        @param conn: The connection to remove from the pool.
+        @type conn: psycopg2.Connection
+        """
+        close_quietly(conn)
+        with self.condition:
+            self.num_connections -= 1
+            self.num_discarded += 1
+            self.condition.notify()
+
+    def get_connection(self):
+        """
+        Check out a connection for the current thread.
+
+        Repeated calls on the same thread before the connection is released
+        return the same connection.
+
+        @return: The connection checked out by the current thread.
+        @rtype: psycopg2.Connection
+        """
+        if self.pid != os.getpid():
+            with self.condition:
+                self.check_pid()
+
+        state = self.thread_state
+        if getattr(state, "connection", None) is None:
+            state.connection = self.acquire_connection()
+            state.depth = 0
+        state.depth += 1
+        return state.connection
+
+    def release_connection(self):
+        """
+        Indicate that the current thread has finished one set of operations.
+
+        The connection goes back to the pool once every get_connection call
+        on this thread has been matched by a release. Open transactions are
+        rolled back before the connection is made available again.
+        """
+        state = self.thread_state
+        conn = getattr(state, "connection", None)
+        if conn is None:
+            return
+
+        state.depth -= 1
+        if state.depth > 0:
+            return
+        state.connection = None
+        self.return_connection(conn)
+
+    def return_connection(self, conn):
+        """
+        Put a connection taken with acquire_connection back into the pool.
+
+        Open transactions are rolled back first and closed connections are
+        removed from the pool instead.
+
+        @param conn: The connection to return.
+        @type conn: psycopg2.Connection
+        """
+        if conn.closed:
+            self.forget_connection(conn)
+            return
+
+        status = conn.get_transaction_status()
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                self.forget_connection(conn)
+                return
+
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+            self.idle_connections.append((conn, time.time()))
+            self.condition.notify()
+
+    def discard_connection(self):
+        """Close the current thread's connection instead of returning it."""
+        state = self.thread_state
+        conn = getattr(state, "connection", None)
+        if conn is None:
+            return
+        state.connection = None
+        state.depth = 0
+        self.forget_connection(conn)
+
+    def get_stats(self):
+        """
+        Get a snapshot of pool occupancy and wait statistics.
+
+        @return: Dictionary of pool statistics.
+        @rtype: dict
+        """
+        with self.condition:
+            num_idle = len(self.idle_connections)
+            if self.num_checkouts:
+                mean_wait_time = self.total_wait_time / self.num_checkouts
+            else:
+                mean_wait_time = 0.0
+            return {
+                "max_size": self.max_size,
+                "size": self.num_connections,
+                "idle": num_idle,
+                "in_use": self.num_connections - num_idle,
+                "checkouts": self.num_checkouts,
+                "created": self.num_created,
+                "discarded": self.num_discarded,
+                "reaped": self.num_reaped,
+                "timeouts": self.num_timeouts,
+                "total_wait_time": self.total_wait_time,
+                "mean_wait_time": mean_wait_time,
+                "max_wait_time": self.max_wait_time
+            }
+
+
+def close_quietly(conn):
+    """
+    Close a connection, ignoring any errors raised while doing so.
+
+    @param conn: The connection to close.
+    @type conn: psycopg2.Connection
+    """
+    try:
+        conn.close()
+    except Exception:
+        pass
@@ -0,0 +1,146 @@
+"""
+Tests for the orrery web control database connection pool.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import threading
+import unittest
+
+import psycopg2.extensions
+
+import db_pool
+
+
+class FakeConnection:
+    """Stand-in for a psycopg2 connection that records how it was used."""
+
+    def __init__(self):
+        self.closed = 0
+        self.num_rollbacks = 0
+        self.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        self.num_rollbacks += 1
+        self.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class TestDbConnectionPool(unittest.TestCase):
+    """Test checkout, return, and sizing of pooled connections."""
+
+    def setUp(self):
+        self.connections = []
+        self.pool = db_pool.DbConnectionPool(
+            self.connect,
+            1,
+            2,
+            0.05,
+            300,
+            60
+        )
+
+    def connect(self):
+        conn = FakeConnection()
+        self.connections.append(conn)
+        return conn
+
+    def checkout_on_other_thread(self):
+        """
+        Check out and keep a connection on a separate thread.
+
+        @return: The connection checked out by the other thread.
+        @rtype: FakeConnection
+        """
+        result = []
+
+        def checkout():
+            try:
+                result.append(self.pool.get_connection())
+            except db_pool.DbPoolTimeoutError as e:
+                result.append(e)
+
+        thread = threading.Thread(target=checkout)
+        thread.start()
+        thread.join()
+        if isinstance(result[0], Exception):
+            raise result[0]
+        return result[0]
+
+    def test_reuse(self):
+        conn = self.pool.get_connection()
+        self.pool.release_connection()
+        self.assertTrue(self.pool.get_connection() is conn)
+        self.pool.release_connection()
+        self.assertEqual(len(self.connections), 1)
+
+    def test_nested_checkout(self):
+        conn = self.pool.get_connection()
+        self.assertTrue(self.pool.get_connection() is conn)
+        self.pool.release_connection()
+        self.assertEqual(self.pool.get_stats()["in_use"], 1)
+        self.pool.release_connection()
+        self.assertEqual(self.pool.get_stats()["in_use"], 0)
+
+    def test_rollback_on_return(self):
+        conn = self.pool.get_connection()
+        conn.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        self.pool.release_connection()
+        self.assertEqual(conn.num_rollbacks, 1)
+
+        self.pool.get_connection()
+        self.pool.release_connection()
+        self.assertEqual(conn.num_rollbacks, 1)
+
+    def test_max_size(self):
+        self.checkout_on_other_thread()
+        self.checkout_on_other_thread()
+        with self.assertRaises(db_pool.DbPoolTimeoutError):
+            self.checkout_on_other_thread()
+        self.assertEqual(self.pool.get_stats()["timeouts"], 1)
+
+    def test_discard(self):
+        conn = self.pool.get_connection()
+        self.pool.discard_connection()
+        self.assertTrue(conn.closed)
+        self.assertFalse(self.pool.get_connection() is conn)
+        self.pool.release_connection()
+        self.assertEqual(self.pool.get_stats()["size"], 1)
+
+    def test_closed_connection_replaced(self):
+        conn = self.pool.get_connection()
+        self.pool.release_connection()
+        conn.closed = 1
+        self.assertFalse(self.pool.get_connection() is conn)
+        self.pool.release_connection()
+
+    def test_reap_idle(self):
+        first_conn = self.pool.get_connection()
+        returned = []
+
+        def checkout_and_return():
+            returned.append(self.pool.get_connection())
+            self.pool.release_connection()
+
+        thread = threading.Thread(target=checkout_and_return)
+        thread.start()
+        thread.join()
+        self.pool.release_connection()
+        self.assertEqual(self.pool.get_stats()["idle"], 2)
+
+        self.pool.max_idle = 0
+        self.pool.get_connection()
+        self.pool.release_connection()
+        self.assertEqual(self.pool.get_stats()["size"], 1)
+        self.assertTrue(returned[0].closed)
+        self.assertFalse(first_conn.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
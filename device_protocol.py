@@ -0,0 +1,137 @@
+"""
+Compact fixed-width encoding of API responses for the orrery microcontroller.
+
+All documents are ASCII text with fields at fixed offsets and a trailing
+newline so that the device can read them into a static buffer and pick fields
+out by position without a JSON parser.
+
+Configuration document (10 bytes):
+
+    offset  width  field
+    0       8      motor speed, signed, one decimal place ("+00400.0")
+    8       1      relay enabled ("1") or disabled ("0")
+    9       1      newline
+
+Concise status document (29 bytes):
+
+    offset  width  field
+    0       8      orrery "Earth" date as YYYYMMDD
+    8       8      real date on the server as YYYYMMDD
+    16      12     rotations, signed, three decimal places ("+0000300.000")
+    28      1      newline
+
+Sync document (39 bytes): the configuration document followed by the concise
+status document.
+
+Numbers that do not fit in their field are clamped to the largest value the
+field can hold.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import math_util
+
+
+CONFIG_TEMPLATE = "%+08.1f%d\n"
+CONFIG_LENGTH = 10
+MAX_MOTOR_SPEED = 99999.9
+
+CONCISE_STATUS_TEMPLATE = "%04d%02d%02d%04d%02d%02d%+012.3f\n"
+CONCISE_STATUS_LENGTH = 29
+MAX_ROTATIONS = 9999999.999
+
+SYNC_LENGTH = CONFIG_LENGTH + CONCISE_STATUS_LENGTH
+
+CONTENT_TYPE = "text/plain; charset=us-ascii"
+
+# Most recently encoded configuration as a (version, body) tuple
+last_config_body = (None, None)
+
+
+def clamp(value, limit):
+    """
+    Limit a number to the range a fixed-width field can hold.
+
+    @param value: The number to limit.
+    @type value: float
+    @param limit: The largest magnitude the field can hold.
+    @type limit: float
+    @return: The number limited to [-limit, limit].
+    @rtype: float
+    """
+    return max(-limit, min(limit, value))
+
+
+def encode_orrery_config(record, version):
+    """
+    Encode the orrery user configuration as a fixed-width document.
+
+    The encoded document is kept for the given version so repeat requests
+    reuse the same bytes.
+
+    @param record: The orrery configuration settings to encode.
+    @type record: models.OrreryConfig
+    @param version: The configuration version as given by
+        models.get_orrery_config_version.
+    @type version: str
+    @return: The fixed-width configuration document.
+    @rtype: bytes
+    """
+    global last_config_body
+
+    (cached_version, body) = last_config_body
+    if cached_version == version and version is not None:
+        return body
+
+    body = (CONFIG_TEMPLATE % (
+        clamp(record.motor_speed, MAX_MOTOR_SPEED),
+        1 if record.relay_enabled else 0
+    )).encode("ascii")
+    last_config_body = (version, body)
+    return body
+
+
+def encode_orrery_concise_status(record, today):
+    """
+    Encode the summary subset of the orrery status as a fixed-width document.
+
+    @param record: The orrery status record to encode.
+    @type record: models.OrreryStatus
+    @param today: The date to report as the real date.
+    @type today: datetime.date
+    @return: The fixed-width concise status document.
+    @rtype: bytes
+    """
+    orrery_date = math_util.calc_orrery_date(record)
+    return (CONCISE_STATUS_TEMPLATE % (
+        orrery_date.year,
+        orrery_date.month,
+        orrery_date.day,
+        today.year,
+        today.month,
+        today.day,
+        clamp(record.rotations, MAX_ROTATIONS)
+    )).encode("ascii")
+
+
+def encode_orrery_sync(status_record, config_record, version, today):
+    """
+    Encode the result of a device sync as a fixed-width document.
+
+    @param status_record: The orrery status record as persisted after the
+        report.
+    @type status_record: models.OrreryStatus
+    @param config_record: The orrery configuration settings to encode.
+    @type config_record: models.OrreryConfig
+    @param version: The configuration version as given by
+        models.get_orrery_config_version.
+    @type version: str
+    @param today: The date to report as the real date.
+    @type today: datetime.date
+    @return: The configuration document followed by the concise status
+        document.
+    @rtype: bytes
+    """
+    return encode_orrery_config(config_record, version) + \
+        encode_orrery_concise_status(status_record, today)
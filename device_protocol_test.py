@@ -0,0 +1,85 @@
+"""
+Tests for the compact device encoding of API responses.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import device_protocol
+import math_util
+import models
+
+
+class TestDeviceProtocol(unittest.TestCase):
+    """Test the fixed-width configuration and status layouts."""
+
+    def test_config(self):
+        body = device_protocol.encode_orrery_config(
+            models.OrreryConfig(400, True),
+            "a"
+        )
+        self.assertEqual(body, b"+00400.01\n")
+        self.assertEqual(len(body), device_protocol.CONFIG_LENGTH)
+
+        body = device_protocol.encode_orrery_config(
+            models.OrreryConfig(12.5, False),
+            "b"
+        )
+        self.assertEqual(body, b"+00012.50\n")
+
+    def test_config_reused(self):
+        first_body = device_protocol.encode_orrery_config(
+            models.OrreryConfig(400, True),
+            "c"
+        )
+        second_body = device_protocol.encode_orrery_config(
+            models.OrreryConfig(400, True),
+            "c"
+        )
+        self.assertTrue(first_body is second_body)
+
+    def test_config_clamped(self):
+        body = device_protocol.encode_orrery_config(
+            models.OrreryConfig(1e9, False),
+            "d"
+        )
+        self.assertEqual(body, b"+99999.90\n")
+
+    def test_concise_status(self):
+        start_date = datetime.date(2013, 1, 1)
+        today = datetime.date(2013, 2, 13)
+        status = models.OrreryStatus(400, 17.5, 300, start_date,
+            datetime.datetime.now())
+        body = device_protocol.encode_orrery_concise_status(status, today)
+
+        orrery_date = math_util.calc_orrery_date(status)
+        expected = orrery_date.strftime("%Y%m%d") + "20130213+0000300.000\n"
+        self.assertEqual(body, expected.encode("ascii"))
+        self.assertEqual(len(body), device_protocol.CONCISE_STATUS_LENGTH)
+
+    def test_sync(self):
+        today = datetime.date(2013, 2, 13)
+        status = models.OrreryStatus(400, 17.5, 300, today,
+            datetime.datetime.now())
+        body = device_protocol.encode_orrery_sync(
+            status,
+            models.OrreryConfig(400, True),
+            "e",
+            today
+        )
+        self.assertEqual(len(body), device_protocol.SYNC_LENGTH)
+        self.assertTrue(body.startswith(b"+00400.01\n"))
+        self.assertTrue(body.endswith(b"20130213+0000300.000\n"))
+
+    def test_clamp(self):
+        limit = device_protocol.MAX_ROTATIONS
+        self.assertEqual(device_protocol.clamp(-1e12, limit), -limit)
+        self.assertEqual(device_protocol.clamp(1e12, limit), limit)
+        self.assertEqual(device_protocol.clamp(300, limit), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Projection of future orrery dates from the reported status and configuration.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import datetime
+import threading
+
+import numpy
+
+import config
+import math_util
+
+
+# Forecast times are computed in whole microseconds so shorter steps would
+# truncate to zero
+MIN_STEP_SECONDS = 1e-6
+
+
+class ForecastRangeError(ValueError):
+    """Raised when a projected orrery date is outside of datetime.date."""
+    pass
+
+
+# Named tuple to model a series of projected orrery states.
+OrreryForecast = collections.namedtuple(
+    "OrreryForecast",
+    [
+        "datetimes",
+        "rotations",
+        "orrery_dates"
+    ]
+)
+
+
+def calc_rotations_per_second(config_entry):
+    """
+    Calculate how fast the orrery shaft turns at the configured motor speed.
+
+    @param config_entry: The orrery user configuration.
+    @type config_entry: models.OrreryConfig
+    @return: Shaft rotations per second.
+    @rtype: float
+    """
+    rotations_per_hour = config_entry.motor_speed * \
+        config.FORECAST_ROTATIONS_PER_SPEED_HOUR
+    return rotations_per_hour / 3600.0
+
+
+def forecast_orrery_dates(status_entry, config_entry, start, end,
+    step_seconds):
+    """
+    Project rotations and orrery dates forward at the configured motor speed.
+
+    Rotations are extrapolated linearly from the last reported status and all
+    points are computed in one vectorized pass.
+
+    @param status_entry: The last reported orrery status.
+    @type status_entry: models.OrreryStatus
+    @param config_entry: The orrery user configuration.
+    @type config_entry: models.OrreryConfig
+    @param start: The first time to project to.
+    @type start: datetime.datetime
+    @param end: The last time to project to (inclusive).
+    @type end: datetime.datetime
+    @param step_seconds: Seconds between projected points.
+    @type step_seconds: float
+    @return: The projected times, rotations, and orrery dates.
+    @rtype: OrreryForecast
+    @raises ForecastRangeError: Raised if a projected orrery date is before
+        datetime.date.min or after datetime.date.max.
+    """
+    step = numpy.timedelta64(int(step_seconds * 1000000), "us")
+    start = numpy.datetime64(start, "us")
+    end = numpy.datetime64(end, "us")
+    num_points = int((end - start) // step) + 1
+
+    datetimes = start + numpy.arange(num_points) * step
+    last_update = numpy.datetime64(status_entry.update_datetime, "us")
+    elapsed_seconds = (datetimes - last_update) / numpy.timedelta64(1, "s")
+
+    rotations = status_entry.rotations + \
+        elapsed_seconds * calc_rotations_per_second(config_entry)
+
+    # Check the day offsets before converting them to dates as
+    # math_util.calc_orrery_dates does not detect dates out of range
+    delta_days = math_util.calc_days_for_rotations(rotations)
+    min_days = (datetime.date.min - status_entry.start_date).days
+    max_days = (datetime.date.max - status_entry.start_date).days + 1
+    in_range = (delta_days >= min_days) & (delta_days < max_days)
+    if not numpy.all(in_range):
+        raise ForecastRangeError("Forecast orrery dates are out of range.")
+
+    orrery_dates = math_util.calc_orrery_dates(
+        rotations,
+        numpy.datetime64(status_entry.start_date, "D")
+    )
+    if numpy.any(numpy.isnat(orrery_dates)):
+        raise ForecastRangeError("Forecast orrery dates are out of range.")
+    return OrreryForecast(datetimes, rotations, orrery_dates)
+
+
+class ForecastCache:
+    """
+    Cache of rendered forecasts valid until the status or configuration change.
+
+    Entries are keyed by the forecast parameters, which include the orrery,
+    and remember the status update and configuration version they were based
+    on. An entry is replaced when its forecast is requested for different
+    versions, so a change to one orrery does not drop the forecasts of
+    another. All entries are dropped when the cache is full.
+    """
+
+    def __init__(self, max_entries):
+        """
+        Create a new, empty forecast cache.
+
+        @param max_entries: Maximum number of forecasts kept at once.
+        @type max_entries: int
+        """
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, versions, params, create_func):
+        """
+        Get a cached forecast or create and cache a new one.
+
+        @param versions: Tuple identifying the status update and configuration
+            version the forecast is based on.
+        @type versions: tuple
+        @param params: Hashable forecast parameters.
+        @type params: tuple
+        @param create_func: Function taking no arguments that creates the
+            forecast if it is not cached.
+        @type create_func: function
+        @return: The cached or newly created forecast.
+        """
+        with self.lock:
+            entry = self.entries.get(params)
+            if entry is not None and entry[0] == versions:
+                return entry[1]
+
+        value = create_func()
+
+        with self.lock:
+            if params not in self.entries and \
+                len(self.entries) >= self.max_entries:
+                self.entries = {}
+            self.entries[params] = (versions, value)
+        return value
+
+
+# Process-wide cache of rendered forecasts
+forecast_cache = ForecastCache(config.FORECAST_CACHE_MAX_ENTRIES)
@@ -0,0 +1,140 @@
+"""
+Tests for projecting orrery dates from the reported status and configuration.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import config
+import forecast
+import math_util
+import models
+
+
+TEST_START_DATE = datetime.date(2013, 2, 13)
+TEST_UPDATE_DATETIME = datetime.datetime(2013, 2, 13, 10, 0, 0)
+
+
+class TestForecastOrreryDates(unittest.TestCase):
+    """Test projecting rotations and orrery dates forward in time."""
+
+    def setUp(self):
+        self.status = models.OrreryStatus(
+            200,
+            100,
+            10,
+            TEST_START_DATE,
+            TEST_UPDATE_DATETIME
+        )
+        self.config = models.OrreryConfig(400, True)
+
+    def test_points(self):
+        end = TEST_UPDATE_DATETIME + datetime.timedelta(hours=24)
+        series = forecast.forecast_orrery_dates(
+            self.status,
+            self.config,
+            TEST_UPDATE_DATETIME,
+            end,
+            3600
+        )
+        self.assertEqual(len(series.datetimes), 25)
+        self.assertEqual(series.datetimes[0].astype(object),
+            TEST_UPDATE_DATETIME)
+        self.assertEqual(series.datetimes[-1].astype(object), end)
+        self.assertAlmostEqual(series.rotations[0], 10)
+
+        per_hour = 400 * config.FORECAST_ROTATIONS_PER_SPEED_HOUR
+        self.assertAlmostEqual(series.rotations[-1], 10 + 24 * per_hour)
+
+    def test_matches_scalar(self):
+        series = forecast.forecast_orrery_dates(
+            self.status,
+            self.config,
+            TEST_UPDATE_DATETIME,
+            TEST_UPDATE_DATETIME + datetime.timedelta(days=30),
+            600
+        )
+        for (rotations, orrery_date) in zip(series.rotations,
+            series.orrery_dates):
+            status = self.status._replace(rotations=rotations)
+            self.assertEqual(
+                orrery_date.astype(object),
+                math_util.calc_orrery_date(status)
+            )
+
+    def test_single_point(self):
+        series = forecast.forecast_orrery_dates(
+            self.status,
+            self.config,
+            TEST_UPDATE_DATETIME,
+            TEST_UPDATE_DATETIME,
+            60
+        )
+        self.assertEqual(len(series.datetimes), 1)
+
+    def test_stopped(self):
+        series = forecast.forecast_orrery_dates(
+            self.status,
+            models.OrreryConfig(0, True),
+            TEST_UPDATE_DATETIME,
+            TEST_UPDATE_DATETIME + datetime.timedelta(days=1),
+            3600
+        )
+        self.assertTrue((series.rotations == 10).all())
+
+    def test_out_of_range(self):
+        for at in [datetime.datetime(9999, 12, 31),
+            datetime.datetime(1, 1, 2)]:
+            with self.assertRaises(forecast.ForecastRangeError):
+                forecast.forecast_orrery_dates(
+                    self.status,
+                    self.config,
+                    at,
+                    at,
+                    60
+                )
+
+
+class TestForecastCache(unittest.TestCase):
+    """Test caching forecasts until the status or configuration change."""
+
+    def setUp(self):
+        self.cache = forecast.ForecastCache(2)
+        self.num_creates = 0
+
+    def create(self):
+        self.num_creates += 1
+        return self.num_creates
+
+    def test_hit(self):
+        self.assertEqual(self.cache.get("v1", "a", self.create), 1)
+        self.assertEqual(self.cache.get("v1", "a", self.create), 1)
+        self.assertEqual(self.cache.get("v1", "b", self.create), 2)
+        self.assertEqual(self.cache.get("v1", "a", self.create), 1)
+
+    def test_version_change(self):
+        self.cache.get("v1", "a", self.create)
+        self.cache.get("v1", "b", self.create)
+        self.assertEqual(self.cache.get("v2", "a", self.create), 3)
+        self.assertEqual(self.cache.get("v2", "b", self.create), 4)
+        self.assertEqual(self.num_creates, 4)
+
+    def test_independent_versions(self):
+        self.cache.get("v1", (1, "a"), self.create)
+        self.cache.get("v1", (2, "a"), self.create)
+        self.assertEqual(self.cache.get("v2", (1, "a"), self.create), 3)
+        self.assertEqual(self.cache.get("v1", (2, "a"), self.create), 2)
+
+    def test_max_entries(self):
+        self.cache.get("v1", "a", self.create)
+        self.cache.get("v1", "b", self.create)
+        self.cache.get("v1", "c", self.create)
+        self.assertTrue(len(self.cache.entries) <= 2)
+        self.assertEqual(self.cache.get("v1", "c", self.create), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Cooperative server entry point for the orrery web control web service.
+
+Serves the same Flask application as controllers on a gevent event loop.
+Sockets, locks, and threads are patched to yield to the loop and psycopg2 is
+made to wait on its connections cooperatively, so the unchanged models *_raw
+functions and connection pool run without blocking other requests. Slow
+database calls and long polls then occupy a greenlet instead of a whole
+worker process.
+
+Run directly with "python gevent_server.py" or through gunicorn with
+"gunicorn gevent_server:app -k gevent".
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+import psycogreen.gevent
+psycogreen.gevent.patch_psycopg()
+
+import os
+
+import gevent.pool
+import gevent.pywsgi
+
+import config
+import controllers
+import models
+
+
+app = controllers.app
+
+
+def create_server(port):
+    """
+    Create a cooperative WSGI server for the orrery web control application.
+
+    @param port: The port to listen on.
+    @type port: int
+    @return: Server limited to config.GEVENT_MAX_CONCURRENT_REQUESTS requests
+        in flight at once.
+    @rtype: gevent.pywsgi.WSGIServer
+    """
+    request_pool = gevent.pool.Pool(config.GEVENT_MAX_CONCURRENT_REQUESTS)
+    return gevent.pywsgi.WSGIServer(
+        ("0.0.0.0", port),
+        app,
+        spawn=request_pool
+    )
+
+
+if __name__ == "__main__":
+    # Bind to PORT if defined, otherwise default to 5000.
+    port = int(os.environ.get("PORT", 5000))
+    models.initalize_database()
+    create_server(port).serve_forever()
@@ -0,0 +1,132 @@
+"""
+Streaming encoders for exporting the orrery status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import json
+
+import serialization
+
+
+# Columns of an exported status sample in output order
+EXPORT_FIELDS = [
+    "update_datetime",
+    "start_date",
+    "motor_speed",
+    "motor_draw",
+    "rotations"
+]
+
+# Fields serialized as dates or datetimes that are exported as text
+TEXT_FIELDS = ["update_datetime", "start_date"]
+
+# Number of samples encoded into each chunk written to the client
+CHUNK_ROWS = 500
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson"
+}
+
+
+def orrery_status_to_export_dict(status):
+    """
+    Serialize an orrery status sample for export.
+
+    @param status: The status sample to serialize.
+    @type status: models.OrreryStatus
+    @return: Serialized sample with dates and times as strings.
+    @rtype: dict
+    """
+    status_dict = serialization.orrery_status_to_dict(status)
+    for field in TEXT_FIELDS:
+        status_dict[field] = str(status_dict[field])
+    return status_dict
+
+
+def encode_csv_line(status):
+    """
+    Encode a status sample as a line of comma separated values.
+
+    @param status: The status sample to encode.
+    @type status: models.OrreryStatus
+    @return: The sample's values in EXPORT_FIELDS order ending in a newline.
+    @rtype: str
+    """
+    status_dict = orrery_status_to_export_dict(status)
+    return ",".join(str(status_dict[field]) for field in EXPORT_FIELDS) + \
+        "\n"
+
+
+def encode_ndjson_line(status):
+    """
+    Encode a status sample as a line of newline delimited JSON.
+
+    @param status: The status sample to encode.
+    @type status: models.OrreryStatus
+    @return: The sample as a JSON object ending in a newline.
+    @rtype: str
+    """
+    return json.dumps(orrery_status_to_export_dict(status),
+        sort_keys=True) + "\n"
+
+
+def generate_chunks(lines, chunk_rows=CHUNK_ROWS):
+    """
+    Join encoded lines into chunks to write to the client.
+
+    The first line is sent on its own so the response starts as soon as the
+    first sample is read.
+
+    @param lines: Iterator over encoded lines.
+    @type lines: iterator over str
+    @param chunk_rows: Maximum number of lines in each later chunk.
+    @type chunk_rows: int
+    @return: Iterator over encoded chunks.
+    @rtype: iterator over bytes
+    """
+    buffered = []
+    is_first = True
+    for line in lines:
+        buffered.append(line)
+        if is_first or len(buffered) >= chunk_rows:
+            yield "".join(buffered).encode("utf-8")
+            buffered = []
+            is_first = False
+    if buffered:
+        yield "".join(buffered).encode("utf-8")
+
+
+def generate_csv(statuses):
+    """
+    Encode status samples as CSV with a header row.
+
+    @param statuses: Iterator over the status samples to export.
+    @type statuses: iterator over models.OrreryStatus
+    @return: Iterator over encoded chunks.
+    @rtype: iterator over bytes
+    """
+    yield (",".join(EXPORT_FIELDS) + "\n").encode("utf-8")
+    for chunk in generate_chunks(encode_csv_line(x) for x in statuses):
+        yield chunk
+
+
+def generate_ndjson(statuses):
+    """
+    Encode status samples as newline delimited JSON.
+
+    @param statuses: Iterator over the status samples to export.
+    @type statuses: iterator over models.OrreryStatus
+    @return: Iterator over encoded chunks.
+    @rtype: iterator over bytes
+    """
+    return generate_chunks(encode_ndjson_line(x) for x in statuses)
+
+
+# Encoder of each export format
+ENCODERS = {
+    "csv": generate_csv,
+    "ndjson": generate_ndjson
+}
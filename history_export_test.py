@@ -0,0 +1,75 @@
+"""
+Tests for the streaming status history export encoders.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import json
+import unittest
+
+import history_export
+import models
+
+
+TEST_START_DATE = datetime.date(2013, 2, 13)
+TEST_UPDATE_DATETIME = datetime.datetime(2013, 2, 13, 10, 0, 0)
+
+
+class TestHistoryExport(unittest.TestCase):
+    """Test encoding status samples as CSV and NDJSON chunks."""
+
+    def setUp(self):
+        self.statuses = [
+            models.OrreryStatus(200, 17.5, x, TEST_START_DATE,
+                TEST_UPDATE_DATETIME + datetime.timedelta(seconds=x))
+            for x in range(5)
+        ]
+
+    def test_csv(self):
+        chunks = list(history_export.generate_csv(iter(self.statuses)))
+        lines = b"".join(chunks).decode("utf-8").splitlines()
+        self.assertEqual(lines[0], ",".join(history_export.EXPORT_FIELDS))
+        self.assertEqual(lines[1], "2013-02-13 10:00:00,2013-02-13,200,17.5,0")
+        self.assertEqual(len(lines), 6)
+
+    def test_ndjson(self):
+        chunks = list(history_export.generate_ndjson(iter(self.statuses)))
+        samples = [
+            json.loads(line)
+            for line in b"".join(chunks).decode("utf-8").splitlines()
+        ]
+        self.assertEqual(len(samples), 5)
+        self.assertEqual(samples[4], {
+            "update_datetime": "2013-02-13 10:00:04",
+            "start_date": "2013-02-13",
+            "motor_speed": 200,
+            "motor_draw": 17.5,
+            "rotations": 4
+        })
+
+    def test_empty(self):
+        self.assertEqual(list(history_export.generate_ndjson(iter([]))), [])
+        self.assertEqual(len(list(history_export.generate_csv(iter([])))), 1)
+
+    def test_chunks(self):
+        lines = ["%d\n" % x for x in range(6)]
+        chunks = list(history_export.generate_chunks(iter(lines), 2))
+        self.assertEqual(chunks, [b"0\n", b"1\n2\n", b"3\n4\n", b"5\n"])
+
+    def test_lazy(self):
+        def statuses():
+            yield self.statuses[0]
+            raise RuntimeError("Storage failed.")
+
+        chunks = history_export.generate_csv(statuses())
+        self.assertEqual(next(chunks).decode("utf-8").split(",")[0],
+            "update_datetime")
+        self.assertTrue(next(chunks).decode("utf-8").startswith("2013"))
+        with self.assertRaises(RuntimeError):
+            next(chunks)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+"""
+Time partitioning and retention rules for the orrery status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import datetime
+import re
+
+import config
+
+
+# Period of each partition of the compacted status history
+COMPACT_PARTITION_PERIOD = "month"
+
+# Start of the time scale compacted intervals are aligned to
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Formats of the timestamps PostgreSQL reports in partition bounds
+PARTITION_BOUND_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f"]
+
+PARTITION_BOUND_REGEX = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+# Named tuple to model one time range partition of a history table. Start or
+# end is None for a range that is unbounded on that side.
+HistoryPartition = collections.namedtuple(
+    "HistoryPartition",
+    [
+        "name",
+        "start",
+        "end"
+    ]
+)
+
+
+# Named tuple to model the changes made by one run of history maintenance.
+HistoryMaintenanceResult = collections.namedtuple(
+    "HistoryMaintenanceResult",
+    [
+        "partitions_created",
+        "partitions_dropped",
+        "rollups_written"
+    ]
+)
+
+
+def get_period_start(moment, period):
+    """
+    Get the start of the partition period containing a moment.
+
+    @param moment: The moment to find the period of.
+    @type moment: datetime.datetime
+    @param period: Either "day" or "month".
+    @type period: str
+    @return: Midnight at the start of the day or month.
+    @rtype: datetime.datetime
+    @raises ValueError: Raised if the period is not known.
+    """
+    if period == "day":
+        return datetime.datetime(moment.year, moment.month, moment.day)
+    if period == "month":
+        return datetime.datetime(moment.year, moment.month, 1)
+    raise ValueError("Unknown history partition period: %s" % period)
+
+
+def get_next_period_start(period_start, period):
+    """
+    Get the start of the partition period following another.
+
+    @param period_start: The start of a period.
+    @type period_start: datetime.datetime
+    @param period: Either "day" or "month".
+    @type period: str
+    @return: The start of the next period.
+    @rtype: datetime.datetime
+    @raises ValueError: Raised if the period is not known.
+    """
+    if period == "day":
+        return period_start + datetime.timedelta(days=1)
+    if period == "month":
+        if period_start.month == 12:
+            return datetime.datetime(period_start.year + 1, 1, 1)
+        return datetime.datetime(period_start.year, period_start.month + 1, 1)
+    raise ValueError("Unknown history partition period: %s" % period)
+
+
+def get_partition_name(table, period_start, period):
+    """
+    Get the name of the partition of a table holding one period.
+
+    @param table: The name of the partitioned table.
+    @type table: str
+    @param period_start: The start of the period.
+    @type period_start: datetime.datetime
+    @param period: Either "day" or "month".
+    @type period: str
+    @return: The table name suffixed by the period, like
+        system_state_history_p20130213 or system_state_history_p201302.
+    @rtype: str
+    """
+    if period == "month":
+        return "%s_p%s" % (table, period_start.strftime("%Y%m"))
+    return "%s_p%s" % (table, period_start.strftime("%Y%m%d"))
+
+
+def parse_partition_bound_value(value):
+    """
+    Parse one side of a range partition bound as reported by PostgreSQL.
+
+    @param value: A quoted timestamp literal, MINVALUE, or MAXVALUE.
+    @type value: str
+    @return: The bounding timestamp or None if unbounded.
+    @rtype: datetime.datetime
+    @raises ValueError: Raised if the value is not a timestamp.
+    """
+    if value in ["MINVALUE", "MAXVALUE"]:
+        return None
+    value = value.strip("'")
+    for bound_format in PARTITION_BOUND_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, bound_format)
+        except ValueError:
+            pass
+    raise ValueError("Unexpected partition bound: %s" % value)
+
+
+def parse_partition_bound(name, bound):
+    """
+    Read a partition's time range from its bound expression.
+
+    @param name: The name of the partition.
+    @type name: str
+    @param bound: The bound as given by pg_get_expr, like FOR VALUES FROM
+        ('2013-02-13 00:00:00') TO ('2013-02-14 00:00:00').
+    @type bound: str
+    @return: The partition or None if it is the default partition.
+    @rtype: HistoryPartition
+    @raises ValueError: Raised if the bound is not a range of timestamps.
+    """
+    if bound == "DEFAULT":
+        return None
+    match = PARTITION_BOUND_REGEX.search(bound)
+    if match is None:
+        raise ValueError("Unexpected partition bound: %s" % bound)
+    return HistoryPartition(
+        name,
+        parse_partition_bound_value(match.group(1)),
+        parse_partition_bound_value(match.group(2))
+    )
+
+
+def overlaps(partition, start, end):
+    """
+    Check if a partition holds any time within a range.
+
+    @param partition: The partition to check.
+    @type partition: HistoryPartition
+    @param start: The start of the range.
+    @type start: datetime.datetime
+    @param end: The end of the range (exclusive).
+    @type end: datetime.datetime
+    @return: True if the ranges intersect and False otherwise.
+    @rtype: bool
+    """
+    starts_before_end = partition.start is None or partition.start < end
+    ends_after_start = partition.end is None or partition.end > start
+    return starts_before_end and ends_after_start
+
+
+def plan_new_partitions(table, partitions, first, last, period, num_ahead):
+    """
+    Find the partitions needed to hold a range of periods.
+
+    @param table: The name of the partitioned table.
+    @type table: str
+    @param partitions: The partitions the table already has.
+    @type partitions: list of HistoryPartition
+    @param first: A moment in the first period to hold.
+    @type first: datetime.datetime
+    @param last: A moment in the last period to hold before the ones ahead.
+    @type last: datetime.datetime
+    @param period: Either "day" or "month".
+    @type period: str
+    @param num_ahead: Number of periods after the last one to also hold.
+    @type num_ahead: int
+    @return: Partitions to create, oldest first, skipping any period that
+        already has rows in an existing partition.
+    @rtype: list of HistoryPartition
+    """
+    period_start = get_period_start(first, period)
+    end = get_period_start(last, period)
+    for i in range(num_ahead + 1):
+        end = get_next_period_start(end, period)
+
+    new_partitions = []
+    while period_start < end:
+        period_end = get_next_period_start(period_start, period)
+        is_held = any(
+            overlaps(partition, period_start, period_end)
+            for partition in partitions
+        )
+        if not is_held:
+            new_partitions.append(HistoryPartition(
+                get_partition_name(table, period_start, period),
+                period_start,
+                period_end
+            ))
+        period_start = period_end
+    return new_partitions
+
+
+def plan_expired_partitions(partitions, cutoff):
+    """
+    Find the partitions holding nothing newer than a cutoff.
+
+    @param partitions: The partitions of a table.
+    @type partitions: list of HistoryPartition
+    @param cutoff: The earliest time to keep.
+    @type cutoff: datetime.datetime
+    @return: Partitions that can be dropped, oldest first.
+    @rtype: list of HistoryPartition
+    """
+    expired = [
+        partition for partition in partitions
+        if partition.end is not None and partition.end <= cutoff
+    ]
+    return sorted(expired, key=lambda partition: partition.end)
+
+
+def get_retention_cutoffs(now):
+    """
+    Get the times before which history is compacted and then discarded.
+
+    @param now: The current time.
+    @type now: datetime.datetime
+    @return: Tuple of the time before which raw samples are compacted (given
+        by config.HISTORY_RAW_RETENTION_DAYS) and the time before which
+        compacted summaries are dropped (given by
+        config.HISTORY_COMPACT_RETENTION_DAYS).
+    @rtype: tuple
+    """
+    raw_retention = datetime.timedelta(days=config.HISTORY_RAW_RETENTION_DAYS)
+    compact_retention = datetime.timedelta(
+        days=config.HISTORY_COMPACT_RETENTION_DAYS
+    )
+    return (now - raw_retention, now - compact_retention)
+
+
+def get_compact_bucket_start(moment, bucket_seconds):
+    """
+    Get the start of the compacted interval containing a moment.
+
+    Intervals are aligned to the Unix epoch so that every storage backend
+    and every compaction run produces the same intervals.
+
+    @param moment: The moment to find the interval of.
+    @type moment: datetime.datetime
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @return: The start of the interval.
+    @rtype: datetime.datetime
+    """
+    offset = (moment - EPOCH).total_seconds()
+    bucket = offset // bucket_seconds
+    return EPOCH + datetime.timedelta(seconds=bucket * bucket_seconds)
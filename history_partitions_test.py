@@ -0,0 +1,143 @@
+"""
+Tests for the time partitioning and retention rules of the status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import config
+import history_partitions
+
+
+class TestHistoryPartitions(unittest.TestCase):
+    """Test partition periods, names, bounds, and planning."""
+
+    def setUp(self):
+        self.now = datetime.datetime(2013, 12, 31, 10, 30)
+
+    def test_periods(self):
+        day = history_partitions.get_period_start(self.now, "day")
+        self.assertEqual(day, datetime.datetime(2013, 12, 31))
+        self.assertEqual(
+            history_partitions.get_next_period_start(day, "day"),
+            datetime.datetime(2014, 1, 1)
+        )
+
+        month = history_partitions.get_period_start(self.now, "month")
+        self.assertEqual(month, datetime.datetime(2013, 12, 1))
+        self.assertEqual(
+            history_partitions.get_next_period_start(month, "month"),
+            datetime.datetime(2014, 1, 1)
+        )
+
+        with self.assertRaises(ValueError):
+            history_partitions.get_period_start(self.now, "week")
+
+    def test_names(self):
+        self.assertEqual(
+            history_partitions.get_partition_name("t", self.now, "day"),
+            "t_p20131231"
+        )
+        self.assertEqual(
+            history_partitions.get_partition_name("t", self.now, "month"),
+            "t_p201312"
+        )
+
+    def test_parse_bound(self):
+        partition = history_partitions.parse_partition_bound(
+            "t_p20131231",
+            "FOR VALUES FROM ('2013-12-31 00:00:00') TO "
+            "('2014-01-01 00:00:00')"
+        )
+        self.assertEqual(partition, history_partitions.HistoryPartition(
+            "t_p20131231",
+            datetime.datetime(2013, 12, 31),
+            datetime.datetime(2014, 1, 1)
+        ))
+
+        legacy = history_partitions.parse_partition_bound(
+            "t_legacy",
+            "FOR VALUES FROM (MINVALUE) TO ('2013-12-31 00:00:00.5')"
+        )
+        self.assertEqual(legacy.start, None)
+        self.assertEqual(legacy.end.microsecond, 500000)
+
+        self.assertEqual(
+            history_partitions.parse_partition_bound("t_default", "DEFAULT"),
+            None
+        )
+        with self.assertRaises(ValueError):
+            history_partitions.parse_partition_bound("t", "FOR VALUES IN (1)")
+
+    def test_plan_new(self):
+        legacy = history_partitions.HistoryPartition(
+            "t_legacy",
+            None,
+            datetime.datetime(2014, 1, 1)
+        )
+        new_partitions = history_partitions.plan_new_partitions(
+            "t",
+            [legacy],
+            self.now,
+            self.now,
+            "day",
+            2
+        )
+        self.assertEqual(
+            [x.name for x in new_partitions],
+            ["t_p20140101", "t_p20140102"]
+        )
+
+        new_partitions = history_partitions.plan_new_partitions(
+            "t",
+            new_partitions,
+            self.now,
+            self.now,
+            "month",
+            1
+        )
+        self.assertEqual([x.name for x in new_partitions], ["t_p201312"])
+
+    def test_plan_expired(self):
+        partitions = [
+            history_partitions.HistoryPartition(
+                "t_p%d" % day,
+                datetime.datetime(2013, 12, day),
+                datetime.datetime(2013, 12, day + 1)
+            )
+            for day in [3, 1, 2]
+        ]
+        expired = history_partitions.plan_expired_partitions(
+            partitions,
+            datetime.datetime(2013, 12, 3, 12)
+        )
+        self.assertEqual([x.name for x in expired], ["t_p1", "t_p2"])
+
+    def test_cutoffs(self):
+        (raw_cutoff, compact_cutoff) = \
+            history_partitions.get_retention_cutoffs(self.now)
+        self.assertEqual(
+            self.now - raw_cutoff,
+            datetime.timedelta(days=config.HISTORY_RAW_RETENTION_DAYS)
+        )
+        self.assertEqual(
+            self.now - compact_cutoff,
+            datetime.timedelta(days=config.HISTORY_COMPACT_RETENTION_DAYS)
+        )
+
+    def test_compact_bucket_start(self):
+        self.assertEqual(
+            history_partitions.get_compact_bucket_start(self.now, 3600),
+            datetime.datetime(2013, 12, 31, 10)
+        )
+        self.assertEqual(
+            history_partitions.get_compact_bucket_start(self.now, 86400 * 7),
+            datetime.datetime(2013, 12, 26)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
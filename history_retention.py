@@ -0,0 +1,171 @@
+"""
+Background retention and compaction of the orrery status history.
+
+Run directly to perform one round of maintenance, for example from cron when
+the background job is disabled with HISTORY_MAINTENANCE=false.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+import config
+import metrics
+import models
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryMaintenance:
+    """
+    Job that keeps the status history partitioned and within its retention.
+
+    Each process runs the job in a background thread started on first use,
+    once immediately and then every interval. The PostgreSQL backend lets only
+    one process at a time make changes, so other processes skip that round.
+    """
+
+    def __init__(self, maintain_func, interval):
+        """
+        Create a new maintenance job that has not yet run.
+
+        @param maintain_func: Function taking the current time that performs
+            maintenance and returns the changes made as a
+            history_partitions.HistoryMaintenanceResult or None if another
+            process was already performing maintenance.
+        @type maintain_func: function
+        @param interval: Seconds between rounds of maintenance.
+        @type interval: float
+        """
+        self.maintain_func = maintain_func
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.runner_pid = None
+
+        self.num_completed = 0
+        self.num_skipped = 0
+        self.num_failed = 0
+        self.num_partitions_created = 0
+        self.num_partitions_dropped = 0
+        self.num_rollups_written = 0
+        self.last_success_time = None
+
+    def ensure_runner(self):
+        """Start the maintenance thread for this process if not running."""
+        pid = os.getpid()
+        with self.lock:
+            if self.runner_pid == pid:
+                return
+            self.runner_pid = pid
+        runner = threading.Thread(target=self.run_runner)
+        runner.daemon = True
+        runner.start()
+
+    def run(self, now=None):
+        """
+        Perform one round of maintenance.
+
+        @param now: The current time (optional, defaults to now).
+        @type now: datetime.datetime
+        @return: The changes made or None if maintenance failed or was already
+            running in another process.
+        @rtype: history_partitions.HistoryMaintenanceResult
+        """
+        if now is None:
+            now = datetime.datetime.now()
+
+        try:
+            result = self.maintain_func(now)
+        except Exception:
+            logger.exception("Failed to maintain status history.")
+            with self.lock:
+                self.num_failed += 1
+            return None
+
+        with self.lock:
+            if result is None:
+                self.num_skipped += 1
+            else:
+                self.num_completed += 1
+                self.num_partitions_created += result.partitions_created
+                self.num_partitions_dropped += result.partitions_dropped
+                self.num_rollups_written += result.rollups_written
+                self.last_success_time = time.time()
+        return result
+
+    def run_runner(self):
+        """Perform maintenance now and then once every interval."""
+        while True:
+            self.run()
+            time.sleep(self.interval)
+
+    def get_stats(self):
+        """
+        Get counts of maintenance rounds and the changes they made.
+
+        @return: Dictionary of maintenance statistics for this process.
+        @rtype: dict
+        """
+        with self.lock:
+            return {
+                "completed": self.num_completed,
+                "skipped": self.num_skipped,
+                "failed": self.num_failed,
+                "partitions_created": self.num_partitions_created,
+                "partitions_dropped": self.num_partitions_dropped,
+                "rollups_written": self.num_rollups_written,
+                "last_success_time": self.last_success_time
+            }
+
+
+def collect_history_maintenance_metrics():
+    """
+    Report history maintenance activity for /metrics.
+
+    @return: List of (type, name, labels, value) tuples.
+    @rtype: list
+    """
+    stats = history_maintenance.get_stats()
+    collected = []
+    for outcome in ["completed", "skipped", "failed"]:
+        collected.append((
+            "counter",
+            "orrery_history_maintenance_total",
+            (("outcome", outcome),),
+            stats[outcome]
+        ))
+    for change in ["created", "dropped"]:
+        collected.append((
+            "counter",
+            "orrery_history_partitions_total",
+            (("change", change),),
+            stats["partitions_" + change]
+        ))
+    collected.append((
+        "counter",
+        "orrery_history_rollups_written_total",
+        (),
+        stats["rollups_written"]
+    ))
+    return collected
+
+
+# Process-wide status history maintenance job
+history_maintenance = HistoryMaintenance(
+    models.maintain_orrery_status_history,
+    config.HISTORY_MAINTENANCE_INTERVAL
+)
+
+metrics.registry.add_collector(collect_history_maintenance_metrics)
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    print(history_maintenance.run())
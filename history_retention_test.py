@@ -0,0 +1,61 @@
+"""
+Tests for the background retention and compaction of the status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import history_partitions
+import history_retention
+
+
+class TestHistoryMaintenance(unittest.TestCase):
+    """Test accounting of maintenance rounds."""
+
+    def setUp(self):
+        self.results = []
+        self.times = []
+        self.maintenance = history_retention.HistoryMaintenance(
+            self.maintain,
+            3600
+        )
+
+    def maintain(self, now):
+        self.times.append(now)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def test_run(self):
+        now = datetime.datetime(2013, 2, 13, 10)
+        result = history_partitions.HistoryMaintenanceResult(2, 1, 30)
+        self.results = [result, result, None, RuntimeError("Test")]
+
+        self.assertEqual(self.maintenance.run(now), result)
+        self.assertEqual(self.times, [now])
+        self.maintenance.run()
+        self.assertEqual(self.maintenance.run(), None)
+        self.assertEqual(self.maintenance.run(), None)
+
+        stats = self.maintenance.get_stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["partitions_created"], 4)
+        self.assertEqual(stats["partitions_dropped"], 2)
+        self.assertEqual(stats["rollups_written"], 60)
+        self.assertTrue(stats["last_success_time"] is not None)
+
+    def test_metrics(self):
+        collected = history_retention.collect_history_maintenance_metrics()
+        names = set(x[1] for x in collected)
+        self.assertTrue("orrery_history_maintenance_total" in names)
+        self.assertTrue("orrery_history_partitions_total" in names)
+
+
+if __name__ == '__main__':
+    unittest.main()
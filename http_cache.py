@@ -0,0 +1,150 @@
+"""
+HTTP cache validators and conditional request handling for API responses.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import calendar
+import datetime
+import time
+
+import flask
+
+
+def get_status_etag(record, render_full, today):
+    """
+    Get the entity tag for a rendered orrery status document.
+
+    @param record: The orrery status record being rendered.
+    @type record: models.OrreryStatus
+    @param render_full: True if the full status is rendered and False if the
+        concise status is rendered.
+    @type render_full: bool
+    @param today: The date rendered as the real date.
+    @type today: datetime.date
+    @return: Strong entity tag (without quotes) for the rendered document.
+    @rtype: str
+    """
+    if render_full:
+        kind = "full"
+    else:
+        kind = "concise"
+    return "status-%s-%s-%s" % (
+        kind,
+        record.update_datetime.strftime("%Y%m%dT%H%M%S.%f"),
+        today.strftime("%Y%m%d")
+    )
+
+
+def get_status_last_modified(record, today):
+    """
+    Get the last modification time of a rendered orrery status document.
+
+    The rendered document also changes when the real date rolls over so the
+    start of the current day is used if it is later than the last update.
+
+    @param record: The orrery status record being rendered.
+    @type record: models.OrreryStatus
+    @param today: The date rendered as the real date.
+    @type today: datetime.date
+    @return: Last modification time in UTC.
+    @rtype: datetime.datetime
+    """
+    day_start = datetime.datetime.combine(today, datetime.time())
+    last_modified = max(record.update_datetime, day_start)
+    timestamp = time.mktime(last_modified.timetuple())
+    return datetime.datetime.utcfromtimestamp(int(timestamp))
+
+
+def get_config_etag(version):
+    """
+    Get the entity tag for a rendered orrery user configuration document.
+
+    @param version: The configuration version as given by
+        models.get_orrery_config_version.
+    @type version: str
+    @return: Strong entity tag (without quotes) for the rendered document.
+    @rtype: str
+    """
+    return "config-%s" % version
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """
+    Determine if a conditional request can be answered with 304 Not Modified.
+
+    If-None-Match takes precedence over If-Modified-Since as in RFC 7232 and
+    uses weak comparison so that the weak entity tags of compressed responses
+    also match.
+
+    @param request: The request to check.
+    @type request: flask.Request
+    @param etag: Entity tag (without quotes) of the current document.
+    @type etag: str
+    @param last_modified: Last modification time of the current document in
+        UTC or None if not known.
+    @type last_modified: datetime.datetime
+    @return: True if the client's copy is current and False otherwise.
+    @rtype: bool
+    """
+    if request.headers.get("If-None-Match"):
+        return request.if_none_match.contains_weak(etag)
+
+    if_modified_since = request.if_modified_since
+    if last_modified is None or if_modified_since is None:
+        return False
+    since = calendar.timegm(if_modified_since.utctimetuple())
+    return calendar.timegm(last_modified.utctimetuple()) <= since
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Add cache validator headers to a response.
+
+    @param response: The response to add headers to.
+    @type response: flask.Response
+    @param etag: Entity tag (without quotes) of the document.
+    @type etag: str
+    @param last_modified: Last modification time of the document in UTC or
+        None if not known.
+    @type last_modified: datetime.datetime
+    @return: The given response.
+    @rtype: flask.Response
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def create_not_modified_response(etag, last_modified=None):
+    """
+    Create an empty 304 Not Modified response.
+
+    @param etag: Entity tag (without quotes) of the current document.
+    @type etag: str
+    @param last_modified: Last modification time of the current document in
+        UTC or None if not known.
+    @type last_modified: datetime.datetime
+    @return: Response with no body and the current validators.
+    @rtype: flask.Response
+    """
+    return set_validators(flask.Response(status=304), etag, last_modified)
+
+
+def create_validated_response(body, etag, last_modified=None):
+    """
+    Create a response for a rendered document with its cache validators.
+
+    @param body: The rendered document.
+    @type body: str
+    @param etag: Entity tag (without quotes) of the document.
+    @type etag: str
+    @param last_modified: Last modification time of the document in UTC or
+        None if not known.
+    @type last_modified: datetime.datetime
+    @return: Response with the document and its validators.
+    @rtype: flask.Response
+    """
+    return set_validators(flask.make_response(body), etag, last_modified)
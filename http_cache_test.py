@@ -0,0 +1,74 @@
+"""
+Tests for HTTP cache validators used by the API endpoints.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import flask
+
+import http_cache
+import models
+
+
+class TestHttpCache(unittest.TestCase):
+    """Test entity tags and conditional request checks."""
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.today = datetime.date.today()
+        now = datetime.datetime.now()
+        self.test_status = models.OrreryStatus(400, 17.5, 100, self.today, now)
+
+    def test_status_etag(self):
+        full_etag = http_cache.get_status_etag(self.test_status, True,
+            self.today)
+        concise_etag = http_cache.get_status_etag(self.test_status, False,
+            self.today)
+        self.assertNotEqual(full_etag, concise_etag)
+
+        tomorrow = self.today + datetime.timedelta(days=1)
+        next_day_etag = http_cache.get_status_etag(self.test_status, True,
+            tomorrow)
+        self.assertNotEqual(full_etag, next_day_etag)
+
+        later_status = self.test_status._replace(
+            update_datetime=self.test_status.update_datetime +
+                datetime.timedelta(microseconds=1)
+        )
+        later_etag = http_cache.get_status_etag(later_status, True, self.today)
+        self.assertNotEqual(full_etag, later_etag)
+
+    def test_if_none_match(self):
+        etag = http_cache.get_config_etag("abc")
+        headers = {"If-None-Match": '"%s"' % etag}
+        with self.app.test_request_context(headers=headers):
+            self.assertTrue(http_cache.is_not_modified(flask.request, etag))
+            self.assertFalse(http_cache.is_not_modified(
+                flask.request,
+                http_cache.get_config_etag("def")
+            ))
+
+    def test_if_modified_since(self):
+        last_modified = http_cache.get_status_last_modified(self.test_status,
+            self.today)
+        headers = {"If-Modified-Since": last_modified.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT"
+        )}
+        with self.app.test_request_context(headers=headers):
+            self.assertTrue(http_cache.is_not_modified(flask.request, "x",
+                last_modified))
+            self.assertFalse(http_cache.is_not_modified(flask.request, "x",
+                last_modified + datetime.timedelta(seconds=1)))
+
+    def test_unconditional(self):
+        with self.app.test_request_context():
+            self.assertFalse(http_cache.is_not_modified(flask.request, "x",
+                datetime.datetime.utcnow()))
+
+
+if __name__ == '__main__':
+    unittest.main()
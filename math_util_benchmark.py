@@ -0,0 +1,97 @@
+"""
+Benchmark of scalar versus vectorized orrery date calculation.
+
+Usage: python math_util_benchmark.py [number of rows]
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import random
+import sys
+import time
+
+import numpy
+
+import math_util
+import models
+
+
+DEFAULT_NUM_ROWS = 1000000
+
+
+def create_rows(num_rows):
+    """
+    Create random rotation counts and start dates to benchmark with.
+
+    @param num_rows: The number of rows to create.
+    @type num_rows: int
+    @return: Tuple of a list of rotation counts and a list of start dates.
+    @rtype: tuple
+    """
+    generator = random.Random(2013)
+    first_date = datetime.date(2013, 1, 1)
+    rotations = [generator.uniform(0, 100) for i in range(num_rows)]
+    start_dates = [
+        first_date + datetime.timedelta(days=generator.randint(0, 1000))
+        for i in range(num_rows)
+    ]
+    return (rotations, start_dates)
+
+
+def run_scalar(rotations, start_dates):
+    """
+    Calculate orrery dates one row at a time with calc_orrery_date.
+
+    @param rotations: Number of orrery shaft rotations for each row.
+    @type rotations: list of float
+    @param start_dates: Start date for each row.
+    @type start_dates: list of datetime.date
+    @return: The orrery date for each row.
+    @rtype: list of datetime.date
+    """
+    return [
+        math_util.calc_orrery_date(
+            models.OrreryStatus(0, 0, rotation, start_date, None)
+        )
+        for (rotation, start_date) in zip(rotations, start_dates)
+    ]
+
+
+def main():
+    """Run and report the benchmark."""
+    if len(sys.argv) > 1:
+        num_rows = int(sys.argv[1])
+    else:
+        num_rows = DEFAULT_NUM_ROWS
+
+    (rotations, start_dates) = create_rows(num_rows)
+
+    start = time.time()
+    scalar_dates = run_scalar(rotations, start_dates)
+    scalar_time = time.time() - start
+
+    start = time.time()
+    rotation_array = numpy.array(rotations, dtype=numpy.float64)
+    start_date_array = numpy.array(start_dates, dtype="datetime64[D]")
+    conversion_time = time.time() - start
+
+    start = time.time()
+    vector_dates = math_util.calc_orrery_dates(rotation_array, start_date_array)
+    vector_time = time.time() - start
+
+    if list(vector_dates.astype(object)) != scalar_dates:
+        raise RuntimeError("Vectorized dates differ from scalar dates.")
+
+    print("rows:       %d" % num_rows)
+    print("scalar:     %.3fs" % scalar_time)
+    print("vectorized: %.3fs (plus %.3fs converting lists to arrays)" % (
+        vector_time,
+        conversion_time
+    ))
+    print("speedup:    %.1fx" % (scalar_time / vector_time))
+
+
+if __name__ == "__main__":
+    main()
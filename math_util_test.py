@@ -0,0 +1,56 @@
+"""
+Tests for the orrery web control mathematical routines.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import random
+import unittest
+
+import math_util
+import models
+
+
+class TestCalcOrreryDates(unittest.TestCase):
+    """Test that the vectorized orrery date matches the scalar calculation."""
+
+    def assert_matches_scalar(self, rotations, start_dates):
+        orrery_dates = math_util.calc_orrery_dates(rotations, start_dates)
+        self.assertEqual(len(orrery_dates), len(rotations))
+        for (rotation, start_date, orrery_date) in zip(rotations, start_dates,
+            orrery_dates):
+            status = models.OrreryStatus(0, 0, rotation, start_date, None)
+            self.assertEqual(
+                orrery_date.astype(object),
+                math_util.calc_orrery_date(status)
+            )
+
+    def test_random(self):
+        generator = random.Random(2013)
+        rotations = [generator.uniform(-100, 100) for i in range(10000)]
+        start_dates = [
+            datetime.date(2013, 1, 1) +
+                datetime.timedelta(days=generator.randint(0, 1000))
+            for i in range(10000)
+        ]
+        self.assert_matches_scalar(rotations, start_dates)
+
+    def test_day_boundaries(self):
+        rotations = []
+        for days in range(-50, 50):
+            rotations.append(days / 90.4)
+            rotations.append((days + 0.5 / math_util.US_PER_DAY) / 90.4)
+            rotations.append((days - 0.5 / math_util.US_PER_DAY) / 90.4)
+        start_dates = [datetime.date(2013, 2, 13)] * len(rotations)
+        self.assert_matches_scalar(rotations, start_dates)
+
+    def test_integer_rotations(self):
+        rotations = list(range(-20, 20))
+        start_dates = [datetime.date(2013, 2, 13)] * len(rotations)
+        self.assert_matches_scalar(rotations, start_dates)
+
+
+if __name__ == '__main__':
+    unittest.main()
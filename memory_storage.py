@@ -0,0 +1,319 @@
+"""
+In-memory storage backend for single process deployments and benchmarks.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import bisect
+import threading
+
+import config
+import history_partitions
+import models
+
+
+class MemoryStorage:
+    """
+    Storage backend keeping the status, history, and configuration of every
+    orrery in process memory, each keyed by orrery ID.
+
+    Implements the storage functions of models with the same signatures and
+    semantics. Every operation holds a single lock so each one is atomic. Data
+    is lost when the process exits and is not shared between processes, so
+    this backend only suits single process servers, tests, and benchmarks.
+    History has no partitions, so maintenance trims the ordered lists of
+    samples and summaries instead.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statuses = {}
+        self.history_times = {}
+        self.history = {}
+        self.compacted_times = {}
+        self.compacted = {}
+        self.configs = {}
+
+    def check_orrery_table_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Check if an orrery has a status entry."""
+        with self.lock:
+            return orrery_id in self.statuses
+
+    def create_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create the status entry of an orrery."""
+        with self.lock:
+            if orrery_id in self.statuses:
+                raise models.DuplicateEntryError(
+                    "Orrery status entry already exists."
+                )
+            self.statuses[orrery_id] = new_status
+
+    def read_orrery_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the status of an orrery."""
+        with self.lock:
+            return self.statuses.get(orrery_id)
+
+    def update_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Update the status of an orrery if an entry exists."""
+        with self.lock:
+            if orrery_id in self.statuses:
+                self.statuses[orrery_id] = new_status
+
+    def upsert_orrery_status_locked(self, new_status, only_newer, orrery_id):
+        """
+        Create or update an orrery status keeping the original start date.
+
+        @param new_status: Record of the system's status to persist.
+        @type new_status: models.OrreryStatus
+        @param only_newer: True if an entry updated more recently than the new
+            status should be kept and False otherwise.
+        @type only_newer: bool
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @return: Record of the orrery system status as persisted.
+        @rtype: models.OrreryStatus
+        @note: Must be called with the storage lock held.
+        """
+        status = self.statuses.get(orrery_id)
+        if status is None:
+            self.statuses[orrery_id] = new_status
+            return new_status
+
+        is_older = status.update_datetime is not None and \
+            status.update_datetime > new_status.update_datetime
+        if not (only_newer and is_older):
+            status = new_status._replace(start_date=status.start_date)
+            self.statuses[orrery_id] = status
+        return status
+
+    def upsert_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create or update the status of an orrery keeping its start date."""
+        with self.lock:
+            return self.upsert_orrery_status_locked(
+                new_status,
+                False,
+                orrery_id
+            )
+
+    def sync_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create or update the status of an orrery and read its config."""
+        with self.lock:
+            stored_status = self.upsert_orrery_status_locked(
+                new_status,
+                False,
+                orrery_id
+            )
+            return (stored_status, self.configs.get(orrery_id))
+
+    def delete_orrery_status(self, orrery_id=None):
+        """Delete the status entry of an orrery or of every orrery."""
+        with self.lock:
+            if orrery_id is None:
+                self.statuses = {}
+            else:
+                self.statuses.pop(orrery_id, None)
+
+    def create_fleet_status_history_locked(self, samples):
+        """
+        Append status samples to the history keeping it ordered by time.
+
+        @param samples: Tuples of the orrery ID and the record of that orrery's
+            status to append.
+        @type samples: list of tuple
+        @note: Must be called with the storage lock held.
+        """
+        for (orrery_id, status) in samples:
+            times = self.history_times.setdefault(orrery_id, [])
+            history = self.history.setdefault(orrery_id, [])
+            index = bisect.bisect_right(times, status.update_datetime)
+            times.insert(index, status.update_datetime)
+            history.insert(index, status)
+
+    def create_orrery_status_history(self, statuses,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Append status samples of an orrery to the status history."""
+        with self.lock:
+            self.create_fleet_status_history_locked(
+                [(orrery_id, status) for status in statuses]
+            )
+
+    def create_fleet_status_history(self, samples):
+        """Append status samples of many orreries to the status history."""
+        with self.lock:
+            self.create_fleet_status_history_locked(samples)
+
+    def ingest_orrery_status_batch(self, statuses,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Record a batch of status samples and advance the current status."""
+        with self.lock:
+            stored_status = self.upsert_orrery_status_locked(
+                statuses[-1],
+                True,
+                orrery_id
+            )
+            start_date = stored_status.start_date
+            self.create_fleet_status_history_locked([
+                (orrery_id, status._replace(start_date=start_date))
+                for status in statuses
+            ])
+            return stored_status
+
+    def read_orrery_status_history(self, start, end,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the status samples of an orrery recorded within a time range."""
+        with self.lock:
+            times = self.history_times.get(orrery_id, [])
+            first = bisect.bisect_left(times, start)
+            last = bisect.bisect_left(times, end)
+            return self.history.get(orrery_id, [])[first:last]
+
+    def stream_orrery_status_history(self, start, end, fetch_size,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """
+        Iterate over the orrery status samples recorded within a time range.
+
+        The samples already live in process memory so the matching ones are
+        yielded directly without chunking. Like the other backends this
+        returns a generator, which callers may close before it is exhausted.
+        """
+        for status in self.read_orrery_status_history(start, end, orrery_id):
+            yield status
+
+    def rollup_orrery_status_history(self, start, end, bucket_seconds,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Summarize the status history in fixed-width time intervals."""
+        return models.summarize_orrery_status_history(
+            self.read_orrery_status_history(start, end, orrery_id),
+            start,
+            bucket_seconds
+        )
+
+    def delete_orrery_status_history(self, orrery_id=None):
+        """Delete the status history of an orrery or of every orrery."""
+        with self.lock:
+            if orrery_id is None:
+                self.history_times = {}
+                self.history = {}
+                self.compacted_times = {}
+                self.compacted = {}
+            else:
+                self.history_times.pop(orrery_id, None)
+                self.history.pop(orrery_id, None)
+                self.compacted_times.pop(orrery_id, None)
+                self.compacted.pop(orrery_id, None)
+
+    def read_compacted_orrery_status_history(self, start, end,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the compacted summaries of an orrery within a time range."""
+        with self.lock:
+            times = self.compacted_times.get(orrery_id, [])
+            first = bisect.bisect_left(times, start)
+            last = bisect.bisect_left(times, end)
+            return self.compacted.get(orrery_id, [])[first:last]
+
+    def maintain_orrery_status_history(self, now):
+        """
+        Compact samples past the raw retention and drop expired summaries.
+
+        @param now: The current time.
+        @type now: datetime.datetime
+        @return: The changes made.
+        @rtype: history_partitions.HistoryMaintenanceResult
+        """
+        (raw_cutoff, compact_cutoff) = \
+            history_partitions.get_retention_cutoffs(now)
+        num_rollups = 0
+        with self.lock:
+            for (orrery_id, times) in self.history_times.items():
+                history = self.history[orrery_id]
+                first = bisect.bisect_left(times, compact_cutoff)
+                num_expired = bisect.bisect_left(times, raw_cutoff)
+                samples = [
+                    (orrery_id, status)
+                    for status in history[first:num_expired]
+                ]
+                compacted = models.compact_orrery_status_history(
+                    samples,
+                    config.HISTORY_COMPACT_BUCKET
+                )
+                compacted_times = self.compacted_times.setdefault(
+                    orrery_id,
+                    []
+                )
+                compacted_history = self.compacted.setdefault(orrery_id, [])
+                for (compacted_orrery_id, rollup) in compacted:
+                    index = bisect.bisect_right(
+                        compacted_times,
+                        rollup.bucket_start
+                    )
+                    compacted_times.insert(index, rollup.bucket_start)
+                    compacted_history.insert(index, rollup)
+                num_rollups += len(compacted)
+                del times[:num_expired]
+                del history[:num_expired]
+
+            for (orrery_id, times) in self.compacted_times.items():
+                num_expired = bisect.bisect_left(times, compact_cutoff)
+                del times[:num_expired]
+                del self.compacted[orrery_id][:num_expired]
+
+        return history_partitions.HistoryMaintenanceResult(0, 0, num_rollups)
+
+    def check_orrery_config_table(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Check if an orrery has a user configuration entry."""
+        with self.lock:
+            return orrery_id in self.configs
+
+    def create_orrery_config(self, new_config,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create the user configuration entry of an orrery."""
+        with self.lock:
+            if orrery_id in self.configs:
+                raise models.DuplicateEntryError(
+                    "Orrery config entry already exists."
+                )
+            self.configs[orrery_id] = new_config
+
+    def read_orrery_config(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the current user configuration of an orrery."""
+        with self.lock:
+            return self.configs.get(orrery_id)
+
+    def update_orrery_config(self, new_config,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Update the user configuration of an orrery if an entry exists."""
+        with self.lock:
+            if orrery_id in self.configs:
+                self.configs[orrery_id] = new_config
+
+    def delete_orrery_config(self, orrery_id=None):
+        """Delete the user configuration of an orrery or of every orrery."""
+        with self.lock:
+            if orrery_id is None:
+                self.configs = {}
+            else:
+                self.configs.pop(orrery_id, None)
+
+    def initalize_database(self):
+        """Add the default orrery's user configuration if none exists."""
+        with self.lock:
+            if models.DEFAULT_ORRERY_ID not in self.configs:
+                self.configs[models.DEFAULT_ORRERY_ID] = models.OrreryConfig(
+                    config.DEFAULT_ORRERY_CONFIG_SPEED,
+                    config.DEFAULT_RELAY_STATUS
+                )
+
+    def get_orrery_config_and_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the user configuration and status of an orrery together."""
+        with self.lock:
+            return (
+                self.configs.get(orrery_id),
+                self.statuses.get(orrery_id)
+            )
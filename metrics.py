@@ -0,0 +1,628 @@
+"""
+Request, storage, and connection pool instrumentation in Prometheus format.
+
+Measurements are kept in process memory behind a single lock. When
+config.METRICS_DIR is set, each process also writes a snapshot of its
+measurements to that directory so that /metrics served by any one gunicorn
+worker reports the sum over all workers. Counters and histograms of exited
+workers are kept while gauges are only reported for running processes.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import bisect
+import errno
+import json
+import logging
+import os
+import threading
+import time
+
+import psycopg2.extensions
+
+import config
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SNAPSHOT_PREFIX = "metrics-"
+SNAPSHOT_SUFFIX = ".json"
+
+# Type and help text of every metric
+METRIC_INFO = {
+    "orrery_http_requests_total": (
+        "counter",
+        "HTTP requests handled by route, method, and status code."
+    ),
+    "orrery_http_request_duration_seconds": (
+        "histogram",
+        "Time from the start of request handling to the response."
+    ),
+    "orrery_http_request_storage_seconds": (
+        "histogram",
+        "Time each request spent in storage functions."
+    ),
+    "orrery_http_compressed_responses_total": (
+        "counter",
+        "Responses compressed by route and encoding."
+    ),
+    "orrery_http_compression_input_bytes_total": (
+        "counter",
+        "Bytes of response documents before compression."
+    ),
+    "orrery_http_compression_output_bytes_total": (
+        "counter",
+        "Bytes of response documents after compression."
+    ),
+    "orrery_http_compression_cpu_seconds_total": (
+        "counter",
+        "Thread CPU time spent compressing responses."
+    ),
+    "orrery_render_duration_seconds": (
+        "histogram",
+        "Time spent rendering response documents by function."
+    ),
+    "orrery_storage_calls_total": (
+        "counter",
+        "Calls to models storage functions by function and outcome."
+    ),
+    "orrery_storage_call_duration_seconds": (
+        "histogram",
+        "Duration of models storage functions including retries."
+    ),
+    "orrery_db_statements_total": (
+        "counter",
+        "Statements sent to PostgreSQL by models function."
+    ),
+    "orrery_db_retries_total": (
+        "counter",
+        "Operations retried after an OperationalError by reason."
+    ),
+    "orrery_db_pool_connections": (
+        "gauge",
+        "Open pooled database connections by state."
+    ),
+    "orrery_db_pool_max_connections": (
+        "gauge",
+        "Maximum pooled database connections."
+    ),
+    "orrery_db_pool_events_total": (
+        "counter",
+        "Connection pool checkouts, opened, discarded, and reaped connections, "
+        "and checkout timeouts."
+    ),
+    "orrery_db_pool_wait_seconds_total": (
+        "counter",
+        "Total time spent waiting to check out a pooled connection."
+    )
+}
+
+
+def parse_buckets(value):
+    """
+    Parse histogram bucket upper bounds.
+
+    @param value: Comma separated upper bounds in seconds.
+    @type value: str
+    @return: Sorted upper bounds.
+    @rtype: list of float
+    """
+    return sorted(float(bound) for bound in value.split(","))
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges, and histograms recorded by one process.
+
+    Metrics are identified by name and a tuple of (label, value) pairs.
+    """
+
+    def __init__(self, buckets):
+        """
+        Create a new, empty registry.
+
+        @param buckets: Upper bounds of histogram buckets in seconds.
+        @type buckets: list of float
+        """
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.writer_pid = None
+
+    def inc(self, name, labels=(), amount=1):
+        """
+        Increase a counter.
+
+        @param name: The counter's name.
+        @type name: str
+        @param labels: Tuple of (label, value) pairs.
+        @type labels: tuple
+        @param amount: The amount to add.
+        @type amount: float
+        """
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """
+        Record a value in a histogram.
+
+        @param name: The histogram's name.
+        @type name: str
+        @param labels: Tuple of (label, value) pairs.
+        @type labels: tuple
+        @param value: The value to record, usually seconds.
+        @type value: float
+        """
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self.histograms[key] = histogram
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        """
+        Register a function that reports current values when snapshotted.
+
+        @param collector: Function taking no arguments that returns a list of
+            (type, name, labels, value) tuples where type is "counter" or
+            "gauge" and value is the current total.
+        @type collector: function
+        """
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        """
+        Get all current values in a form that can be serialized as JSON.
+
+        @return: Dictionary with counters, gauges, and histograms of this
+            process.
+        @rtype: dict
+        """
+        collected = []
+        for collector in self.collectors:
+            try:
+                collected.extend(collector())
+            except Exception:
+                logger.exception("Metrics collector failed.")
+
+        with self.lock:
+            counters = [
+                [name, list(labels), value]
+                for ((name, labels), value) in self.counters.items()
+            ]
+            histograms = [
+                [name, list(labels), list(counts), total, count]
+                for ((name, labels), (counts, total, count))
+                in self.histograms.items()
+            ]
+
+        gauges = []
+        for (metric_type, name, labels, value) in collected:
+            if metric_type == "gauge":
+                gauges.append([name, list(labels), value])
+            else:
+                counters.append([name, list(labels), value])
+
+        return {
+            "pid": os.getpid(),
+            "buckets": self.buckets,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms
+        }
+
+    def ensure_writer(self):
+        """Start the snapshot writer thread for this process if needed."""
+        if not config.METRICS_DIR:
+            return
+        pid = os.getpid()
+        with self.lock:
+            if self.writer_pid == pid:
+                return
+            self.writer_pid = pid
+        writer = threading.Thread(target=self.run_writer)
+        writer.daemon = True
+        writer.start()
+
+    def write_snapshot(self):
+        """Write this process' snapshot to config.METRICS_DIR."""
+        snapshot = self.snapshot()
+        path = os.path.join(
+            config.METRICS_DIR,
+            "%s%d%s" % (SNAPSHOT_PREFIX, snapshot["pid"], SNAPSHOT_SUFFIX)
+        )
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.rename(temp_path, path)
+
+    def run_writer(self):
+        """Write snapshots periodically for as long as the process runs."""
+        while True:
+            time.sleep(config.METRICS_WRITE_INTERVAL)
+            try:
+                self.write_snapshot()
+            except Exception:
+                logger.exception("Could not write metrics snapshot.")
+
+    def read_snapshots(self):
+        """
+        Get the snapshots of all processes sharing config.METRICS_DIR.
+
+        The current process' snapshot is taken fresh rather than read back.
+
+        @return: Snapshots of this and all other processes.
+        @rtype: list of dict
+        """
+        own_snapshot = self.snapshot()
+        if not config.METRICS_DIR:
+            return [own_snapshot]
+
+        snapshots = [own_snapshot]
+        own_name = "%s%d%s" % (
+            SNAPSHOT_PREFIX,
+            own_snapshot["pid"],
+            SNAPSHOT_SUFFIX
+        )
+        for file_name in os.listdir(config.METRICS_DIR):
+            is_snapshot = file_name.startswith(SNAPSHOT_PREFIX) and \
+                file_name.endswith(SNAPSHOT_SUFFIX)
+            if not is_snapshot or file_name == own_name:
+                continue
+            try:
+                path = os.path.join(config.METRICS_DIR, file_name)
+                with open(path) as snapshot_file:
+                    snapshots.append(json.load(snapshot_file))
+            except (IOError, OSError, ValueError):
+                logger.warning("Skipping unreadable metrics snapshot %s.",
+                    file_name)
+        return snapshots
+
+
+def is_process_running(pid):
+    """
+    Determine if a process exists.
+
+    @param pid: The process ID to check.
+    @type pid: int
+    @return: True if the process exists and False otherwise.
+    @rtype: bool
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+    return True
+
+
+def merge_snapshots(snapshots):
+    """
+    Sum the measurements of several processes.
+
+    @param snapshots: Snapshots as given by MetricsRegistry.snapshot.
+    @type snapshots: list of dict
+    @return: Tuple of dictionaries from (name, labels) to counter values,
+        gauge values, and histograms as (buckets, counts, sum, count) tuples.
+    @rtype: tuple
+    """
+    counters = {}
+    gauges = {}
+    histograms = {}
+    own_pid = os.getpid()
+    for snapshot in snapshots:
+        for (name, labels, value) in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+
+        is_running = snapshot["pid"] == own_pid or \
+            is_process_running(snapshot["pid"])
+        if is_running:
+            for (name, labels, value) in snapshot["gauges"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                gauges[key] = gauges.get(key, 0) + value
+
+        buckets = snapshot["buckets"]
+        for (name, labels, counts, total, count) in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            if key not in histograms:
+                histograms[key] = (buckets, list(counts), total, count)
+                continue
+            (old_buckets, old_counts, old_total, old_count) = histograms[key]
+            if old_buckets != buckets:
+                continue
+            histograms[key] = (
+                buckets,
+                [x + y for (x, y) in zip(old_counts, counts)],
+                old_total + total,
+                old_count + count
+            )
+    return (counters, gauges, histograms)
+
+
+def format_labels(labels, extra=()):
+    """
+    Format labels for the Prometheus text format.
+
+    @param labels: Tuple of (label, value) pairs.
+    @type labels: tuple
+    @param extra: Additional (label, value) pairs to append.
+    @type extra: tuple
+    @return: Labels in braces or an empty string if there are none.
+    @rtype: str
+    """
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        '%s="%s"' % (
+            label,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+                "\n", "\\n")
+        )
+        for (label, value) in pairs
+    ]
+    return "{%s}" % ",".join(escaped)
+
+
+def format_value(value):
+    """
+    Format a sample value for the Prometheus text format.
+
+    @param value: The value to format.
+    @type value: float
+    @return: The formatted value.
+    @rtype: str
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_metrics(snapshots):
+    """
+    Render measurements in the Prometheus text exposition format.
+
+    @param snapshots: Snapshots as given by MetricsRegistry.snapshot.
+    @type snapshots: list of dict
+    @return: The metrics document.
+    @rtype: str
+    """
+    (counters, gauges, histograms) = merge_snapshots(snapshots)
+
+    series_by_name = {}
+    for ((name, labels), value) in list(counters.items()) + \
+        list(gauges.items()):
+        series_by_name.setdefault(name, []).append((labels, [
+            "%s%s %s" % (name, format_labels(labels), format_value(value))
+        ]))
+    for ((name, labels), histogram) in histograms.items():
+        (buckets, counts, total, count) = histogram
+        lines = []
+        cumulative = 0
+        for (bound, bucket_count) in zip(buckets + [float("inf")], counts):
+            cumulative += bucket_count
+            lines.append("%s_bucket%s %s" % (
+                name,
+                format_labels(labels, [("le", format_value(bound))]),
+                format_value(cumulative)
+            ))
+        lines.append("%s_sum%s %s" % (
+            name,
+            format_labels(labels),
+            format_value(total)
+        ))
+        lines.append("%s_count%s %s" % (
+            name,
+            format_labels(labels),
+            format_value(count)
+        ))
+        series_by_name.setdefault(name, []).append((labels, lines))
+
+    lines = []
+    for name in sorted(series_by_name.keys()):
+        (metric_type, help_text) = METRIC_INFO.get(name, ("untyped", name))
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, metric_type))
+        for (labels, series_lines) in sorted(series_by_name[name]):
+            lines.extend(series_lines)
+    return "\n".join(lines) + "\n"
+
+
+class StatementCountingCursor(psycopg2.extensions.cursor):
+    """Database cursor that counts the statements it sends."""
+
+    def __init__(self, *args, **kwargs):
+        psycopg2.extensions.cursor.__init__(self, *args, **kwargs)
+        self.num_statements = 0
+
+    def execute(self, *args, **kwargs):
+        self.num_statements += 1
+        return psycopg2.extensions.cursor.execute(self, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.num_statements += 1
+        return psycopg2.extensions.cursor.executemany(self, *args, **kwargs)
+
+
+# Per-thread accounting of the request being handled
+request_state = threading.local()
+
+
+def start_request():
+    """Begin timing a request handled by the current thread."""
+    if not config.METRICS_ENABLED:
+        return
+    registry.ensure_writer()
+    request_state.start = time.time()
+    request_state.storage_seconds = 0.0
+
+
+def finish_request(route, method, status_code):
+    """
+    Record a request handled by the current thread.
+
+    @param route: The matched URL rule or "unmatched".
+    @type route: str
+    @param method: The HTTP method.
+    @type method: str
+    @param status_code: The response status code.
+    @type status_code: int
+    """
+    start = getattr(request_state, "start", None)
+    if start is None:
+        return
+    request_state.start = None
+
+    labels = (("route", route), ("method", method))
+    registry.inc(
+        "orrery_http_requests_total",
+        labels + (("status", str(status_code)),)
+    )
+    registry.observe(
+        "orrery_http_request_duration_seconds",
+        labels,
+        time.time() - start
+    )
+    registry.observe(
+        "orrery_http_request_storage_seconds",
+        labels,
+        request_state.storage_seconds
+    )
+
+
+def record_storage_call(function_name, duration, outcome):
+    """
+    Record a call to a models storage function.
+
+    @param function_name: The name of the models function.
+    @type function_name: str
+    @param duration: Seconds the call took.
+    @type duration: float
+    @param outcome: "ok" or "error".
+    @type outcome: str
+    """
+    if not config.METRICS_ENABLED:
+        return
+    labels = (("function", function_name),)
+    registry.inc(
+        "orrery_storage_calls_total",
+        labels + (("outcome", outcome),)
+    )
+    registry.observe("orrery_storage_call_duration_seconds", labels, duration)
+    if getattr(request_state, "start", None) is not None:
+        request_state.storage_seconds += duration
+
+
+def record_statements(function_name, num_statements):
+    """
+    Record statements sent to PostgreSQL by a models function.
+
+    @param function_name: The name of the models function.
+    @type function_name: str
+    @param num_statements: The number of statements sent.
+    @type num_statements: int
+    """
+    if config.METRICS_ENABLED and num_statements:
+        registry.inc(
+            "orrery_db_statements_total",
+            (("function", function_name),),
+            num_statements
+        )
+
+
+def record_retry(reason):
+    """
+    Record an operation retried after an OperationalError.
+
+    @param reason: "reconnect" if the connection was discarded or "reprepare"
+        if prepared statements were lost.
+    @type reason: str
+    """
+    if config.METRICS_ENABLED:
+        registry.inc("orrery_db_retries_total", (("reason", reason),))
+
+
+def record_compression(route, encoding, input_bytes, output_bytes,
+    cpu_seconds):
+    """
+    Record a compressed response.
+
+    The compression ratio is the output bytes divided by the input bytes.
+
+    @param route: The matched URL rule or "unmatched".
+    @type route: str
+    @param encoding: The content coding used.
+    @type encoding: str
+    @param input_bytes: Size of the document before compression.
+    @type input_bytes: int
+    @param output_bytes: Size of the document after compression.
+    @type output_bytes: int
+    @param cpu_seconds: Thread CPU time spent compressing.
+    @type cpu_seconds: float
+    """
+    if not config.METRICS_ENABLED:
+        return
+    labels = (("route", route), ("encoding", encoding))
+    registry.inc("orrery_http_compressed_responses_total", labels)
+    registry.inc("orrery_http_compression_input_bytes_total", labels,
+        input_bytes)
+    registry.inc("orrery_http_compression_output_bytes_total", labels,
+        output_bytes)
+    registry.inc("orrery_http_compression_cpu_seconds_total", labels,
+        cpu_seconds)
+
+
+def timed_render(func):
+    """
+    Decorate a rendering function to record its duration.
+
+    @param func: The function rendering a response document.
+    @type func: function
+    @return: Function that renders the same document and records how long
+        it took.
+    @rtype: function
+    """
+    labels = (("function", func.__name__),)
+
+    def timed_func(*args, **kwargs):
+        if not config.METRICS_ENABLED:
+            return func(*args, **kwargs)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            registry.observe(
+                "orrery_render_duration_seconds",
+                labels,
+                time.time() - start
+            )
+
+    timed_func.__name__ = func.__name__
+    timed_func.__doc__ = func.__doc__
+    return timed_func
+
+
+def render_all_processes():
+    """
+    Render the measurements of all processes sharing config.METRICS_DIR.
+
+    @return: The metrics document in Prometheus text format.
+    @rtype: str
+    """
+    return render_metrics(registry.read_snapshots())
+
+
+# Process-wide metrics registry
+registry = MetricsRegistry(parse_buckets(config.METRICS_BUCKETS))
@@ -0,0 +1,195 @@
+"""
+Tests for request, storage, and connection pool instrumentation.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import config
+import metrics
+
+
+TEST_BUCKETS = [0.1, 1.0]
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test recording and rendering measurements of one process."""
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry(TEST_BUCKETS)
+
+    def test_parse_buckets(self):
+        self.assertEqual(metrics.parse_buckets("1, 0.1,0.5"), [0.1, 0.5, 1.0])
+
+    def test_counter(self):
+        labels = (("route", "/api/status.json"),)
+        self.registry.inc("orrery_http_requests_total", labels)
+        self.registry.inc("orrery_http_requests_total", labels, 2)
+
+        rendered = metrics.render_metrics([self.registry.snapshot()])
+        self.assertIn("# TYPE orrery_http_requests_total counter", rendered)
+        self.assertIn(
+            'orrery_http_requests_total{route="/api/status.json"} 3.0',
+            rendered
+        )
+
+    def test_histogram(self):
+        labels = (("function", "read_orrery_status"),)
+        name = "orrery_storage_call_duration_seconds"
+        for value in [0.05, 0.1, 0.5, 2]:
+            self.registry.observe(name, labels, value)
+
+        lines = metrics.render_metrics([self.registry.snapshot()]).split("\n")
+        self.assertEqual(lines[1], "# TYPE %s histogram" % name)
+        self.assertEqual(lines[2:7], [
+            '%s_bucket{function="read_orrery_status",le="0.1"} 2.0' % name,
+            '%s_bucket{function="read_orrery_status",le="1.0"} 3.0' % name,
+            '%s_bucket{function="read_orrery_status",le="+Inf"} 4.0' % name,
+            '%s_sum{function="read_orrery_status"} 2.65' % name,
+            '%s_count{function="read_orrery_status"} 4.0' % name
+        ])
+
+    def test_collector(self):
+        self.registry.add_collector(lambda: [
+            ("gauge", "orrery_db_pool_max_connections", (), 10),
+            ("counter", "orrery_db_pool_events_total",
+                (("event", "checkouts"),), 7)
+        ])
+        rendered = metrics.render_metrics([self.registry.snapshot()])
+        self.assertIn("orrery_db_pool_max_connections 10.0", rendered)
+        self.assertIn(
+            'orrery_db_pool_events_total{event="checkouts"} 7.0',
+            rendered
+        )
+
+    def test_escape_labels(self):
+        self.assertEqual(
+            metrics.format_labels((("route", 'a"b\\c'),)),
+            '{route="a\\"b\\\\c"}'
+        )
+
+
+class TestMetricsSnapshots(unittest.TestCase):
+    """Test combining measurements of several processes."""
+
+    def setUp(self):
+        self.original_dir = config.METRICS_DIR
+        self.temp_dir = tempfile.mkdtemp()
+        config.METRICS_DIR = self.temp_dir
+
+    def tearDown(self):
+        config.METRICS_DIR = self.original_dir
+        shutil.rmtree(self.temp_dir)
+
+    def get_exited_pid(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        return process.pid
+
+    def test_merge(self):
+        registry = metrics.MetricsRegistry(TEST_BUCKETS)
+        registry.inc("orrery_db_retries_total", (("reason", "reconnect"),))
+        registry.observe("orrery_render_duration_seconds", (), 0.5)
+        registry.add_collector(lambda: [
+            ("gauge", "orrery_db_pool_max_connections", (), 10)
+        ])
+        registry.write_snapshot()
+
+        other_snapshot = registry.snapshot()
+        other_snapshot["pid"] = self.get_exited_pid()
+        other_path = os.path.join(
+            self.temp_dir,
+            "metrics-%d.json" % other_snapshot["pid"]
+        )
+        with open(other_path, "w") as snapshot_file:
+            json.dump(other_snapshot, snapshot_file)
+
+        snapshots = registry.read_snapshots()
+        self.assertEqual(len(snapshots), 2)
+
+        rendered = metrics.render_metrics(snapshots)
+        self.assertIn(
+            'orrery_db_retries_total{reason="reconnect"} 2.0',
+            rendered
+        )
+        self.assertIn("orrery_render_duration_seconds_count 2.0", rendered)
+        self.assertIn("orrery_db_pool_max_connections 10.0", rendered)
+
+    def test_skip_unreadable(self):
+        with open(os.path.join(self.temp_dir, "metrics-1.json"), "w") as f:
+            f.write("{")
+        registry = metrics.MetricsRegistry(TEST_BUCKETS)
+        self.assertEqual(len(registry.read_snapshots()), 1)
+
+
+class TestRequestMetrics(unittest.TestCase):
+    """Test per-request accounting and timed rendering."""
+
+    def setUp(self):
+        self.original_registry = metrics.registry
+        self.original_enabled = config.METRICS_ENABLED
+        self.original_dir = config.METRICS_DIR
+        metrics.registry = metrics.MetricsRegistry(TEST_BUCKETS)
+        config.METRICS_ENABLED = True
+        config.METRICS_DIR = ""
+
+    def tearDown(self):
+        metrics.registry = self.original_registry
+        config.METRICS_ENABLED = self.original_enabled
+        config.METRICS_DIR = self.original_dir
+
+    def test_request(self):
+        metrics.start_request()
+        metrics.record_storage_call("read_orrery_status", 0.25, "ok")
+        metrics.finish_request("/api/status.json", "GET", 200)
+        metrics.finish_request("/api/status.json", "GET", 500)
+
+        rendered = metrics.render_all_processes()
+        self.assertIn(
+            'orrery_http_requests_total{route="/api/status.json",'
+            'method="GET",status="200"} 1.0',
+            rendered
+        )
+        self.assertNotIn('status="500"', rendered)
+        self.assertIn(
+            'orrery_http_request_storage_seconds_sum{route='
+            '"/api/status.json",method="GET"} 0.25',
+            rendered
+        )
+        self.assertIn(
+            'orrery_storage_calls_total{function="read_orrery_status",'
+            'outcome="ok"} 1.0',
+            rendered
+        )
+
+    def test_timed_render(self):
+        @metrics.timed_render
+        def render_test(value):
+            """Render a test value."""
+            return str(value)
+
+        self.assertEqual(render_test.__name__, "render_test")
+        self.assertEqual(render_test(5), "5")
+        self.assertIn(
+            'orrery_render_duration_seconds_count{function="render_test"} 1.0',
+            metrics.render_all_processes()
+        )
+
+    def test_disabled(self):
+        config.METRICS_ENABLED = False
+        metrics.start_request()
+        metrics.record_storage_call("read_orrery_status", 0.25, "ok")
+        metrics.record_retry("reconnect")
+        self.assertEqual(metrics.render_all_processes(), "\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,52 +6,70 @@ Data modeling and management routines for the orrery web control web service.
 """
 
 import collections
+import datetime
+import hashlib
+import threading
+import time
 
+import numpy
 import psycopg2 as psycopq
+import psycopg2.errorcodes
 
 import config
+import db_pool
+import history_partitions
+import memory_storage
+import metrics
+import prepared_statements
+import query_trace
 import serialization
 import sql_statements
+import sqlite_storage
 
 
-class PersistDbConnectionHolder:
-    """Wrapper that mantains access to a process-wide db connection."""
+def open_db_connection():
+    """
+    Open a new connection to the database configured by the environment.
 
-    def __init__(self):
-        """Create a new DB connection holder."""
-        self.persist_db_connection = None
+    @return: Newly opened database connection.
+    @rtype: psycopg2.Connection
+    """
+    db_config_vals = (config.DB_URI, config.DB_NAME)
+    return psycopq.connect(
+        "host='%s' dbname='%s'" % db_config_vals,
+        connection_factory=prepared_statements.PreparingConnection
+    )
 
-    def flush_db_connection(self):
-        """Force reset the process db connection."""
-        try:
-            if self.persist_db_connection:
-                self.persist_db_connection.close()
-        except:
-            pass
-        db_config_vals = (config.DB_URI, config.DB_NAME)
-        self.persist_db_connection = psycopq.connect(
-            "host='%s' dbname='%s'" % db_config_vals
-        )
 
-    # TODO: This could be expensive... should pool.
-    def get_db_connection(self):
-        """
-        Get this process' db connection.
+# Process-wide db connection pool
+db_connection_pool = db_pool.DbConnectionPool(
+    open_db_connection,
+    config.DB_POOL_MIN_SIZE,
+    config.DB_POOL_MAX_SIZE,
+    config.DB_POOL_TIMEOUT,
+    config.DB_POOL_MAX_IDLE,
+    config.DB_POOL_PING_AFTER
+)
+
+
+class DuplicateEntryError(RuntimeError):
+    """
+    Raised by every storage backend when creating an entry that already
+    exists, such as a second status or configuration entry for an orrery.
+    """
+    pass
 
-        @return: The process-wide db connection.
-        @rtype: psycopg2.Connection
-        """
-        if self.persist_db_connection == None:
-            self.flush_db_connection()
-        return self.persist_db_connection
 
-    def return_db(self):
-        """Indicate that the current thread has finished db operations."""
-        pass
+# Orrery served by routes that do not name one
+DEFAULT_ORRERY_ID = config.DEFAULT_ORRERY_ID
 
+# Largest orrery ID that fits the smallint orrery_id columns
+MAX_ORRERY_ID = 32767
 
-# Process-wide db connection holder
-persist_db_connection_holder = PersistDbConnectionHolder()
+
+# Storage backends created so far by name
+storage_backends = {}
+storage_backends_lock = threading.Lock()
 
 
 # Named tuple to model the status of the orrery as persisted to the database.
@@ -78,42 +96,333 @@ OrreryConfig = collections.namedtuple(
 )
 
 
+# Named tuple to model summary statistics of the orrery status samples recorded
+# within one interval of the status history.
+OrreryStatusRollup = collections.namedtuple(
+    "OrreryStatusRollup",
+    [
+        "bucket_start",
+        "count",
+        "motor_speed_min",
+        "motor_speed_max",
+        "motor_speed_mean",
+        "motor_draw_min",
+        "motor_draw_max",
+        "motor_draw_mean",
+        "rotations_min",
+        "rotations_max",
+        "rotations_mean"
+    ]
+)
+
+
+# Frequently run statements, prepared once per connection if enabled by
+# config.DB_PREPARED_STATEMENTS.
+COUNT_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_count_status",
+    sql_statements.COUNT_ORRERY_STATUS_SQL
+)
+
+INSERT_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_insert_status",
+    sql_statements.INSERT_ORRERY_STATUS_SQL
+)
+
+READ_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_read_status",
+    sql_statements.READ_ORRERY_STATUS_SQL
+)
+
+UPDATE_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_update_status",
+    sql_statements.UPDATE_ORRERY_STATUS_SQL
+)
+
+UPSERT_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_upsert_status",
+    sql_statements.UPSERT_ORRERY_STATUS_SQL
+)
+
+SYNC_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_sync_status",
+    sql_statements.SYNC_ORRERY_STATUS_SQL
+)
+
+UPSERT_NEWER_ORRERY_STATUS_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_upsert_newer_status",
+    sql_statements.UPSERT_NEWER_ORRERY_STATUS_SQL
+)
+
+READ_ORRERY_STATUS_HISTORY_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_read_status_history",
+    sql_statements.READ_ORRERY_STATUS_HISTORY_SQL,
+    ["smallint", "timestamp", "timestamp"]
+)
+
+ROLLUP_ORRERY_STATUS_HISTORY_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_rollup_status_history",
+    sql_statements.ROLLUP_ORRERY_STATUS_HISTORY_SQL,
+    ["timestamp", "double precision", "smallint", "timestamp"]
+)
+
+COUNT_ORRERY_CONFIG_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_count_config",
+    sql_statements.COUNT_ORRERY_CONFIG_SQL
+)
+
+NOTIFY_ORRERY_CONFIG_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_notify_config",
+    sql_statements.NOTIFY_ORRERY_CONFIG_SQL
+)
+
+INSERT_ORRERY_CONFIG_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_insert_config",
+    sql_statements.INSERT_ORRERY_CONFIG_SQL
+)
+
+READ_ORRERY_CONFIG_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_read_config",
+    sql_statements.READ_ORRERY_CONFIG_SQL
+)
+
+UPDATE_ORRERY_CONFIG_STATEMENT = prepared_statements.PreparedStatement(
+    "orrery_update_config",
+    sql_statements.UPDATE_ORRERY_CONFIG_SQL
+)
+
+# Name of the server-side cursor used to stream the status history. Named
+# cursors cannot run prepared statements so the history query is sent as text.
+HISTORY_EXPORT_CURSOR_NAME = "orrery_history_export"
+
+# Tables holding the raw and compacted status history. Both are partitioned by
+# time so that expired history is removed by dropping whole partitions.
+HISTORY_TABLE = "system_state_history"
+HISTORY_DEFAULT_PARTITION = "system_state_history_default"
+COMPACTED_HISTORY_TABLE = "system_state_history_compact"
+
+# Microseconds in a second, for converting numpy time offsets
+US_PER_SECOND = 1000000.0
+
+# Advisory lock held by the process running history maintenance
+HISTORY_MAINTENANCE_LOCK_KEY = 4862017
+
+
+def get_orrery_config_version(config_entry):
+    """
+    Get a version identifier for a user configuration record.
+
+    The version is derived from the record's values so that every process
+    computes the same version for the same configuration.
+
+    @param config_entry: The user configuration record to identify.
+    @type config_entry: OrreryConfig
+    @return: Short hex digest identifying the record's values.
+    @rtype: str
+    """
+    values = repr(tuple(config_entry)).encode("ascii")
+    return hashlib.sha1(values).hexdigest()[:16]
+
+
+def summarize_orrery_status_history(statuses, start, bucket_seconds):
+    """
+    Summarize status samples in fixed-width time intervals.
+
+    Computes the same summaries as rollup_orrery_status_history_raw for
+    storage backends that do not aggregate in the database. The samples are
+    converted to columns and each interval is aggregated with numpy.
+
+    @param statuses: Records of the system's status ordered by update time,
+        none updated before start.
+    @type statuses: list of OrreryStatus
+    @param start: The start of the first interval.
+    @type start: datetime.datetime
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @return: Minimum, maximum, and mean of each status value for every interval
+        with at least one sample, ordered by time.
+    @rtype: list of OrreryStatusRollup
+    """
+    if not statuses:
+        return []
+
+    update_datetimes = numpy.array(
+        [status.update_datetime for status in statuses],
+        dtype="datetime64[us]"
+    )
+    offsets = (update_datetimes - numpy.datetime64(start, "us")).astype(
+        numpy.float64
+    ) / US_PER_SECOND
+    buckets = numpy.floor_divide(offsets, bucket_seconds).astype(numpy.int64)
+
+    # Samples are ordered by time so each interval is one contiguous run
+    run_starts = numpy.concatenate((
+        [0],
+        numpy.flatnonzero(numpy.diff(buckets)) + 1
+    ))
+    counts = numpy.diff(numpy.append(run_starts, len(statuses)))
+
+    columns = []
+    for field in ["motor_speed", "motor_draw", "rotations"]:
+        values = numpy.array([getattr(status, field) for status in statuses])
+        columns.extend([
+            numpy.minimum.reduceat(values, run_starts).tolist(),
+            numpy.maximum.reduceat(values, run_starts).tolist(),
+            (numpy.add.reduceat(values, run_starts) / counts).tolist()
+        ])
+
+    bucket_width = datetime.timedelta(seconds=bucket_seconds)
+    return [
+        OrreryStatusRollup(
+            start + bucket_width * bucket,
+            count,
+            *summaries
+        )
+        for (bucket, count, summaries) in zip(
+            buckets[run_starts].tolist(),
+            counts.tolist(),
+            zip(*columns)
+        )
+    ]
+
+
+def merge_orrery_status_rollups(rollups, start, bucket_seconds):
+    """
+    Combine status summaries into wider fixed-width time intervals.
+
+    Each summary is counted in the interval containing its start. Means are
+    weighted by sample count so the result matches summarizing the original
+    samples whenever each summary lies within one interval.
+
+    @param rollups: Summaries of the status history in any order, none
+        starting before start.
+    @type rollups: list of OrreryStatusRollup
+    @param start: The start of the first interval.
+    @type start: datetime.datetime
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @return: Minimum, maximum, and mean of each status value for every interval
+        with at least one sample, ordered by time.
+    @rtype: list of OrreryStatusRollup
+    """
+    buckets = {}
+    for rollup in rollups:
+        offset = (rollup.bucket_start - start).total_seconds()
+        bucket = int(offset // bucket_seconds)
+        buckets.setdefault(bucket, []).append(rollup)
+
+    bucket_width = datetime.timedelta(seconds=bucket_seconds)
+    merged = []
+    for bucket in sorted(buckets):
+        bucket_rollups = buckets[bucket]
+        count = sum(rollup.count for rollup in bucket_rollups)
+        summaries = []
+        for field in ["motor_speed", "motor_draw", "rotations"]:
+            mins = [getattr(entry, field + "_min") for entry in bucket_rollups]
+            maxes = [getattr(entry, field + "_max") for entry in bucket_rollups]
+            total = sum(
+                getattr(rollup, field + "_mean") * rollup.count
+                for rollup in bucket_rollups
+            )
+            summaries.extend([min(mins), max(maxes), total / float(count)])
+        merged.append(OrreryStatusRollup(
+            start + bucket_width * bucket,
+            count,
+            *summaries
+        ))
+    return merged
+
+
+def compact_orrery_status_history(samples, bucket_seconds):
+    """
+    Summarize status samples of any number of orreries for compacted storage.
+
+    Computes the same summaries as the PostgreSQL compaction for storage
+    backends that do not aggregate in the database. Intervals are aligned by
+    history_partitions.get_compact_bucket_start.
+
+    @param samples: Tuples of the orrery ID and the record of that orrery's
+        status ordered by update time.
+    @type samples: list of tuple
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @return: Tuples of the orrery ID and a summary of one interval of that
+        orrery's samples.
+    @rtype: list of tuple
+    """
+    statuses_by_orrery = collections.OrderedDict()
+    for (orrery_id, status) in samples:
+        statuses_by_orrery.setdefault(orrery_id, []).append(status)
+
+    compacted = []
+    for (orrery_id, statuses) in statuses_by_orrery.items():
+        start = history_partitions.get_compact_bucket_start(
+            statuses[0].update_datetime,
+            bucket_seconds
+        )
+        rollups = summarize_orrery_status_history(
+            statuses,
+            start,
+            bucket_seconds
+        )
+        compacted.extend((orrery_id, rollup) for rollup in rollups)
+    return compacted
+
+
 def get_db_connection():
     """
-    Get this process' shared DB connection instance.
+    Check out a DB connection from the pool for the current thread.
 
-    @return: This process' DB connection.
+    @return: The DB connection checked out by the current thread.
     @rtype: psycopg2.Connection
+    @note: Must be matched by a call to release_db_connection.
     """
-    return persist_db_connection_holder.get_db_connection()
+    return db_connection_pool.get_connection()
 
 
 def release_db_connection():
     """Indicate that the current thread has finished DB operations."""
-    persist_db_connection_holder.return_db()
+    db_connection_pool.release_connection()
+
+
+def get_db_pool_stats():
+    """
+    Get occupancy and wait time statistics for the DB connection pool.
+
+    @return: Dictionary of pool statistics for this process.
+    @rtype: dict
+    """
+    return db_connection_pool.get_stats()
 
 
-def get_num_orrery_status_entries_raw(cursor):
+def get_num_orrery_status_entries_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
-    Get the number of system status entries currently in the database.
+    Get the number of system status entries an orrery has in the database.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to count entries for.
+    @type orrery_id: int
     @return: Number of system status entries in the given cursor's database.
     @rtype: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    cursor.execute(sql_statements.COUNT_ORRERY_STATUS_SQL)
+    prepared_statements.execute(
+        cursor,
+        COUNT_ORRERY_STATUS_STATEMENT,
+        {"orrery_id": orrery_id}
+    )
     return cursor.fetchall()[0][0]
 
 
-def check_orrery_status_table_raw(cursor):
+def check_orrery_status_table_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
     Check that the database table for system status is in an expected state.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to check the status entry of.
+    @type orrery_id: int
     @return: True if an entry exists. False if no entries exist.
     @rtype: bool
     @raises RuntimeError: Raised if more than one system status entry exists in
@@ -121,7 +430,7 @@ def check_orrery_status_table_raw(cursor):
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    num_entries = get_num_orrery_status_entries_raw(cursor)
+    num_entries = get_num_orrery_status_entries_raw(cursor, orrery_id)
 
     if num_entries == 0:
         return False
@@ -131,7 +440,7 @@ def check_orrery_status_table_raw(cursor):
     return True
 
 
-def create_orrery_status_raw(cursor, new_status):
+def create_orrery_status_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
     """
     Create a new orrery status entry.
 
@@ -139,32 +448,51 @@ def create_orrery_status_raw(cursor, new_status):
     @type cursor: psycopg2.Cursor
     @param new_status: Record of the system's status.
     @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
     new_status_dict = serialization.orrery_status_to_dict(new_status)
-    cursor.execute(sql_statements.INSERT_ORRERY_STATUS_SQL, new_status_dict)
+    new_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        INSERT_ORRERY_STATUS_STATEMENT,
+        new_status_dict
+    )
 
 
-def read_orrery_status_raw(cursor):
+def read_orrery_status_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
     Get the status of the orrery.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to read the status of.
+    @type orrery_id: int
     @return: Record of the orrery system status.
-    @rtype: OrreryStatus instance
-    @note: Does not try to commit changes or manage database connection in any
-        way.
+    @rtype: OrreryStatus instance or None
+    @raises RuntimeError: Raised if more than one system status entry exists in
+        the database.
+    @note: Reads at most two rows in a single statement. Does not try to commit
+        changes or manage database connection in any way.
     """
-    if not check_orrery_status_table_raw(cursor):
-        return None
-    cursor.execute(sql_statements.READ_ORRERY_STATUS_SQL)
+    prepared_statements.execute(
+        cursor,
+        READ_ORRERY_STATUS_STATEMENT,
+        {"orrery_id": orrery_id}
+    )
     entries = cursor.fetchall()
+
+    if len(entries) == 0:
+        return None
+    if len(entries) > 1:
+        raise RuntimeError("Many orrery status entries.")
+
     return OrreryStatus(*entries[0])
 
 
-def update_orrery_status_raw(cursor, new_status):
+def update_orrery_status_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
     """
     Update the orrery system status.
 
@@ -172,48 +500,627 @@ def update_orrery_status_raw(cursor, new_status):
     @type cursor: psycopg2.Cursor
     @param new_status: Record of the system's status to persist.
     @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @raises RuntimeError: Raised if more than one system status entry was
+        updated. The caller must roll back the transaction in that case.
+    @note: Updates nothing if no entry exists. Does not try to commit changes
+        or manage database connection in any way.
+    """
+    new_status_dict = serialization.orrery_status_to_dict(new_status)
+    new_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        UPDATE_ORRERY_STATUS_STATEMENT,
+        new_status_dict
+    )
+
+    if cursor.rowcount > 1:
+        raise RuntimeError("Many orrery status entries.")
+
+
+def upsert_orrery_status_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Create or update the orrery system status in a single statement.
+
+    Inserts the given status if no entry exists and otherwise overwrites the
+    existing entry while keeping its original start date.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param new_status: Record of the system's status to persist. The start
+        date is only used if no entry exists yet.
+    @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @return: Record of the orrery system status as persisted.
+    @rtype: OrreryStatus instance
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    if not check_orrery_status_table_raw(cursor):
-        return None
     new_status_dict = serialization.orrery_status_to_dict(new_status)
-    cursor.execute(sql_statements.UPDATE_ORRERY_STATUS_SQL, new_status_dict)
+    new_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        UPSERT_ORRERY_STATUS_STATEMENT,
+        new_status_dict
+    )
+    return OrreryStatus(*cursor.fetchall()[0])
 
 
-def delete_orrery_status_raw(cursor):
+def sync_orrery_status_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
     """
-    Delete all orrery system status entries.
+    Create or update the orrery status and read the configuration together.
+
+    Runs the same upsert as upsert_orrery_status_raw and joins the orrery's
+    user configuration onto the returned row, all in a single statement.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param new_status: Record of the system's status to persist. The start
+        date is only used if no entry exists yet.
+    @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @return: Tuple of the orrery system status as persisted and the orrery
+        user configuration, which is None if the orrery has none.
+    @rtype: tuple
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    new_status_dict = serialization.orrery_status_to_dict(new_status)
+    new_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        SYNC_ORRERY_STATUS_STATEMENT,
+        new_status_dict
+    )
+    entry = cursor.fetchall()[0]
+    config_entry = None
+    if entry[5:] != (None, None):
+        config_entry = OrreryConfig(*entry[5:])
+    return (OrreryStatus(*entry[:5]), config_entry)
+
+
+def delete_orrery_status_raw(cursor, orrery_id=None):
+    """
+    Delete orrery system status entries.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to delete the status of or None to delete the
+        status of every orrery.
+    @type orrery_id: int
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    if orrery_id is None:
+        cursor.execute(sql_statements.DELETE_ALL_ORRERY_STATUS_SQL)
+    else:
+        cursor.execute(
+            sql_statements.DELETE_ORRERY_STATUS_SQL,
+            {"orrery_id": orrery_id}
+        )
+
+
+def create_fleet_status_history_raw(cursor, samples):
+    """
+    Append status samples of any number of orreries to the status history.
+
+    Samples are written with multi-row INSERT statements holding up to
+    config.HISTORY_INSERT_CHUNK_SIZE samples each rather than one statement per
+    sample.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param samples: Tuples of the orrery ID and the record of that orrery's
+        status to append.
+    @type samples: list of tuple
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    insert_sql = sql_statements.INSERT_ORRERY_STATUS_HISTORY_SQL.encode("ascii")
+    chunk_size = config.HISTORY_INSERT_CHUNK_SIZE
+
+    for chunk_start in range(0, len(samples), chunk_size):
+        chunk = samples[chunk_start:chunk_start + chunk_size]
+        values = []
+        for (orrery_id, status) in chunk:
+            status_dict = serialization.orrery_status_to_dict(status)
+            status_dict["orrery_id"] = orrery_id
+            values.append(cursor.mogrify(
+                sql_statements.ORRERY_STATUS_HISTORY_VALUES_SQL,
+                status_dict
+            ))
+        cursor.execute(insert_sql + b",".join(values))
+
+
+def create_orrery_status_history_raw(cursor, statuses,
+        orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Append orrery status samples to the status history.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param statuses: Records of the system's status to append.
+    @type statuses: list of OrreryStatus
+    @param orrery_id: The orrery the samples belong to.
+    @type orrery_id: int
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    create_fleet_status_history_raw(
+        cursor,
+        [(orrery_id, status) for status in statuses]
+    )
+
+
+def ingest_orrery_status_batch_raw(cursor, statuses,
+        orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Record a batch of status samples and advance the current status.
+
+    All samples are appended to the status history. The newest sample becomes
+    the current status unless the current status was updated more recently.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param statuses: Records of the system's status ordered by update time.
+        Start dates are only used if no status entry exists yet.
+    @type statuses: list of OrreryStatus
+    @param orrery_id: The orrery the samples belong to.
+    @type orrery_id: int
+    @return: Record of the orrery system status as persisted.
+    @rtype: OrreryStatus instance
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    newest_status_dict = serialization.orrery_status_to_dict(statuses[-1])
+    newest_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        UPSERT_NEWER_ORRERY_STATUS_STATEMENT,
+        newest_status_dict
+    )
+    entries = cursor.fetchall()
+    if entries:
+        stored_status = OrreryStatus(*entries[0])
+    else:
+        stored_status = read_orrery_status_raw(cursor, orrery_id)
+
+    start_date = stored_status.start_date
+    create_orrery_status_history_raw(
+        cursor,
+        [status._replace(start_date=start_date) for status in statuses],
+        orrery_id
+    )
+    return stored_status
+
+
+def read_orrery_status_history_raw(cursor, start, end,
+        orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Get the orrery status samples recorded within a time range.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param start: The earliest update time to include.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param orrery_id: The orrery to read samples of.
+    @type orrery_id: int
+    @return: Records of the orrery system status ordered by update time.
+    @rtype: list of OrreryStatus
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    prepared_statements.execute(
+        cursor,
+        READ_ORRERY_STATUS_HISTORY_STATEMENT,
+        {"orrery_id": orrery_id, "start": start, "end": end}
+    )
+    return [OrreryStatus(*entry) for entry in cursor.fetchall()]
+
+
+def rollup_orrery_status_history_raw(cursor, start, end, bucket_seconds,
+        orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Summarize the status history in fixed-width time intervals.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param start: The start of the first interval.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @param orrery_id: The orrery to summarize samples of.
+    @type orrery_id: int
+    @return: Minimum, maximum, and mean of each status value for every interval
+        with at least one sample, ordered by time.
+    @rtype: list of OrreryStatusRollup
+    @note: Aggregation is done by the database. Does not try to commit changes
+        or manage database connection in any way.
+    """
+    prepared_statements.execute(
+        cursor,
+        ROLLUP_ORRERY_STATUS_HISTORY_STATEMENT,
+        {
+            "orrery_id": orrery_id,
+            "start": start,
+            "end": end,
+            "bucket_seconds": bucket_seconds
+        }
+    )
+    bucket_width = datetime.timedelta(seconds=bucket_seconds)
+    return [
+        OrreryStatusRollup(start + bucket_width * int(entry[0]), *entry[1:])
+        for entry in cursor.fetchall()
+    ]
+
+
+def delete_orrery_status_history_raw(cursor, orrery_id=None):
+    """
+    Delete orrery status history samples and their compacted summaries.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to delete samples of or None to delete the
+        samples of every orrery.
+    @type orrery_id: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    cursor.execute(sql_statements.DELETE_ORRERY_STATUS_SQL)
+    if orrery_id is None:
+        cursor.execute(sql_statements.DELETE_ALL_ORRERY_STATUS_HISTORY_SQL)
+        cursor.execute(
+            sql_statements.DELETE_ALL_COMPACTED_ORRERY_STATUS_HISTORY_SQL
+        )
+    else:
+        cursor.execute(
+            sql_statements.DELETE_ORRERY_STATUS_HISTORY_SQL,
+            {"orrery_id": orrery_id}
+        )
+        cursor.execute(
+            sql_statements.DELETE_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+            {"orrery_id": orrery_id}
+        )
 
 
-def get_num_orrery_config_entries_raw(cursor):
+def read_compacted_orrery_status_history_raw(cursor, start, end,
+        orrery_id=DEFAULT_ORRERY_ID):
     """
-    Get the number of user config entries currently in the database.
+    Get the summaries of compacted status history within a time range.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param start: The earliest interval start to include.
+    @type start: datetime.datetime
+    @param end: The interval start at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param orrery_id: The orrery to read summaries of.
+    @type orrery_id: int
+    @return: Summaries of config.HISTORY_COMPACT_BUCKET second intervals
+        ordered by time.
+    @rtype: list of OrreryStatusRollup
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    cursor.execute(
+        sql_statements.READ_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+        {"orrery_id": orrery_id, "start": start, "end": end}
+    )
+    return [OrreryStatusRollup(*entry) for entry in cursor.fetchall()]
+
+
+def read_history_partitions_raw(cursor, table):
+    """
+    Get the time range partitions of a history table.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param table: The name of the partitioned table.
+    @type table: str
+    @return: The partitions of the table other than its default partition.
+    @rtype: list of history_partitions.HistoryPartition
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    cursor.execute(sql_statements.READ_HISTORY_PARTITIONS_SQL, {"table": table})
+    partitions = [
+        history_partitions.parse_partition_bound(name, bound)
+        for (name, bound) in cursor.fetchall()
+    ]
+    return [partition for partition in partitions if partition is not None]
+
+
+def create_history_partition_raw(cursor, table, partition,
+        default_partition=None, column="update_datetime"):
+    """
+    Create and attach a time range partition of a history table.
+
+    The partition is created on its own and attached after any rows in its
+    range are moved out of the default partition, which PostgreSQL requires.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param table: The name of the partitioned table.
+    @type table: str
+    @param partition: The partition to create.
+    @type partition: history_partitions.HistoryPartition
+    @param default_partition: The name of the table's default partition or
+        None if it has none.
+    @type default_partition: str
+    @param column: The name of the column the table is partitioned by.
+    @type column: str
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    names = {
+        "table": table,
+        "partition": partition.name,
+        "default": default_partition,
+        "column": column
+    }
+    bounds = {"start": partition.start, "end": partition.end}
+    cursor.execute(sql_statements.CREATE_HISTORY_PARTITION_SQL.format(**names))
+    if default_partition is not None:
+        cursor.execute(
+            sql_statements.MOVE_DEFAULT_HISTORY_ROWS_SQL.format(**names),
+            bounds
+        )
+    cursor.execute(
+        sql_statements.ATTACH_HISTORY_PARTITION_SQL.format(**names),
+        bounds
+    )
+
+
+def create_history_partitions_raw(cursor, now):
+    """
+    Create the history partitions needed now and in the near future.
+
+    The raw history gets partitions of config.HISTORY_PARTITION_PERIOD for
+    the current period and config.HISTORY_PARTITIONS_AHEAD periods after it.
+    The compacted history gets monthly partitions covering everything from
+    the compacted history retention cutoff through next month.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param now: The current time.
+    @type now: datetime.datetime
+    @return: Number of partitions created.
+    @rtype: int
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    new_compact_partitions = history_partitions.plan_new_partitions(
+        COMPACTED_HISTORY_TABLE,
+        read_history_partitions_raw(cursor, COMPACTED_HISTORY_TABLE),
+        history_partitions.get_retention_cutoffs(now)[1],
+        now,
+        history_partitions.COMPACT_PARTITION_PERIOD,
+        1
+    )
+    for partition in new_compact_partitions:
+        create_history_partition_raw(
+            cursor,
+            COMPACTED_HISTORY_TABLE,
+            partition,
+            column="bucket_start"
+        )
+
+    new_partitions = history_partitions.plan_new_partitions(
+        HISTORY_TABLE,
+        read_history_partitions_raw(cursor, HISTORY_TABLE),
+        now,
+        now,
+        config.HISTORY_PARTITION_PERIOD,
+        config.HISTORY_PARTITIONS_AHEAD
+    )
+    for partition in new_partitions:
+        create_history_partition_raw(
+            cursor,
+            HISTORY_TABLE,
+            partition,
+            HISTORY_DEFAULT_PARTITION
+        )
+
+    return len(new_compact_partitions) + len(new_partitions)
+
+
+def compact_history_partition_raw(cursor, partition_name, start, end):
+    """
+    Summarize the raw samples of one history partition within a time range.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param partition_name: The name of the partition to summarize.
+    @type partition_name: str
+    @param start: The earliest update time to include.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @return: Number of summaries written to the compacted history.
+    @rtype: int
+    @note: Aggregation is done by the database. Does not try to commit changes
+        or manage database connection in any way.
+    """
+    if start >= end:
+        return 0
+    cursor.execute(
+        sql_statements.COMPACT_ORRERY_STATUS_HISTORY_SQL.format(
+            partition=partition_name
+        ),
+        {
+            "start": start,
+            "end": end,
+            "bucket_seconds": config.HISTORY_COMPACT_BUCKET
+        }
+    )
+    return cursor.rowcount
+
+
+def maintain_orrery_status_history_raw(cursor, now):
+    """
+    Create upcoming history partitions and retire expired ones.
+
+    Raw partitions holding nothing newer than config.HISTORY_RAW_RETENTION_DAYS
+    are summarized into the compacted history and then dropped, skipping
+    samples that would already be past the compacted history's retention so
+    that every summary lands in an existing partition. Compacted
+    partitions holding nothing newer than config.HISTORY_COMPACT_RETENTION_DAYS
+    are dropped. Old history is never removed with a DELETE over a partition,
+    except for the expired rows of the default partition, which only holds
+    samples reported outside of every other partition.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param now: The current time.
+    @type now: datetime.datetime
+    @return: The changes made or None if maintenance was already running in
+        another process.
+    @rtype: history_partitions.HistoryMaintenanceResult
+    @note: Does not try to commit changes or manage database connection in any
+        way.
+    """
+    cursor.execute(
+        sql_statements.TRY_HISTORY_MAINTENANCE_LOCK_SQL,
+        {"lock_key": HISTORY_MAINTENANCE_LOCK_KEY}
+    )
+    if not cursor.fetchone()[0]:
+        return None
+
+    (raw_cutoff, compact_cutoff) = history_partitions.get_retention_cutoffs(now)
+    compact_start = history_partitions.get_compact_bucket_start(
+        compact_cutoff,
+        config.HISTORY_COMPACT_BUCKET
+    ) + datetime.timedelta(seconds=config.HISTORY_COMPACT_BUCKET)
+    num_created = create_history_partitions_raw(cursor, now)
+    num_dropped = 0
+    num_rollups = 0
+
+    expired_partitions = history_partitions.plan_expired_partitions(
+        read_history_partitions_raw(cursor, HISTORY_TABLE),
+        raw_cutoff
+    )
+    for partition in expired_partitions:
+        if partition.start is None:
+            start = compact_start
+        else:
+            start = max(partition.start, compact_start)
+        num_rollups += compact_history_partition_raw(
+            cursor,
+            partition.name,
+            start,
+            partition.end
+        )
+        cursor.execute(sql_statements.DROP_HISTORY_PARTITION_SQL.format(
+            partition=partition.name
+        ))
+        num_dropped += 1
+
+    num_rollups += compact_history_partition_raw(
+        cursor,
+        HISTORY_DEFAULT_PARTITION,
+        compact_start,
+        raw_cutoff
+    )
+    cursor.execute(
+        sql_statements.DELETE_EXPIRED_DEFAULT_ORRERY_STATUS_HISTORY_SQL,
+        {"end": raw_cutoff}
+    )
+
+    expired_partitions = history_partitions.plan_expired_partitions(
+        read_history_partitions_raw(cursor, COMPACTED_HISTORY_TABLE),
+        compact_cutoff
+    )
+    for partition in expired_partitions:
+        cursor.execute(sql_statements.DROP_HISTORY_PARTITION_SQL.format(
+            partition=partition.name
+        ))
+        num_dropped += 1
+
+    return history_partitions.HistoryMaintenanceResult(
+        num_created,
+        num_dropped,
+        num_rollups
+    )
+
+
+def migrate_orrery_status_history_raw(cursor, now):
+    """
+    Partition a status history table created before history was partitioned.
+
+    The existing table is kept and attached as the partition holding every
+    sample before the end of the current period (or of the newest sample if
+    later), so no samples are copied.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param now: The current time.
+    @type now: datetime.datetime
+    @note: Must run before the partitioned history table is created. Does not
+        try to commit changes or manage database connection in any way.
+    """
+    cursor.execute(sql_statements.READ_ORRERY_STATUS_HISTORY_KIND_SQL)
+    entry = cursor.fetchone()
+    if entry is None or entry[0] != "r":
+        return
+
+    cursor.execute(sql_statements.RENAME_LEGACY_ORRERY_STATUS_HISTORY_SQL)
+    cursor.execute(sql_statements.RENAME_LEGACY_ORRERY_STATUS_HISTORY_INDEX_SQL)
+    cursor.execute(sql_statements.CREATE_ORRERY_STATUS_HISTORY_TABLE_SQL)
+    cursor.execute(sql_statements.CREATE_ORRERY_STATUS_HISTORY_INDEX_SQL)
+    cursor.execute(
+        sql_statements.CREATE_DEFAULT_ORRERY_STATUS_HISTORY_PARTITION_SQL
+    )
+
+    cursor.execute(sql_statements.READ_LEGACY_ORRERY_STATUS_HISTORY_END_SQL)
+    newest = cursor.fetchone()[0]
+    if newest is None or newest < now:
+        newest = now
+    period = config.HISTORY_PARTITION_PERIOD
+    end = history_partitions.get_next_period_start(
+        history_partitions.get_period_start(newest, period),
+        period
+    )
+    cursor.execute(
+        sql_statements.ATTACH_LEGACY_ORRERY_STATUS_HISTORY_SQL,
+        {"end": end}
+    )
+
+
+def get_num_orrery_config_entries_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Get the number of user config entries an orrery has in the database.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to count entries for.
+    @type orrery_id: int
     @return: Number of user config entries in the given cursor's database.
     @rtype: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    cursor.execute(sql_statements.COUNT_ORRERY_CONFIG_SQL)
+    prepared_statements.execute(
+        cursor,
+        COUNT_ORRERY_CONFIG_STATEMENT,
+        {"orrery_id": orrery_id}
+    )
     return cursor.fetchall()[0][0]
 
 
-def check_orrery_config_table_raw(cursor):
+def check_orrery_config_table_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
     Check that the database table for user configuration is in an expected state.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to check the user configuration entry of.
+    @type orrery_id: int
     @return: True if an entry exists. False if no entries exist.
     @rtype: bool
     @raises RuntimeError: Raised if more than one user configuration entry
@@ -221,7 +1128,7 @@ def check_orrery_config_table_raw(cursor):
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    num_entries = get_num_orrery_config_entries_raw(cursor)
+    num_entries = get_num_orrery_config_entries_raw(cursor, orrery_id)
 
     if num_entries == 0:
         return False
@@ -231,7 +1138,43 @@ def check_orrery_config_table_raw(cursor):
     return True
 
 
-def create_orrery_config_raw(cursor, new_status):
+def get_orrery_config_notify_payload(orrery_id):
+    """
+    Get the payload sent to listeners when the user configuration changes.
+
+    @param orrery_id: The orrery whose configuration changed or None if the
+        configuration of every orrery changed.
+    @type orrery_id: int
+    @return: The orrery ID (empty for every orrery) and the time at which the
+        change was made in seconds since the epoch separated by a colon.
+    @rtype: str
+    """
+    if orrery_id is None:
+        orrery_id = ""
+    return "%s:%.6f" % (orrery_id, time.time())
+
+
+def notify_orrery_config_changed_raw(cursor, orrery_id):
+    """
+    Notify processes caching the user configuration that it has changed.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery whose configuration changed or None if the
+        configuration of every orrery changed.
+    @type orrery_id: int
+    @note: The notification is only delivered once the transaction commits.
+        Does not try to commit changes or manage database connection in any
+        way.
+    """
+    prepared_statements.execute(
+        cursor,
+        NOTIFY_ORRERY_CONFIG_STATEMENT,
+        {"notify_payload": get_orrery_config_notify_payload(orrery_id)}
+    )
+
+
+def create_orrery_config_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
     """
     Create a new orrery user configuration entry.
 
@@ -239,32 +1182,52 @@ def create_orrery_config_raw(cursor, new_status):
     @type cursor: psycopg2.Cursor
     @param new_status: Record of the system's status.
     @type new_status: OrreryConfig
+    @param orrery_id: The orrery the configuration belongs to.
+    @type orrery_id: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
     new_status_dict = serialization.orrery_config_to_dict(new_status)
-    cursor.execute(sql_statements.INSERT_ORRERY_CONFIG_SQL, new_status_dict)
+    new_status_dict["orrery_id"] = orrery_id
+    prepared_statements.execute(
+        cursor,
+        INSERT_ORRERY_CONFIG_STATEMENT,
+        new_status_dict
+    )
+    notify_orrery_config_changed_raw(cursor, orrery_id)
 
 
-def read_orrery_config_raw(cursor):
+def read_orrery_config_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
     Get the current user configuration of the orrery.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to read the user configuration of.
+    @type orrery_id: int
     @return: Record of the orrery system user configuration.
-    @rtype: OrreryConfig instance
-    @note: Does not try to commit changes or manage database connection in any
-        way.
+    @rtype: OrreryConfig instance or None
+    @raises RuntimeError: Raised if more than one user configuration entry exists in
+        the database.
+    @note: Reads at most two rows in a single statement. Does not try to commit
+        changes or manage database connection in any way.
     """
-    if not check_orrery_config_table_raw(cursor):
-        return None
-    cursor.execute(sql_statements.READ_ORRERY_CONFIG_SQL)
+    prepared_statements.execute(
+        cursor,
+        READ_ORRERY_CONFIG_STATEMENT,
+        {"orrery_id": orrery_id}
+    )
     entries = cursor.fetchall()
+
+    if len(entries) == 0:
+        return None
+    if len(entries) > 1:
+        raise RuntimeError("Many orrery config entries.")
+
     return OrreryConfig(*entries[0])
 
 
-def update_orrery_config_raw(cursor, new_status):
+def update_orrery_config_raw(cursor, new_status, orrery_id=DEFAULT_ORRERY_ID):
     """
     Update the orrery system user configuration.
 
@@ -272,25 +1235,49 @@ def update_orrery_config_raw(cursor, new_status):
     @type cursor: psycopg2.Cursor
     @param new_status: Record of the system's status to persist.
     @type new_status: OrreryConfig
-    @note: Does not try to commit changes or manage database connection in any
-        way.
+    @param orrery_id: The orrery the configuration belongs to.
+    @type orrery_id: int
+    @raises RuntimeError: Raised if more than one user configuration entry was
+        updated. The caller must roll back the transaction in that case.
+    @note: Updates nothing if no entry exists. Notifies processes caching the
+        user configuration in the same statement. Does not try to commit
+        changes or manage database connection in any way.
     """
-    if not check_orrery_config_table_raw(cursor):
-        return None
     new_status_dict = serialization.orrery_config_to_dict(new_status)
-    cursor.execute(sql_statements.UPDATE_ORRERY_CONFIG_SQL, new_status_dict)
+    new_status_dict["orrery_id"] = orrery_id
+    new_status_dict["notify_payload"] = get_orrery_config_notify_payload(
+        orrery_id
+    )
+    prepared_statements.execute(
+        cursor,
+        UPDATE_ORRERY_CONFIG_STATEMENT,
+        new_status_dict
+    )
+
+    if cursor.fetchall()[0][0] > 1:
+        raise RuntimeError("Many orrery config entries.")
 
 
-def delete_orrery_config_raw(cursor):
+def delete_orrery_config_raw(cursor, orrery_id=None):
     """
-    Delete all orrery system user configuration entries.
+    Delete orrery system user configuration entries.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to delete the configuration of or None to
+        delete the configuration of every orrery.
+    @type orrery_id: int
     @note: Does not try to commit changes or manage database connection in any
         way.
     """
-    cursor.execute(sql_statements.DELETE_ORRERY_CONFIG_SQL)
+    if orrery_id is None:
+        cursor.execute(sql_statements.DELETE_ALL_ORRERY_CONFIG_SQL)
+    else:
+        cursor.execute(
+            sql_statements.DELETE_ORRERY_CONFIG_SQL,
+            {"orrery_id": orrery_id}
+        )
+    notify_orrery_config_changed_raw(cursor, orrery_id)
 
 
 def initalize_database_raw(cursor):
@@ -298,7 +1285,11 @@ def initalize_database_raw(cursor):
     Sets up database tables if they do not exist and sets initial entries.
 
     Sets up the database tables if they do not exist and adds a default user
-    configuration entry if none currently exists.
+    configuration entry for the default orrery if none currently exists. Status
+    and configuration tables created before entries were keyed by orrery are
+    migrated, keeping only the most recent entry, which belongs to orrery 1.
+    Status history tables created before history was partitioned are attached
+    to the partitioned table and the current history partitions are created.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
@@ -306,7 +1297,27 @@ def initalize_database_raw(cursor):
         way.
     """
     cursor.execute(sql_statements.CREATE_ORRERY_STATUS_TABLE_SQL)
+    cursor.execute(sql_statements.ADD_ORRERY_STATUS_KEY_SQL)
+    cursor.execute(sql_statements.DEDUPLICATE_ORRERY_STATUS_SQL)
+    cursor.execute(sql_statements.CREATE_ORRERY_STATUS_KEY_SQL)
+    now = datetime.datetime.now()
+    migrate_orrery_status_history_raw(cursor, now)
+    cursor.execute(sql_statements.CREATE_ORRERY_STATUS_HISTORY_TABLE_SQL)
+    cursor.execute(sql_statements.CREATE_ORRERY_STATUS_HISTORY_INDEX_SQL)
+    cursor.execute(
+        sql_statements.CREATE_DEFAULT_ORRERY_STATUS_HISTORY_PARTITION_SQL
+    )
+    cursor.execute(
+        sql_statements.CREATE_COMPACTED_ORRERY_STATUS_HISTORY_TABLE_SQL
+    )
+    cursor.execute(
+        sql_statements.CREATE_COMPACTED_ORRERY_STATUS_HISTORY_INDEX_SQL
+    )
+    create_history_partitions_raw(cursor, now)
     cursor.execute(sql_statements.CREATE_ORRERY_CONFIG_TABLE_SQL)
+    cursor.execute(sql_statements.ADD_ORRERY_CONFIG_KEY_SQL)
+    cursor.execute(sql_statements.DEDUPLICATE_ORRERY_CONFIG_SQL)
+    cursor.execute(sql_statements.CREATE_ORRERY_CONFIG_KEY_SQL)
 
     if get_num_orrery_config_entries_raw(cursor) == 0:
         default_config = OrreryConfig(
@@ -316,19 +1327,21 @@ def initalize_database_raw(cursor):
         create_orrery_config_raw(cursor, default_config)
 
 
-def get_orrery_config_and_status_raw(cursor):
+def get_orrery_config_and_status_raw(cursor, orrery_id=DEFAULT_ORRERY_ID):
     """
     Get the orrery user configuration and system status entries together.
 
     @param cursor: The databse cursor to use to execute the request.
     @type cursor: psycopg2.Cursor
+    @param orrery_id: The orrery to read the entries of.
+    @type orrery_id: int
     @return: Tuple of orrery user configuration and orrery system status
         entries.
     @rtype: tuple
     """
     return (
-        read_orrery_config_raw(cursor),
-        read_orrery_status_raw(cursor)
+        read_orrery_config_raw(cursor, orrery_id),
+        read_orrery_status_raw(cursor, orrery_id)
     )
 
 
@@ -337,7 +1350,13 @@ def run_on_app_db(func, args, retry=True):
     Run a function using the system database as configured by the environment.
 
     Runs a function using the system database as configured by the environment,
-    committing changes after the opreation completes.
+    committing changes after the opreation completes. A connection is checked
+    out of the pool for the call and returned afterwards. Connections that fail
+    with an OperationalError are discarded and the call is retried once on a
+    fresh connection. If the server no longer knows a prepared statement, the
+    connection is kept, its statements are marked for preparing again, and the
+    call is retried once. Unique constraint violations are raised as
+    DuplicateEntryError so callers need not know the storage backend.
 
     @param func: The function to execute with the system database.
     @type func: function
@@ -346,32 +1365,252 @@ def run_on_app_db(func, args, retry=True):
     @type args: list or tuple
     @return: Return value from passed function.
     """
+    conn = get_db_connection()
     try:
-        conn = persist_db_connection_holder.get_db_connection()
-        cursor = conn.cursor()
+        cursor = conn.cursor(cursor_factory=query_trace.get_cursor_factory())
         ret_val = func(cursor, *args)
         conn.commit()
-    except psycopq.OperationalError as e:
-        persist_db_connection_holder.flush_db_connection()
-        if retry:
-            ret_val = run_on_app_db(func, args, retry=False)
-        else:
+        metrics.record_statements(func.__name__, cursor.num_statements)
+    except psycopq.OperationalError as error:
+        if prepared_statements.is_missing_statement_error(error):
+            prepared_statements.forget_prepared_statements(conn)
             release_db_connection()
-            raise OperationalError(str(e))
+            reason = "reprepare"
+        else:
+            db_connection_pool.discard_connection()
+            reason = "reconnect"
+        if retry:
+            metrics.record_retry(reason)
+            return run_on_app_db(func, args, retry=False)
+        raise
+    except psycopq.IntegrityError as error:
+        release_db_connection()
+        if error.pgcode == psycopg2.errorcodes.UNIQUE_VIOLATION:
+            raise DuplicateEntryError(str(error))
+        raise
+    except:
+        release_db_connection()
+        raise
 
     release_db_connection()
     return ret_val
 
 
+class PostgresStorage:
+    """
+    Storage backend keeping the orrery status, history, and configuration in
+    the PostgreSQL database configured by the environment.
+
+    Implements each storage function of this module by running the matching
+    raw function on a pooled connection through run_on_app_db.
+    """
+
+    name = "postgres"
+
+    def check_orrery_table_status(self, *args):
+        return run_on_app_db(check_orrery_status_table_raw, args)
+
+    def create_orrery_status(self, *args):
+        return run_on_app_db(create_orrery_status_raw, args)
+
+    def read_orrery_status(self, *args):
+        return run_on_app_db(read_orrery_status_raw, args)
+
+    def update_orrery_status(self, *args):
+        return run_on_app_db(update_orrery_status_raw, args)
+
+    def upsert_orrery_status(self, *args):
+        return run_on_app_db(upsert_orrery_status_raw, args)
+
+    def sync_orrery_status(self, *args):
+        return run_on_app_db(sync_orrery_status_raw, args)
+
+    def delete_orrery_status(self, *args):
+        return run_on_app_db(delete_orrery_status_raw, args)
+
+    def create_orrery_status_history(self, *args):
+        return run_on_app_db(create_orrery_status_history_raw, args)
+
+    def create_fleet_status_history(self, *args):
+        return run_on_app_db(create_fleet_status_history_raw, args)
+
+    def ingest_orrery_status_batch(self, *args):
+        return run_on_app_db(ingest_orrery_status_batch_raw, args)
+
+    def read_orrery_status_history(self, *args):
+        return run_on_app_db(read_orrery_status_history_raw, args)
+
+    def rollup_orrery_status_history(self, *args):
+        return run_on_app_db(rollup_orrery_status_history_raw, args)
+
+    def stream_orrery_status_history(self, start, end, fetch_size,
+        orrery_id=DEFAULT_ORRERY_ID):
+        """
+        Iterate over status history samples fetched in fixed-size chunks.
+
+        Uses a named server-side cursor on a connection taken out of the pool
+        for as long as the iteration runs so only one chunk is held in memory.
+        """
+        conn = db_connection_pool.acquire_connection()
+        try:
+            cursor = conn.cursor(name=HISTORY_EXPORT_CURSOR_NAME)
+            cursor.itersize = fetch_size
+            cursor.execute(
+                sql_statements.READ_ORRERY_STATUS_HISTORY_SQL,
+                {"orrery_id": orrery_id, "start": start, "end": end}
+            )
+            while True:
+                entries = cursor.fetchmany(fetch_size)
+                if not entries:
+                    break
+                for entry in entries:
+                    yield OrreryStatus(*entry)
+            cursor.close()
+        except psycopq.OperationalError:
+            db_connection_pool.forget_connection(conn)
+            raise
+        except:
+            db_connection_pool.return_connection(conn)
+            raise
+        db_connection_pool.return_connection(conn)
+
+    def delete_orrery_status_history(self, *args):
+        return run_on_app_db(delete_orrery_status_history_raw, args)
+
+    def read_compacted_orrery_status_history(self, *args):
+        return run_on_app_db(read_compacted_orrery_status_history_raw, args)
+
+    def maintain_orrery_status_history(self, *args):
+        return run_on_app_db(maintain_orrery_status_history_raw, args)
+
+    def check_orrery_config_table(self, *args):
+        return run_on_app_db(check_orrery_config_table_raw, args)
+
+    def create_orrery_config(self, *args):
+        return run_on_app_db(create_orrery_config_raw, args)
+
+    def read_orrery_config(self, *args):
+        return run_on_app_db(read_orrery_config_raw, args)
+
+    def update_orrery_config(self, *args):
+        return run_on_app_db(update_orrery_config_raw, args)
+
+    def delete_orrery_config(self, *args):
+        return run_on_app_db(delete_orrery_config_raw, args)
+
+    def initalize_database(self, *args):
+        return run_on_app_db(initalize_database_raw, args)
+
+    def get_orrery_config_and_status(self, *args):
+        return run_on_app_db(get_orrery_config_and_status_raw, args)
+
+
+def create_storage_backend(name):
+    """
+    Create the storage backend with the given name.
+
+    @param name: One of "postgres", "memory", or "sqlite".
+    @type name: str
+    @return: The new storage backend.
+    @raises ValueError: Raised if the name is not a known backend.
+    """
+    if name == "postgres":
+        return PostgresStorage()
+    if name == "memory":
+        return memory_storage.MemoryStorage()
+    if name == "sqlite":
+        return sqlite_storage.SqliteStorage(
+            config.SQLITE_PATH,
+            config.SQLITE_TIMEOUT
+        )
+    raise ValueError("Unknown storage backend: %s" % name)
+
+
+def get_storage_backend():
+    """
+    Get the storage backend selected by config.STORAGE_BACKEND.
+
+    Each backend is created once per process on first use and then reused.
+
+    @return: The selected storage backend.
+    """
+    name = config.STORAGE_BACKEND
+    with storage_backends_lock:
+        if name not in storage_backends:
+            storage_backends[name] = create_storage_backend(name)
+        return storage_backends[name]
+
+
+def call_storage(function_name, args):
+    """
+    Run a storage function on the selected backend and record its duration.
+
+    @param function_name: Name of the storage function to run.
+    @type function_name: str
+    @param args: The arguments to run the function with.
+    @type args: list or tuple
+    @return: Return value from the backend's function.
+    """
+    backend = get_storage_backend()
+    start = time.time()
+    outcome = "error"
+    try:
+        ret_val = getattr(backend, function_name)(*args)
+        outcome = "ok"
+        return ret_val
+    finally:
+        metrics.record_storage_call(
+            function_name,
+            time.time() - start,
+            outcome
+        )
+
+
+def collect_pool_metrics():
+    """
+    Report DB connection pool occupancy and activity for /metrics.
+
+    @return: List of (type, name, labels, value) tuples.
+    @rtype: list
+    """
+    stats = get_db_pool_stats()
+    collected = [
+        ("gauge", "orrery_db_pool_max_connections", (), stats["max_size"]),
+        ("counter", "orrery_db_pool_wait_seconds_total", (),
+            stats["total_wait_time"])
+    ]
+    for state in ["idle", "in_use"]:
+        collected.append((
+            "gauge",
+            "orrery_db_pool_connections",
+            (("state", state),),
+            stats[state]
+        ))
+    for event in ["checkouts", "created", "discarded", "reaped", "timeouts"]:
+        collected.append((
+            "counter",
+            "orrery_db_pool_events_total",
+            (("event", event),),
+            stats[event]
+        ))
+    return collected
+
+
+metrics.registry.add_collector(collect_pool_metrics)
+
+
 def check_orrery_table_status(*args):
     """
     Check that the database table for system status is in an expected state.
 
+    @param orrery_id: The orrery to check (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @return: True if an entry exists. False if no entries exist.
     @rtype: bool
     @raises RuntimeError: Raised if more than one status entry exists.
     """
-    return run_on_app_db(check_orrery_table_status_raw, args)
+    return call_storage("check_orrery_table_status", args)
 
 
 def create_orrery_status(*args):
@@ -380,19 +1619,27 @@ def create_orrery_status(*args):
 
     @param new_status: Record of the system's status.
     @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @note: Commits after operation completes.
+    @raises DuplicateEntryError: Raised if the orrery already has a status
+        entry.
     """
-    return run_on_app_db(create_orrery_status_raw, args)
+    return call_storage("create_orrery_status", args)
 
 
 def read_orrery_status(*args):
     """
     Get the status of the orrery.
 
+    @param orrery_id: The orrery to read the status of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @return: Record of the orrery system status.
     @rtype: OrreryStatus instance
     """
-    return run_on_app_db(read_orrery_status_raw, args)
+    return call_storage("read_orrery_status", args)
 
 
 def update_orrery_status(*args):
@@ -401,29 +1648,225 @@ def update_orrery_status(*args):
 
     @param new_status: Record of the system's status to persist.
     @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @note: Commits after operation completes.
+    """
+    return call_storage("update_orrery_status", args)
+
+
+def upsert_orrery_status(*args):
+    """
+    Create or update the orrery system status in a single statement.
+
+    @param new_status: Record of the system's status to persist. The start
+        date is only used if no entry exists yet.
+    @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Record of the orrery system status as persisted.
+    @rtype: OrreryStatus instance
+    @note: Commits after operation completes.
+    """
+    return call_storage("upsert_orrery_status", args)
+
+
+def sync_orrery_status(*args):
+    """
+    Create or update the orrery system status and read the user configuration
+    in one transaction.
+
+    @param new_status: Record of the system's status to persist. The start
+        date is only used if no entry exists yet.
+    @type new_status: OrreryStatus
+    @param orrery_id: The orrery the status belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Tuple of the orrery system status as persisted and the orrery
+        user configuration, which is None if the orrery has none.
+    @rtype: tuple
     @note: Commits after operation completes.
     """
-    return run_on_app_db(update_orrery_status_raw, args)
+    return call_storage("sync_orrery_status", args)
 
 
 def delete_orrery_status(*args):
     """
     Delete orrery system status entries.
 
+    @param orrery_id: The orrery to delete the status of or None for
+        every orrery (optional).
+    @type orrery_id: int
+    @note: Commits after operation completes.
+    """
+    return call_storage("delete_orrery_status", args)
+
+
+def create_orrery_status_history(*args):
+    """
+    Append orrery status samples to the status history.
+
+    @param statuses: Records of the system's status to append.
+    @type statuses: list of OrreryStatus
+    @param orrery_id: The orrery the samples belong to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @note: Commits after operation completes.
+    """
+    return call_storage("create_orrery_status_history", args)
+
+
+def create_fleet_status_history(*args):
+    """
+    Append status samples of any number of orreries to the status history.
+
+    @param samples: Tuples of the orrery ID and the record of that orrery's
+        status to append.
+    @type samples: list of tuple
+    @note: Commits after operation completes.
+    """
+    return call_storage("create_fleet_status_history", args)
+
+
+def ingest_orrery_status_batch(*args):
+    """
+    Record a batch of status samples and advance the current status.
+
+    @param statuses: Records of the system's status ordered by update time.
+    @type statuses: list of OrreryStatus
+    @param orrery_id: The orrery the samples belong to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Record of the orrery system status as persisted.
+    @rtype: OrreryStatus instance
+    @note: Commits after operation completes so that either all samples are
+        recorded or none are.
+    """
+    return call_storage("ingest_orrery_status_batch", args)
+
+
+def read_orrery_status_history(*args):
+    """
+    Get the orrery status samples recorded within a time range.
+
+    @param start: The earliest update time to include.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param orrery_id: The orrery to read samples of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Records of the orrery system status ordered by update time.
+    @rtype: list of OrreryStatus
+    """
+    return call_storage("read_orrery_status_history", args)
+
+
+def stream_orrery_status_history(start, end, orrery_id=DEFAULT_ORRERY_ID):
+    """
+    Iterate over the orrery status samples recorded within a time range.
+
+    Samples are read in chunks of config.HISTORY_EXPORT_FETCH_SIZE as the
+    iteration proceeds so that memory use does not grow with the range.
+
+    @param start: The earliest update time to include.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param orrery_id: The orrery to read samples of.
+    @type orrery_id: int
+    @return: Iterator over records of the orrery system status ordered by
+        update time.
+    @rtype: iterator over OrreryStatus
+    @note: Storage errors may be raised while iterating.
+    """
+    return call_storage(
+        "stream_orrery_status_history",
+        (start, end, config.HISTORY_EXPORT_FETCH_SIZE, orrery_id)
+    )
+
+
+def rollup_orrery_status_history(*args):
+    """
+    Summarize the status history in fixed-width time intervals.
+
+    @param start: The start of the first interval.
+    @type start: datetime.datetime
+    @param end: The update time at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param bucket_seconds: The width of each interval in seconds.
+    @type bucket_seconds: float
+    @param orrery_id: The orrery to summarize samples of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Minimum, maximum, and mean of each status value for every interval
+        with at least one sample, ordered by time.
+    @rtype: list of OrreryStatusRollup
+    """
+    return call_storage("rollup_orrery_status_history", args)
+
+
+def delete_orrery_status_history(*args):
+    """
+    Delete orrery status history samples.
+
+    @param orrery_id: The orrery to delete samples of or None for
+        every orrery (optional).
+    @type orrery_id: int
+    @note: Commits after operation completes.
+    """
+    return call_storage("delete_orrery_status_history", args)
+
+
+def read_compacted_orrery_status_history(*args):
+    """
+    Get the summaries of compacted status history within a time range.
+
+    Samples older than config.HISTORY_RAW_RETENTION_DAYS are only kept as
+    these summaries of config.HISTORY_COMPACT_BUCKET second intervals.
+
+    @param start: The earliest interval start to include.
+    @type start: datetime.datetime
+    @param end: The interval start at which to stop (exclusive).
+    @type end: datetime.datetime
+    @param orrery_id: The orrery to read summaries of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
+    @return: Summaries ordered by time.
+    @rtype: list of OrreryStatusRollup
+    """
+    return call_storage("read_compacted_orrery_status_history", args)
+
+
+def maintain_orrery_status_history(*args):
+    """
+    Create upcoming history partitions, compact old samples, and drop expired
+    history.
+
+    @param now: The current time.
+    @type now: datetime.datetime
+    @return: The changes made or None if maintenance was already running in
+        another process.
+    @rtype: history_partitions.HistoryMaintenanceResult
     @note: Commits after operation completes.
     """
-    return run_on_app_db(delete_orrery_status_raw, args)
+    return call_storage("maintain_orrery_status_history", args)
 
 
 def check_orrery_config_table(*args):
     """
     Check the database table for user configuration is in an expected state.
 
+    @param orrery_id: The orrery to check (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @return: True if an entry exists. False if no entries exist.
     @rtype: bool
     @raises RuntimeError: Raised if multiple user configuration entries exist.
     """
-    return run_on_app_db(check_orrery_config_table_raw, args)
+    return call_storage("check_orrery_config_table", args)
 
 
 def create_orrery_config(*args):
@@ -432,19 +1875,27 @@ def create_orrery_config(*args):
 
     @param new_status: New record of the system's user configuration.
     @type new_status: OrreryStatus
+    @param orrery_id: The orrery the configuration belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @note: Commits after operation completes.
+    @raises DuplicateEntryError: Raised if the orrery already has a user
+        configuration entry.
     """
-    return run_on_app_db(create_orrery_config_raw, args)
+    return call_storage("create_orrery_config", args)
 
 
 def read_orrery_config(*args):
     """
     Get the current user configuration of the orrery.
 
+    @param orrery_id: The orrery to read the configuration of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @return: Record of the orrery system status.
     @rtype: OrreryStatus instance
     """
-    return run_on_app_db(read_orrery_config_raw, args)
+    return call_storage("read_orrery_config", args)
 
 
 def update_orrery_config(*args):
@@ -453,18 +1904,24 @@ def update_orrery_config(*args):
 
     @param new_status: New record of the system's user configuration.
     @type new_status: OrreryConfig
+    @param orrery_id: The orrery the configuration belongs to (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @note: Commits after operation completes.
     """
-    return run_on_app_db(update_orrery_config_raw, args)
+    return call_storage("update_orrery_config", args)
 
 
 def delete_orrery_config(*args):
     """
     Delete orrery system user configuration entries.
 
+    @param orrery_id: The orrery to delete the configuration of or None for
+        every orrery (optional).
+    @type orrery_id: int
     @note: Commits after operation completes.
     """
-    return run_on_app_db(delete_orrery_config_raw, args)
+    return call_storage("delete_orrery_config", args)
 
 
 def initalize_database(*args):
@@ -474,15 +1931,18 @@ def initalize_database(*args):
     Create system database tables if they are not present and add default user
     configuration entry if no user configuration entry exists.
     """
-    return run_on_app_db(initalize_database_raw, args)
+    return call_storage("initalize_database", args)
 
 
 def get_orrery_config_and_status(*args):
     """
     Get the orrery user configuration and system status entries together.
 
+    @param orrery_id: The orrery to read the entries of (optional,
+        defaults to DEFAULT_ORRERY_ID).
+    @type orrery_id: int
     @return: Tuple of orrery user configuration and orrery system status
         entries.
     @rtype: tuple
     """
-    return run_on_app_db(get_orrery_config_and_status_raw, args)
+    return call_storage("get_orrery_config_and_status", args)
@@ -1,11 +1,168 @@
 import datetime
 import unittest
 
+import psycopg2
+
 import api_view
 import config
 import models
 
 
+class CountingCursor:
+    """Stand-in for a database cursor that counts executed statements."""
+
+    def __init__(self, rows, rowcount=1):
+        self.rows = rows
+        self.rowcount = rowcount
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def mogrify(self, sql, params):
+        return b"(...)"
+
+
+class TestStatementCounts(unittest.TestCase):
+    """Test that each model operation costs a single database round trip."""
+
+    def setUp(self):
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        self.test_status = models.OrreryStatus(400, 17.5, 100, today, now)
+        self.test_config = models.OrreryConfig(400, True)
+
+    def test_read_status(self):
+        cursor = CountingCursor([tuple(self.test_status)])
+        self.assertEqual(models.read_orrery_status_raw(cursor), self.test_status)
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([])
+        self.assertEqual(models.read_orrery_status_raw(cursor), None)
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([tuple(self.test_status)] * 2)
+        with self.assertRaises(RuntimeError):
+            models.read_orrery_status_raw(cursor)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_update_status(self):
+        cursor = CountingCursor([], rowcount=1)
+        models.update_orrery_status_raw(cursor, self.test_status)
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([], rowcount=2)
+        with self.assertRaises(RuntimeError):
+            models.update_orrery_status_raw(cursor, self.test_status)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_upsert_status(self):
+        cursor = CountingCursor([tuple(self.test_status)])
+        ret_status = models.upsert_orrery_status_raw(cursor, self.test_status)
+        self.assertEqual(ret_status, self.test_status)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_sync_status(self):
+        cursor = CountingCursor([tuple(self.test_status) + (400, True)])
+        self.assertEqual(
+            models.sync_orrery_status_raw(cursor, self.test_status),
+            (self.test_status, self.test_config)
+        )
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([tuple(self.test_status) + (None, None)])
+        self.assertEqual(
+            models.sync_orrery_status_raw(cursor, self.test_status),
+            (self.test_status, None)
+        )
+
+    def test_create_status_history(self):
+        cursor = CountingCursor([])
+        statuses = [self.test_status] * (config.HISTORY_INSERT_CHUNK_SIZE + 1)
+        models.create_orrery_status_history_raw(cursor, statuses)
+        self.assertEqual(len(cursor.statements), 2)
+
+    def test_create_fleet_status_history(self):
+        cursor = CountingCursor([])
+        samples = [(x % 3 + 1, self.test_status) for x in range(6)]
+        models.create_fleet_status_history_raw(cursor, samples)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_maintenance_locked(self):
+        cursor = CountingCursor([(False,)])
+        now = datetime.datetime.now()
+        self.assertEqual(
+            models.maintain_orrery_status_history_raw(cursor, now),
+            None
+        )
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_read_config(self):
+        cursor = CountingCursor([tuple(self.test_config)])
+        self.assertEqual(models.read_orrery_config_raw(cursor), self.test_config)
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([tuple(self.test_config)] * 2)
+        with self.assertRaises(RuntimeError):
+            models.read_orrery_config_raw(cursor)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_update_config(self):
+        cursor = CountingCursor([(1, "")])
+        models.update_orrery_config_raw(cursor, self.test_config)
+        self.assertEqual(len(cursor.statements), 1)
+
+        cursor = CountingCursor([(2, "")])
+        with self.assertRaises(RuntimeError):
+            models.update_orrery_config_raw(cursor, self.test_config)
+        self.assertEqual(len(cursor.statements), 1)
+
+
+class TestRollupMerge(unittest.TestCase):
+    """Test combining status summaries into wider intervals."""
+
+    def test_merge(self):
+        start = datetime.datetime(2013, 2, 13, 10)
+        rollups = [
+            models.OrreryStatusRollup(
+                start + datetime.timedelta(minutes=minute),
+                count, 1, 3, 2, 10, 30, 20, minute, minute, minute
+            )
+            for (minute, count) in [(0, 1), (30, 3), (60, 2)]
+        ]
+        merged = models.merge_orrery_status_rollups(rollups, start, 3600)
+        self.assertEqual([x.bucket_start for x in merged], [
+            start,
+            start + datetime.timedelta(hours=1)
+        ])
+        self.assertEqual(merged[0].count, 4)
+        self.assertEqual(merged[0].rotations_min, 0)
+        self.assertEqual(merged[0].rotations_max, 30)
+        self.assertEqual(merged[0].rotations_mean, 22.5)
+        self.assertEqual(merged[1].count, 2)
+
+    def test_compact(self):
+        start = datetime.datetime(2013, 2, 13, 10)
+        samples = [
+            (x % 2 + 1, models.OrreryStatus(200, 100, x, start.date(),
+                start + datetime.timedelta(minutes=x * 20)))
+            for x in range(6)
+        ]
+        compacted = models.compact_orrery_status_history(samples, 3600)
+        self.assertEqual(
+            [(x[0], x[1].bucket_start.hour, x[1].count) for x in compacted],
+            [(1, 10, 2), (1, 11, 1), (2, 10, 1), (2, 11, 2)]
+        )
+
+
+@unittest.skipIf(config.STORAGE_BACKEND != "postgres",
+    "Raw functions run on PostgreSQL cursors")
 class TestRawStatusModel(unittest.TestCase):
 
     def setUp(self):
@@ -45,6 +202,22 @@ class TestRawStatusModel(unittest.TestCase):
 
         models.delete_orrery_status_raw(self.cursor)
 
+    def test_upsert(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        now = datetime.datetime.now()
+        orig_status = models.OrreryStatus(400, 17.5, 100, yesterday, now)
+        new_status = models.OrreryStatus(401, 18.5, 101, today, now)
+
+        ret_status = models.upsert_orrery_status_raw(self.cursor, orig_status)
+        self.assertEqual(orig_status, ret_status)
+
+        ret_status = models.upsert_orrery_status_raw(self.cursor, new_status)
+        self.assertEqual(new_status._replace(start_date=yesterday), ret_status)
+        self.assertEqual(models.read_orrery_status_raw(self.cursor), ret_status)
+
+        models.delete_orrery_status_raw(self.cursor)
+
     def test_read_consistency(self):
         self.assertEqual(models.read_orrery_status_raw(self.cursor), None)
 
@@ -53,10 +226,31 @@ class TestRawStatusModel(unittest.TestCase):
         test_status = models.OrreryStatus(400, 17.5, 100, today, now)
         
         models.create_orrery_status_raw(self.cursor, test_status)
+        with self.assertRaises(psycopg2.IntegrityError):
+            models.create_orrery_status_raw(self.cursor, test_status)
+
+        self.conn.rollback()
+
+    def test_deduplicate(self):
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        test_status = models.OrreryStatus(400, 17.5, 100, today, now)
+
+        # Legacy tables without the unique key may hold rows without times
+        self.cursor.execute("DROP INDEX system_state_orrery_id_idx")
+        models.create_orrery_status_raw(
+            self.cursor,
+            test_status._replace(update_datetime=None)
+        )
         models.create_orrery_status_raw(self.cursor, test_status)
-        
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_status_raw(self.cursor)
+        models.create_orrery_status_raw(
+            self.cursor,
+            test_status._replace(update_datetime=None)
+        )
+        models.initalize_database_raw(self.cursor)
+
+        self.assertEqual(models.read_orrery_status_raw(self.cursor),
+            test_status)
 
         models.delete_orrery_status_raw(self.cursor)
 
@@ -66,12 +260,13 @@ class TestRawStatusModel(unittest.TestCase):
         today = datetime.date.today()
         now = datetime.datetime.now()
         orig_status = models.OrreryStatus(400, 17.5, 100, today, now)
+        new_status = models.OrreryStatus(401, 18.5, 101, today, now)
         
         models.create_orrery_status_raw(self.cursor, orig_status)
-        models.create_orrery_status_raw(self.cursor, orig_status)
+        models.upsert_orrery_status_raw(self.cursor, new_status)
         
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_status_raw(self.cursor)
+        ret_test_status = models.read_orrery_status_raw(self.cursor)
+        self.assertEqual(new_status, ret_test_status)
 
         models.delete_orrery_status_raw(self.cursor)
 
@@ -108,6 +303,102 @@ class TestDecoratedStatusModel(unittest.TestCase):
 
         models.delete_orrery_status()
 
+    def test_upsert(self):
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        now = datetime.datetime.now()
+        orig_status = models.OrreryStatus(400, 17.5, 100, yesterday, now)
+        new_status = models.OrreryStatus(401, 18.5, 101, today, now)
+
+        self.assertEqual(models.upsert_orrery_status(orig_status), orig_status)
+        models.upsert_orrery_status(new_status)
+
+        ret_test_status = models.read_orrery_status()
+        self.assertEqual(new_status._replace(start_date=yesterday),
+            ret_test_status)
+
+        models.delete_orrery_status()
+
+    @unittest.skipIf(config.STORAGE_BACKEND != "postgres",
+        "Prepared statements are only used by PostgreSQL")
+    def test_reprepare(self):
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        test_status = models.OrreryStatus(400, 17.5, 100, today, now)
+        models.create_orrery_status(test_status)
+        self.assertEqual(models.read_orrery_status(), test_status)
+
+        # Drop the statements on the server behind the connection's back
+        conn = models.get_db_connection()
+        conn.cursor().execute("DEALLOCATE ALL")
+        conn.commit()
+        models.release_db_connection()
+
+        self.assertEqual(models.read_orrery_status(), test_status)
+
+        models.delete_orrery_status()
+
+    def test_stream_history(self):
+        now = datetime.datetime.now()
+        statuses = [
+            models.OrreryStatus(400, 17.5, x, now.date(),
+                now + datetime.timedelta(seconds=x))
+            for x in range(5)
+        ]
+        models.delete_orrery_status_history()
+        models.create_orrery_status_history(statuses)
+        num_idle = models.get_db_pool_stats()["idle"]
+
+        streamed = models.get_storage_backend().stream_orrery_status_history(
+            now,
+            now + datetime.timedelta(seconds=4),
+            2
+        )
+        self.assertEqual(next(streamed), statuses[0])
+        self.assertEqual(list(streamed), statuses[1:4])
+        self.assertEqual(models.get_db_pool_stats()["idle"], num_idle)
+
+        streamed = models.stream_orrery_status_history(
+            now,
+            now + datetime.timedelta(seconds=5)
+        )
+        self.assertEqual(next(streamed), statuses[0])
+        streamed.close()
+        self.assertEqual(models.get_db_pool_stats()["idle"], num_idle)
+
+        models.delete_orrery_status_history()
+
+    def test_fleet(self):
+        now = datetime.datetime.now()
+        first_status = models.OrreryStatus(400, 17.5, 100, now.date(), now)
+        second_status = models.OrreryStatus(500, 18.5, 7, now.date(), now)
+        models.create_orrery_status(first_status)
+        models.upsert_orrery_status(second_status, 2)
+
+        self.assertEqual(models.read_orrery_status(), first_status)
+        self.assertEqual(models.read_orrery_status(2), second_status)
+        self.assertEqual(models.read_orrery_status(3), None)
+
+        models.delete_orrery_status_history()
+        models.create_fleet_status_history([
+            (x % 2 + 1, first_status._replace(rotations=x,
+                update_datetime=now + datetime.timedelta(seconds=x)))
+            for x in range(6)
+        ])
+        history = models.read_orrery_status_history(
+            now,
+            now + datetime.timedelta(minutes=1),
+            2
+        )
+        self.assertEqual([x.rotations for x in history], [1, 3, 5])
+
+        models.delete_orrery_status(2)
+        self.assertEqual(models.read_orrery_status(), first_status)
+        self.assertEqual(models.read_orrery_status(2), None)
+
+        models.delete_orrery_status_history()
+        models.delete_orrery_status()
+
     def test_read_consistency(self):
         today = datetime.date.today()
         now = datetime.datetime.now()
@@ -117,10 +408,10 @@ class TestDecoratedStatusModel(unittest.TestCase):
         test_status = models.OrreryStatus(400, 17.5, 100, today, now)
         
         models.create_orrery_status(test_status)
-        models.create_orrery_status(test_status)
+        with self.assertRaises(models.DuplicateEntryError):
+            models.create_orrery_status(test_status)
         
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_status()
+        self.assertEqual(models.read_orrery_status(), test_status)
 
         models.delete_orrery_status()
 
@@ -131,16 +422,18 @@ class TestDecoratedStatusModel(unittest.TestCase):
         self.assertEqual(models.read_orrery_status(), None)
 
         orig_status = models.OrreryStatus(400, 17.5, 100, today, now)
+        new_status = models.OrreryStatus(401, 18.5, 101, today, now)
         
         models.create_orrery_status(orig_status)
-        models.create_orrery_status(orig_status)
+        models.upsert_orrery_status(new_status)
         
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_status()
+        self.assertEqual(models.read_orrery_status(), new_status)
 
         models.delete_orrery_status()
 
 
+@unittest.skipIf(config.STORAGE_BACKEND != "postgres",
+    "Raw functions run on PostgreSQL cursors")
 class TestRawConfigModel(unittest.TestCase):
 
     def setUp(self):
@@ -180,25 +473,24 @@ class TestRawConfigModel(unittest.TestCase):
         self.assertEqual(models.read_orrery_config_raw(self.cursor), None)
 
         test_config = models.OrreryConfig(400, True)
-        
-        models.create_orrery_config_raw(self.cursor, test_config)
+
         models.create_orrery_config_raw(self.cursor, test_config)
-        
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_config_raw(self.cursor)
+        with self.assertRaises(psycopg2.IntegrityError):
+            models.create_orrery_config_raw(self.cursor, test_config)
 
-        models.delete_orrery_config_raw(self.cursor)
+        self.conn.rollback()
 
     def test_update_consistency(self):
         self.assertEqual(models.read_orrery_config_raw(self.cursor), None)
 
         orig_config = models.OrreryConfig(400, True)
-        
-        models.create_orrery_config_raw(self.cursor, orig_config)
+        new_config = models.OrreryConfig(401, False)
+
         models.create_orrery_config_raw(self.cursor, orig_config)
-        
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_config_raw(self.cursor)
+        models.update_orrery_config_raw(self.cursor, new_config)
+
+        ret_test_config = models.read_orrery_config_raw(self.cursor)
+        self.assertEqual(new_config, ret_test_config)
 
         models.delete_orrery_config_raw(self.cursor)
 
@@ -235,12 +527,12 @@ class TestDecoratedConfigModel(unittest.TestCase):
         self.assertEqual(models.read_orrery_config(), None)
 
         test_config = models.OrreryConfig(400, True)
-        
-        models.create_orrery_config(test_config)
+
         models.create_orrery_config(test_config)
-        
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_config()
+        with self.assertRaises(models.DuplicateEntryError):
+            models.create_orrery_config(test_config)
+
+        self.assertEqual(models.read_orrery_config(), test_config)
 
         models.delete_orrery_config()
 
@@ -248,12 +540,12 @@ class TestDecoratedConfigModel(unittest.TestCase):
         self.assertEqual(models.read_orrery_config(), None)
 
         orig_config = models.OrreryConfig(400, True)
-        
-        models.create_orrery_config(orig_config)
+        new_config = models.OrreryConfig(401, False)
+
         models.create_orrery_config(orig_config)
-        
-        with self.assertRaises(RuntimeError):
-            models.read_orrery_config()
+        models.update_orrery_config(new_config)
+
+        self.assertEqual(models.read_orrery_config(), new_config)
 
         models.delete_orrery_config()
 
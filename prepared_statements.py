@@ -0,0 +1,137 @@
+"""
+Server-side prepared statements tracked per database connection.
+
+Statements are written once in sql_statements with pyformat placeholders and
+either sent as is or, when config.DB_PREPARED_STATEMENTS is enabled, prepared
+the first time they are used on a connection and executed by name afterwards
+so that PostgreSQL skips parsing and planning on every call.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import re
+
+import psycopg2.extensions
+
+import config
+
+
+PLACEHOLDER_PATTERN = re.compile(r"%\((\w+)\)s")
+
+INVALID_SQL_STATEMENT_NAME = "26000"
+
+# Statements by the SQL text sent when preparing or executing them
+known_statements = {}
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Database connection that remembers which statements it prepared."""
+
+    def __init__(self, *args, **kwargs):
+        psycopg2.extensions.connection.__init__(self, *args, **kwargs)
+        self.prepared_names = set()
+
+
+class PreparedStatement:
+    """
+    A SQL statement that can be sent as text or as a named prepared statement.
+    """
+
+    def __init__(self, name, sql, param_types=None):
+        """
+        Create a statement from SQL with pyformat placeholders.
+
+        @param name: Unique name to prepare the statement under.
+        @type name: str
+        @param sql: The statement with %(name)s style placeholders.
+        @type sql: str
+        @param param_types: PostgreSQL types of the parameters in order of
+            first appearance or None to let the server infer them.
+        @type param_types: list of str
+        """
+        self.name = name
+        self.sql = sql
+
+        self.param_names = []
+        for param_name in PLACEHOLDER_PATTERN.findall(sql):
+            if param_name not in self.param_names:
+                self.param_names.append(param_name)
+
+        def number_placeholder(match):
+            return "$%d" % (self.param_names.index(match.group(1)) + 1)
+
+        body = PLACEHOLDER_PATTERN.sub(number_placeholder, sql)
+        body = body.replace("%%", "%")
+        if param_types:
+            self.prepare_sql = "PREPARE %s (%s) AS %s" % (
+                name,
+                ", ".join(param_types),
+                body
+            )
+        else:
+            self.prepare_sql = "PREPARE %s AS %s" % (name, body)
+
+        if self.param_names:
+            self.execute_sql = "EXECUTE %s (%s)" % (
+                name,
+                ", ".join("%%(%s)s" % x for x in self.param_names)
+            )
+        else:
+            self.execute_sql = "EXECUTE %s" % name
+
+        known_statements[self.sql] = self
+        known_statements[self.prepare_sql] = self
+        known_statements[self.execute_sql] = self
+
+
+def execute(cursor, statement, params=None):
+    """
+    Run a statement, preparing it on the cursor's connection if needed.
+
+    Statements are sent as text if prepared statements are disabled or the
+    connection was not opened with PreparingConnection.
+
+    @param cursor: The databse cursor to use to execute the request.
+    @type cursor: psycopg2.Cursor
+    @param statement: The statement to run.
+    @type statement: PreparedStatement
+    @param params: Values for the statement's placeholders.
+    @type params: dict
+    """
+    connection = getattr(cursor, "connection", None)
+    prepared_names = getattr(connection, "prepared_names", None)
+    if not config.DB_PREPARED_STATEMENTS or prepared_names is None:
+        cursor.execute(statement.sql, params)
+        return
+
+    if statement.name not in prepared_names:
+        cursor.execute(statement.prepare_sql)
+        prepared_names.add(statement.name)
+    cursor.execute(statement.execute_sql, params)
+
+
+def is_missing_statement_error(error):
+    """
+    Determine if a database error was caused by an unknown prepared statement.
+
+    @param error: The error raised by the database driver.
+    @type error: psycopg2.Error
+    @return: True if a statement was executed by a name the server does not
+        know and False otherwise.
+    @rtype: bool
+    """
+    return getattr(error, "pgcode", None) == INVALID_SQL_STATEMENT_NAME
+
+
+def forget_prepared_statements(connection):
+    """
+    Mark all statements as unprepared so they are prepared again on next use.
+
+    @param connection: The connection whose server session lost its prepared
+        statements.
+    @type connection: psycopg2.Connection
+    """
+    prepared_names = getattr(connection, "prepared_names", None)
+    if prepared_names is not None:
+        prepared_names.clear()
@@ -0,0 +1,142 @@
+"""
+Tests for server-side prepared statements tracked per database connection.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import unittest
+
+import config
+import prepared_statements
+import sql_statements
+
+
+class FakeConnection:
+    """Stand-in for a PreparingConnection."""
+
+    def __init__(self):
+        self.prepared_names = set()
+
+
+class FakeCursor:
+    """Stand-in for a database cursor that records executed statements."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+
+
+class TestPreparedStatement(unittest.TestCase):
+    """Test translating pyformat statements to PREPARE / EXECUTE."""
+
+    def test_params(self):
+        statement = prepared_statements.PreparedStatement(
+            "test_rollup",
+            sql_statements.ROLLUP_ORRERY_STATUS_HISTORY_SQL,
+            ["timestamp", "double precision", "smallint", "timestamp"]
+        )
+        self.assertEqual(
+            statement.param_names,
+            ["start", "bucket_seconds", "orrery_id", "end"]
+        )
+        self.assertTrue(statement.prepare_sql.startswith(
+            "PREPARE test_rollup (timestamp, double precision, smallint, "
+            "timestamp) AS "
+        ))
+        self.assertTrue("update_datetime - $1) / $2" in statement.prepare_sql)
+        self.assertTrue("orrery_id = $3" in statement.prepare_sql)
+        self.assertTrue("update_datetime < $4" in statement.prepare_sql)
+        self.assertFalse("%(" in statement.prepare_sql)
+        self.assertEqual(
+            statement.execute_sql,
+            "EXECUTE test_rollup (%(start)s, %(bucket_seconds)s, "
+            "%(orrery_id)s, %(end)s)"
+        )
+
+    def test_no_params(self):
+        statement = prepared_statements.PreparedStatement(
+            "test_delete",
+            sql_statements.DELETE_ALL_ORRERY_STATUS_HISTORY_SQL
+        )
+        self.assertEqual(
+            statement.prepare_sql,
+            "PREPARE test_delete AS " +
+            sql_statements.DELETE_ALL_ORRERY_STATUS_HISTORY_SQL
+        )
+        self.assertEqual(statement.execute_sql, "EXECUTE test_delete")
+
+
+class TestExecute(unittest.TestCase):
+    """Test preparing statements once per connection."""
+
+    def setUp(self):
+        self.original_setting = config.DB_PREPARED_STATEMENTS
+        config.DB_PREPARED_STATEMENTS = True
+        self.statement = prepared_statements.PreparedStatement(
+            "test_update",
+            sql_statements.UPDATE_ORRERY_CONFIG_SQL
+        )
+        self.params = {
+            "orrery_id": 1,
+            "motor_speed": 400,
+            "relay_enabled": True,
+            "notify_payload": "0"
+        }
+
+    def tearDown(self):
+        config.DB_PREPARED_STATEMENTS = self.original_setting
+
+    def test_prepare_once(self):
+        connection = FakeConnection()
+        cursor = FakeCursor(connection)
+        prepared_statements.execute(cursor, self.statement, self.params)
+        prepared_statements.execute(cursor, self.statement, self.params)
+        self.assertEqual(
+            [sql for (sql, params) in cursor.statements],
+            [
+                self.statement.prepare_sql,
+                self.statement.execute_sql,
+                self.statement.execute_sql
+            ]
+        )
+        self.assertEqual(cursor.statements[-1][1], self.params)
+
+        other_cursor = FakeCursor(FakeConnection())
+        prepared_statements.execute(other_cursor, self.statement, self.params)
+        self.assertEqual(len(other_cursor.statements), 2)
+
+    def test_forget(self):
+        connection = FakeConnection()
+        cursor = FakeCursor(connection)
+        prepared_statements.execute(cursor, self.statement, self.params)
+        prepared_statements.forget_prepared_statements(connection)
+        prepared_statements.execute(cursor, self.statement, self.params)
+        self.assertEqual(cursor.statements[2][0], self.statement.prepare_sql)
+
+    def test_disabled(self):
+        config.DB_PREPARED_STATEMENTS = False
+        cursor = FakeCursor(FakeConnection())
+        prepared_statements.execute(cursor, self.statement, self.params)
+        self.assertEqual(
+            cursor.statements,
+            [(sql_statements.UPDATE_ORRERY_CONFIG_SQL, self.params)]
+        )
+
+    def test_untracked_connection(self):
+        cursor = FakeCursor(object())
+        prepared_statements.execute(cursor, self.statement, self.params)
+        self.assertEqual(len(cursor.statements), 1)
+
+    def test_missing_statement_error(self):
+        error = RuntimeError()
+        self.assertFalse(prepared_statements.is_missing_statement_error(error))
+        error.pgcode = prepared_statements.INVALID_SQL_STATEMENT_NAME
+        self.assertTrue(prepared_statements.is_missing_statement_error(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+Statement tracing and slow query log for database operations.
+
+When config.QUERY_TRACE_ENABLED is set, run_on_app_db executes statements
+through TracingCursor which records the name, duration, and row count of
+each statement for the request being handled and logs statements slower than
+config.QUERY_TRACE_SLOW_SECONDS together with the request path. A sample of
+slow SELECT statements given by config.QUERY_TRACE_EXPLAIN_RATE is also
+logged with its EXPLAIN ANALYZE plan. When tracing is disabled the plain
+cursor is used and no statement is timed.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import logging
+import random
+import threading
+import time
+
+import psycopg2
+
+import config
+import metrics
+import prepared_statements
+import sql_statements
+
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_PATH = "(background)"
+
+EXPLAIN_SAVEPOINT_SQL = "SAVEPOINT query_trace_explain"
+EXPLAIN_RELEASE_SQL = "RELEASE SAVEPOINT query_trace_explain"
+EXPLAIN_ROLLBACK_SQL = "ROLLBACK TO SAVEPOINT query_trace_explain"
+
+MAX_UNNAMED_LENGTH = 60
+
+# Record of a single executed statement
+StatementTrace = collections.namedtuple(
+    "StatementTrace",
+    ["name", "duration", "row_count"]
+)
+
+# Per-thread list of statements run for the request being handled
+trace_state = threading.local()
+
+# Names of the fixed statements in sql_statements by their SQL text
+sql_statement_names = dict(
+    (value, name[:-len("_SQL")])
+    for (name, value) in vars(sql_statements).items()
+    if name.endswith("_SQL") and isinstance(value, str)
+)
+
+
+def describe_statement(sql):
+    """
+    Get a short name and the source SQL of an executed statement.
+
+    @param sql: The SQL text sent to the database.
+    @type sql: str
+    @return: Tuple of the statement's name and the SQL it was written as.
+        Prepared statements are named after their prepared name and other
+        statements after their sql_statements constant or, if they are built
+        at run time, the start of their text.
+    @rtype: tuple
+    """
+    statement = prepared_statements.known_statements.get(sql)
+    if statement is not None:
+        if sql == statement.prepare_sql:
+            return ("%s (prepare)" % statement.name, statement.prepare_sql)
+        return (statement.name, statement.sql)
+
+    name = sql_statement_names.get(sql)
+    if name is not None:
+        return (name, sql)
+    return (" ".join(sql.split())[:MAX_UNNAMED_LENGTH], sql)
+
+
+def is_explainable(source_sql):
+    """
+    Determine if a statement can be run again under EXPLAIN ANALYZE.
+
+    EXPLAIN ANALYZE executes the statement so only reads are explained.
+
+    @param source_sql: The statement as written.
+    @type source_sql: str
+    @return: True if the statement is a SELECT and False otherwise.
+    @rtype: bool
+    """
+    return source_sql.lstrip().upper().startswith("SELECT")
+
+
+def start_request(path):
+    """
+    Begin collecting the statements of a request handled by this thread.
+
+    @param path: The path of the request.
+    @type path: str
+    """
+    if not config.QUERY_TRACE_ENABLED:
+        return
+    trace_state.path = path
+    trace_state.statements = []
+
+
+def finish_request():
+    """
+    Stop collecting statements for this thread's request and log a summary.
+
+    @return: Statements run during the request.
+    @rtype: list of StatementTrace
+    """
+    statements = getattr(trace_state, "statements", None)
+    if statements is None:
+        return []
+    path = trace_state.path
+    trace_state.statements = None
+    trace_state.path = None
+
+    if statements and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "%s ran %d statements in %.6f s: %s",
+            path,
+            len(statements),
+            sum(x.duration for x in statements),
+            ", ".join(
+                "%s %.6f s %d rows" % (x.name, x.duration, x.row_count)
+                for x in statements
+            )
+        )
+    return statements
+
+
+def get_request_statements():
+    """
+    Get the statements run so far for this thread's request.
+
+    @return: Statements run during the request or an empty list if no
+        request is being traced.
+    @rtype: list of StatementTrace
+    """
+    return list(getattr(trace_state, "statements", None) or [])
+
+
+class TracingCursor(metrics.StatementCountingCursor):
+    """Database cursor that times each statement it sends."""
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        try:
+            return metrics.StatementCountingCursor.execute(self, sql, params)
+        finally:
+            self.trace(sql, params, time.time() - start)
+
+    def executemany(self, sql, params_seq):
+        start = time.time()
+        try:
+            return metrics.StatementCountingCursor.executemany(
+                self,
+                sql,
+                params_seq
+            )
+        finally:
+            self.trace(sql, None, time.time() - start)
+
+    def trace(self, sql, params, duration):
+        """
+        Record a statement and log it if it was slow.
+
+        @param sql: The SQL text sent to the database.
+        @type sql: str
+        @param params: The statement's parameters.
+        @type params: dict
+        @param duration: Seconds the statement took.
+        @type duration: float
+        """
+        (name, source_sql) = describe_statement(sql)
+        row_count = self.rowcount
+        statements = getattr(trace_state, "statements", None)
+        if statements is not None:
+            statements.append(StatementTrace(name, duration, row_count))
+
+        if duration < config.QUERY_TRACE_SLOW_SECONDS:
+            return
+        path = getattr(trace_state, "path", None) or BACKGROUND_PATH
+        logger.warning(
+            "Slow statement %s took %.6f s returning %d rows for %s",
+            name,
+            duration,
+            row_count,
+            path
+        )
+
+        should_explain = is_explainable(source_sql) and \
+            random.random() < config.QUERY_TRACE_EXPLAIN_RATE
+        if should_explain:
+            self.explain(name, sql, params)
+
+    def explain(self, name, sql, params):
+        """
+        Log the EXPLAIN ANALYZE plan of a statement.
+
+        The plan is taken in a savepoint on a separate cursor so that neither
+        the results waiting on this cursor nor the transaction are affected
+        if explaining fails.
+
+        @param name: The statement's name for the log.
+        @type name: str
+        @param sql: The SQL text sent to the database.
+        @type sql: str
+        @param params: The statement's parameters.
+        @type params: dict
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(EXPLAIN_SAVEPOINT_SQL)
+            try:
+                cursor.execute("EXPLAIN ANALYZE " + sql, params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                cursor.execute(EXPLAIN_RELEASE_SQL)
+            except psycopg2.Error:
+                cursor.execute(EXPLAIN_ROLLBACK_SQL)
+                raise
+            logger.warning("Plan of slow statement %s:\n%s", name, plan)
+        except psycopg2.Error:
+            logger.exception("Could not explain slow statement %s.", name)
+        finally:
+            cursor.close()
+
+
+def get_cursor_factory():
+    """
+    Get the cursor class run_on_app_db should use.
+
+    @return: TracingCursor if tracing is enabled and the statement counting
+        cursor otherwise.
+    @rtype: class
+    """
+    if config.QUERY_TRACE_ENABLED:
+        return TracingCursor
+    return metrics.StatementCountingCursor
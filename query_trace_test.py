@@ -0,0 +1,212 @@
+"""
+Tests for statement tracing and the slow query log.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import logging
+import unittest
+
+import config
+import metrics
+import models
+import query_trace
+import sql_statements
+
+
+class RecordingHandler(logging.Handler):
+    """Logging handler that keeps the messages it receives."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TraceConfigTestCase(unittest.TestCase):
+    """Test case that restores tracing settings and captures its log."""
+
+    def setUp(self):
+        self.original_settings = (
+            config.QUERY_TRACE_ENABLED,
+            config.QUERY_TRACE_SLOW_SECONDS,
+            config.QUERY_TRACE_EXPLAIN_RATE
+        )
+        config.QUERY_TRACE_ENABLED = True
+        self.handler = RecordingHandler()
+        query_trace.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        (
+            config.QUERY_TRACE_ENABLED,
+            config.QUERY_TRACE_SLOW_SECONDS,
+            config.QUERY_TRACE_EXPLAIN_RATE
+        ) = self.original_settings
+        query_trace.logger.removeHandler(self.handler)
+        query_trace.finish_request()
+
+
+class TestDescribeStatement(TraceConfigTestCase):
+    """Test naming statements and tracking requests."""
+
+    def test_prepared(self):
+        statement = models.READ_ORRERY_STATUS_STATEMENT
+        self.assertEqual(
+            query_trace.describe_statement(statement.execute_sql),
+            (statement.name, statement.sql)
+        )
+        self.assertEqual(
+            query_trace.describe_statement(statement.prepare_sql)[0],
+            "%s (prepare)" % statement.name
+        )
+        self.assertEqual(
+            query_trace.describe_statement(statement.sql)[0],
+            statement.name
+        )
+
+    def test_plain(self):
+        self.assertEqual(
+            query_trace.describe_statement(
+                sql_statements.DELETE_ORRERY_STATUS_SQL
+            )[0],
+            "DELETE_ORRERY_STATUS"
+        )
+        name = query_trace.describe_statement(
+            "INSERT INTO system_state_history\n   (motor_speed) VALUES " +
+            "(1), " * 100
+        )[0]
+        self.assertTrue(name.startswith("INSERT INTO system_state_history ("))
+        self.assertEqual(len(name), query_trace.MAX_UNNAMED_LENGTH)
+
+    def test_explainable(self):
+        self.assertTrue(query_trace.is_explainable(
+            sql_statements.READ_ORRERY_STATUS_SQL))
+        self.assertFalse(query_trace.is_explainable(
+            sql_statements.DELETE_ORRERY_STATUS_SQL))
+
+    def test_cursor_factory(self):
+        self.assertEqual(
+            query_trace.get_cursor_factory(),
+            query_trace.TracingCursor
+        )
+        config.QUERY_TRACE_ENABLED = False
+        self.assertEqual(
+            query_trace.get_cursor_factory(),
+            metrics.StatementCountingCursor
+        )
+
+    def test_disabled_request(self):
+        config.QUERY_TRACE_ENABLED = False
+        query_trace.start_request("/api/status.json")
+        self.assertEqual(query_trace.get_request_statements(), [])
+        self.assertEqual(query_trace.finish_request(), [])
+
+
+class FakeTracingCursor(object):
+    """Cursor stand-in that runs TracingCursor.trace without a database."""
+
+    trace = query_trace.TracingCursor.__dict__["trace"]
+
+    def __init__(self, rowcount):
+        self.rowcount = rowcount
+        self.explained = []
+
+    def explain(self, name, sql, params):
+        self.explained.append((name, sql, params))
+
+
+class TestTracingCursor(TraceConfigTestCase):
+    """Test recording and logging statements traced by a cursor."""
+
+    def setUp(self):
+        TraceConfigTestCase.setUp(self)
+        self.statement = models.READ_ORRERY_STATUS_STATEMENT
+        self.cursor = FakeTracingCursor(1)
+
+    def test_request_statements(self):
+        config.QUERY_TRACE_SLOW_SECONDS = 60
+        query_trace.start_request("/api/status.json")
+        self.cursor.trace(self.statement.execute_sql, None, 0.5)
+        self.assertEqual(len(query_trace.get_request_statements()), 1)
+        statements = query_trace.finish_request()
+
+        self.assertEqual(
+            statements,
+            [query_trace.StatementTrace(self.statement.name, 0.5, 1)]
+        )
+        self.assertEqual(query_trace.get_request_statements(), [])
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(self.cursor.explained, [])
+
+    def test_slow_log(self):
+        config.QUERY_TRACE_SLOW_SECONDS = 1
+        config.QUERY_TRACE_EXPLAIN_RATE = 1
+        query_trace.start_request("/api/status.json")
+        self.cursor.trace(self.statement.execute_sql, {"a": 1}, 0.5)
+        self.assertEqual(self.handler.messages, [])
+
+        self.cursor.trace(self.statement.execute_sql, {"a": 1}, 2)
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertTrue(self.handler.messages[0].startswith(
+            "Slow statement %s took 2.000000 s returning 1 rows" %
+            self.statement.name
+        ))
+        self.assertTrue(self.handler.messages[0].endswith("/api/status.json"))
+        self.assertEqual(
+            self.cursor.explained,
+            [(self.statement.name, self.statement.execute_sql, {"a": 1})]
+        )
+
+        self.cursor.trace(sql_statements.DELETE_ORRERY_STATUS_SQL, None, 2)
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(len(self.cursor.explained), 1)
+
+    def test_background(self):
+        config.QUERY_TRACE_SLOW_SECONDS = 0
+        config.QUERY_TRACE_EXPLAIN_RATE = 0
+        self.cursor.trace(self.statement.execute_sql, None, 0.5)
+        self.assertTrue(self.handler.messages[-1].endswith(
+            query_trace.BACKGROUND_PATH))
+        self.assertEqual(self.cursor.explained, [])
+        self.assertEqual(query_trace.get_request_statements(), [])
+
+
+@unittest.skipIf(config.STORAGE_BACKEND != "postgres",
+    "EXPLAIN ANALYZE runs on PostgreSQL")
+class TestExplain(TraceConfigTestCase):
+    """Test logging plans of slow statements run on the database."""
+
+    def setUp(self):
+        TraceConfigTestCase.setUp(self)
+        models.delete_orrery_status()
+        today = datetime.date.today()
+        now = datetime.datetime.now()
+        models.create_orrery_status(
+            models.OrreryStatus(400, 17.5, 100, today, now)
+        )
+
+    def tearDown(self):
+        models.delete_orrery_status()
+        TraceConfigTestCase.tearDown(self)
+
+    def test_explain(self):
+        config.QUERY_TRACE_SLOW_SECONDS = 0
+        config.QUERY_TRACE_EXPLAIN_RATE = 1
+        query_trace.start_request("/api/status.json")
+        self.assertEqual(models.read_orrery_status().rotations, 100)
+        query_trace.finish_request()
+
+        self.assertTrue(any(
+            x.startswith("Plan of slow statement %s" %
+                models.READ_ORRERY_STATUS_STATEMENT.name) and
+            "actual time" in x
+            for x in self.handler.messages
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,296 @@
+"""
+Accept-Encoding negotiation and compression of API responses.
+
+Responses are compressed with gzip or, if the zstandard package is installed,
+with the faster zstd. Streamed responses are compressed chunk by chunk and
+flushed after each chunk so clients still receive data as it is produced.
+Documents smaller than config.COMPRESSION_MIN_SIZE, like the device
+endpoints, are sent as they are.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import logging
+import os
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import config
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing
+COMPRESSIBLE_MIMETYPES = set([
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+    "text/html",
+    "text/plain"
+])
+
+# gzip header and trailer instead of the zlib ones
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class GzipCompressor:
+    """Incremental gzip compressor."""
+
+    def __init__(self):
+        """Start a new gzip stream at config.COMPRESSION_GZIP_LEVEL."""
+        self.compressor = zlib.compressobj(
+            config.COMPRESSION_GZIP_LEVEL,
+            zlib.DEFLATED,
+            GZIP_WBITS
+        )
+
+    def compress(self, data):
+        """
+        Compress part of the document and flush it.
+
+        @param data: The next part of the document.
+        @type data: bytes
+        @return: Compressed data the client can decode so far.
+        @rtype: bytes
+        """
+        return self.compressor.compress(data) + \
+            self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """
+        End the stream.
+
+        @return: The remaining compressed data and the gzip trailer.
+        @rtype: bytes
+        """
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class ZstdCompressor:
+    """Incremental zstd compressor."""
+
+    def __init__(self):
+        """Start a new zstd frame at config.COMPRESSION_ZSTD_LEVEL."""
+        self.compressor = zstandard.ZstdCompressor(
+            level=config.COMPRESSION_ZSTD_LEVEL
+        ).compressobj()
+
+    def compress(self, data):
+        """
+        Compress part of the document and flush it.
+
+        @param data: The next part of the document.
+        @type data: bytes
+        @return: Compressed data the client can decode so far.
+        @rtype: bytes
+        """
+        return self.compressor.compress(data) + \
+            self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        """
+        End the frame.
+
+        @return: The remaining compressed data.
+        @rtype: bytes
+        """
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+COMPRESSORS = {"gzip": GzipCompressor}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+elif "zstd" in config.COMPRESSION_ENCODINGS:
+    logger.warning("zstd compression requires the zstandard package, "
+        "responses will only be compressed with gzip.")
+
+
+def get_cpu_time():
+    """
+    Get the CPU time used so far by the current thread.
+
+    Python 2 has no per-thread CPU clock, so there the CPU time of the whole
+    process is used instead. Under gevent the process has a single thread
+    and both are the same.
+
+    @return: CPU seconds used.
+    @rtype: float
+    """
+    if hasattr(time, "thread_time"):
+        return time.thread_time()
+    times = os.times()
+    return times[0] + times[1]
+
+
+def get_available_encodings():
+    """
+    Get the encodings this process can produce in order of preference.
+
+    @return: Names of the encodings in config.COMPRESSION_ENCODINGS that are
+        supported.
+    @rtype: list of str
+    """
+    encodings = [
+        encoding.strip()
+        for encoding in config.COMPRESSION_ENCODINGS.split(",")
+    ]
+    return [encoding for encoding in encodings if encoding in COMPRESSORS]
+
+
+def choose_encoding(request):
+    """
+    Pick the content coding for a response to a request.
+
+    The client's quality values take precedence. Among encodings the client
+    accepts equally, the first in config.COMPRESSION_ENCODINGS is chosen.
+
+    @param request: The request being answered.
+    @type request: flask.Request
+    @return: The encoding to use or None to send the response uncompressed.
+    @rtype: str
+    """
+    return request.accept_encodings.best_match(get_available_encodings())
+
+
+def is_compressible(response):
+    """
+    Determine if a response is a candidate for compression.
+
+    @param response: The response to check.
+    @type response: flask.Response
+    @return: True if the response is a successful, not yet encoded document of
+        a compressible type and False otherwise.
+    @rtype: bool
+    """
+    return response.status_code == 200 and \
+        not response.direct_passthrough and \
+        "Content-Encoding" not in response.headers and \
+        response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_body(body, encoding, route):
+    """
+    Compress a complete document.
+
+    @param body: The document to compress.
+    @type body: bytes
+    @param encoding: The encoding to use as chosen by choose_encoding.
+    @type encoding: str
+    @param route: The route to report the compression under in /metrics.
+    @type route: str
+    @return: The compressed document.
+    @rtype: bytes
+    """
+    start = get_cpu_time()
+    compressor = COMPRESSORS[encoding]()
+    compressed = compressor.compress(body) + compressor.finish()
+    metrics.record_compression(
+        route,
+        encoding,
+        len(body),
+        len(compressed),
+        get_cpu_time() - start
+    )
+    return compressed
+
+
+def compress_chunks(chunks, encoding, route):
+    """
+    Compress a streamed document as it is generated.
+
+    Every chunk is flushed so the client can decode it on arrival. The
+    compression is reported to /metrics once the stream ends.
+
+    @param chunks: Iterable over parts of the document as str or bytes.
+    @type chunks: iterable
+    @param encoding: The encoding to use as chosen by choose_encoding.
+    @type encoding: str
+    @param route: The route to report the compression under in /metrics.
+    @type route: str
+    @return: Generator over compressed parts of the document.
+    @rtype: generator
+    """
+    compressor = COMPRESSORS[encoding]()
+    input_bytes = 0
+    output_bytes = 0
+    cpu_seconds = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            start = get_cpu_time()
+            compressed = compressor.compress(chunk)
+            cpu_seconds += get_cpu_time() - start
+            input_bytes += len(chunk)
+            output_bytes += len(compressed)
+            yield compressed
+
+        start = get_cpu_time()
+        compressed = compressor.finish()
+        cpu_seconds += get_cpu_time() - start
+        output_bytes += len(compressed)
+        yield compressed
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        metrics.record_compression(
+            route,
+            encoding,
+            input_bytes,
+            output_bytes,
+            cpu_seconds
+        )
+
+
+def compress_response(request, response, route):
+    """
+    Compress a response if the client accepts a supported encoding.
+
+    Complete documents are only compressed if they have at least
+    config.COMPRESSION_MIN_SIZE bytes. Streamed documents are always
+    compressed as their size is not known in advance. Strong entity tags are
+    made weak as the encoded bytes differ from the document they identify.
+
+    @param request: The request being answered.
+    @type request: flask.Request
+    @param response: The response to compress.
+    @type response: flask.Response
+    @param route: The route to report the compression under in /metrics.
+    @type route: str
+    @return: The given response, compressed or not.
+    @rtype: flask.Response
+    """
+    if not config.COMPRESSION_ENABLED or not is_compressible(response):
+        return response
+
+    is_streamed = response.is_streamed
+    if not is_streamed and \
+        len(response.get_data()) < config.COMPRESSION_MIN_SIZE:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return response
+
+    if is_streamed:
+        response.response = compress_chunks(response.response, encoding,
+            route)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compress_body(response.get_data(), encoding, route))
+    response.headers["Content-Encoding"] = encoding
+
+    (etag, is_weak) = response.get_etag()
+    if etag is not None and not is_weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,174 @@
+"""
+Tests for Accept-Encoding negotiation and compression of API responses.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import unittest
+import zlib
+
+import flask
+
+import config
+import metrics
+import response_compression
+
+
+class TestResponseCompression(unittest.TestCase):
+    """Test encoding negotiation, thresholds, and streamed compression."""
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.original_encodings = config.COMPRESSION_ENCODINGS
+        self.document = "".join(
+            "2013-02-13 10:00:%02d,2013-02-13,400,17.5,%d\n" % (x % 60, x)
+            for x in range(200)
+        )
+
+    def tearDown(self):
+        config.COMPRESSION_ENCODINGS = self.original_encodings
+
+    def compress(self, response, accept_encoding="gzip"):
+        headers = {"Accept-Encoding": accept_encoding}
+        with self.app.test_request_context(headers=headers):
+            return response_compression.compress_response(
+                flask.request,
+                response,
+                "/test"
+            )
+
+    def test_choose_encoding(self):
+        config.COMPRESSION_ENCODINGS = "zstd,gzip"
+        with self.app.test_request_context(
+            headers={"Accept-Encoding": "br, gzip;q=0.5"}):
+            self.assertEqual(
+                response_compression.choose_encoding(flask.request),
+                "gzip"
+            )
+        with self.app.test_request_context(
+            headers={"Accept-Encoding": "gzip;q=0, identity"}):
+            self.assertEqual(
+                response_compression.choose_encoding(flask.request),
+                None
+            )
+        with self.app.test_request_context():
+            self.assertEqual(
+                response_compression.choose_encoding(flask.request),
+                None
+            )
+
+        config.COMPRESSION_ENCODINGS = "deflate"
+        self.assertEqual(response_compression.get_available_encodings(), [])
+
+    @unittest.skipIf(response_compression.zstandard is None,
+        "zstandard is not installed")
+    def test_choose_zstd(self):
+        config.COMPRESSION_ENCODINGS = "zstd,gzip"
+        with self.app.test_request_context(
+            headers={"Accept-Encoding": "gzip, zstd"}):
+            self.assertEqual(
+                response_compression.choose_encoding(flask.request),
+                "zstd"
+            )
+
+    def test_compress_body(self):
+        response = flask.Response(self.document, content_type="text/csv")
+        response.set_etag("abc")
+        response = self.compress(response)
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.get_etag(), ("abc", True))
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        data = response.get_data()
+        self.assertEqual(response.content_length, len(data))
+        self.assertTrue(len(data) < len(self.document))
+        self.assertEqual(
+            zlib.decompress(data, response_compression.GZIP_WBITS),
+            self.document.encode("utf-8")
+        )
+
+    def test_skip(self):
+        small = "x" * (config.COMPRESSION_MIN_SIZE - 1)
+        response = self.compress(flask.Response(
+            small,
+            content_type="text/plain"
+        ))
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Vary", response.headers)
+
+        response = self.compress(flask.Response(
+            self.document,
+            content_type="image/png"
+        ))
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        response = self.compress(flask.Response(
+            self.document,
+            status=404,
+            content_type="text/plain"
+        ))
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        response = self.compress(
+            flask.Response(self.document, content_type="text/plain"),
+            "identity"
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+    def test_compress_stream(self):
+        lines = self.document.splitlines(True)
+        closed = []
+
+        def generate():
+            try:
+                for line in lines:
+                    yield line
+            finally:
+                closed.append(True)
+
+        response = self.compress(flask.Response(
+            generate(),
+            content_type="application/x-ndjson"
+        ))
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+
+        decompressor = zlib.decompressobj(response_compression.GZIP_WBITS)
+        chunks = response.iter_encoded()
+        self.assertEqual(decompressor.decompress(next(chunks)),
+            lines[0].encode("utf-8"))
+        rest = b"".join(decompressor.decompress(x) for x in chunks)
+        self.assertEqual(rest, "".join(lines[1:]).encode("utf-8"))
+        self.assertEqual(closed, [True])
+
+    def test_cpu_time(self):
+        start = response_compression.get_cpu_time()
+        zlib.compress(self.document.encode("utf-8") * 100)
+        self.assertTrue(response_compression.get_cpu_time() >= start)
+
+    def test_metrics(self):
+        response_compression.compress_body(
+            self.document.encode("utf-8"),
+            "gzip",
+            "/metrics_test"
+        )
+        labels = (("route", "/metrics_test"), ("encoding", "gzip"))
+        counters = metrics.registry.counters
+        self.assertEqual(
+            counters[("orrery_http_compression_input_bytes_total", labels)],
+            len(self.document)
+        )
+        self.assertTrue(
+            counters[("orrery_http_compression_output_bytes_total", labels)] <
+            len(self.document)
+        )
+        self.assertIn(
+            ("orrery_http_compression_cpu_seconds_total", labels),
+            counters
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -36,3 +36,34 @@ def orrery_config_to_dict(status):
         "motor_speed": status.motor_speed,
         "relay_enabled": status.relay_enabled
     }
+
+
+def orrery_status_rollup_to_dict(rollup):
+    """
+    Serialize a summary of orrery status samples to a dictionary.
+
+    @param rollup: The status history summary to serialize.
+    @type rollup: models.OrreryStatusRollup
+    @return: Serialized version of rollup as dictionary with min, max, and mean
+        grouped under each status value.
+    @rtype: dict
+    """
+    return {
+        "bucket_start": rollup.bucket_start,
+        "count": rollup.count,
+        "motor_speed": {
+            "min": rollup.motor_speed_min,
+            "max": rollup.motor_speed_max,
+            "mean": rollup.motor_speed_mean
+        },
+        "motor_draw": {
+            "min": rollup.motor_draw_min,
+            "max": rollup.motor_draw_max,
+            "mean": rollup.motor_draw_mean
+        },
+        "rotations": {
+            "min": rollup.rotations_min,
+            "max": rollup.rotations_max,
+            "mean": rollup.rotations_mean
+        }
+    }
@@ -5,39 +5,227 @@ Collection of SQL statements for orrery web control database operations.
 @license: GNU GPL v3
 """
 
-COUNT_ORRERY_STATUS_SQL = "SELECT COUNT(*) FROM system_state"
+COUNT_ORRERY_STATUS_SQL = "SELECT COUNT(*) FROM system_state WHERE "\
+    "orrery_id = %(orrery_id)s"
 
-INSERT_ORRERY_STATUS_SQL = "INSERT INTO system_state (motor_speed, "\
-    "motor_draw, rotations, start_date, update_datetime) VALUES "\
-    "(%(motor_speed)s, %(motor_draw)s, %(rotations)s, %(start_date)s, "\
-    "%(update_datetime)s)"
+INSERT_ORRERY_STATUS_SQL = "INSERT INTO system_state (orrery_id, "\
+    "motor_speed, motor_draw, rotations, start_date, update_datetime) VALUES "\
+    "(%(orrery_id)s, %(motor_speed)s, %(motor_draw)s, %(rotations)s, "\
+    "%(start_date)s, %(update_datetime)s)"
 
 READ_ORRERY_STATUS_SQL = "SELECT motor_speed, motor_draw, rotations, "\
-    "start_date, update_datetime FROM system_state"
+    "start_date, update_datetime FROM system_state WHERE "\
+    "orrery_id = %(orrery_id)s LIMIT 2"
 
 UPDATE_ORRERY_STATUS_SQL = "UPDATE system_state SET "\
     "motor_speed=%(motor_speed)s, motor_draw=%(motor_draw)s, "\
     "rotations=%(rotations)s, start_date=%(start_date)s, "\
-    "update_datetime=%(update_datetime)s"
+    "update_datetime=%(update_datetime)s WHERE orrery_id = %(orrery_id)s"
 
-DELETE_ORRERY_STATUS_SQL = "DELETE FROM system_state"
+DELETE_ORRERY_STATUS_SQL = "DELETE FROM system_state WHERE "\
+    "orrery_id = %(orrery_id)s"
+
+DELETE_ALL_ORRERY_STATUS_SQL = "DELETE FROM system_state"
+
+UPSERT_ORRERY_STATUS_SQL = "INSERT INTO system_state (orrery_id, "\
+    "motor_speed, motor_draw, rotations, start_date, update_datetime) VALUES "\
+    "(%(orrery_id)s, %(motor_speed)s, %(motor_draw)s, %(rotations)s, "\
+    "%(start_date)s, %(update_datetime)s) ON CONFLICT (orrery_id) DO UPDATE "\
+    "SET motor_speed=EXCLUDED.motor_speed, motor_draw=EXCLUDED.motor_draw, "\
+    "rotations=EXCLUDED.rotations, update_datetime=EXCLUDED.update_datetime "\
+    "RETURNING motor_speed, motor_draw, rotations, start_date, update_datetime"
+
+SYNC_ORRERY_STATUS_SQL = "WITH stored AS (" + UPSERT_ORRERY_STATUS_SQL + \
+    ") SELECT stored.motor_speed, stored.motor_draw, stored.rotations, "\
+    "stored.start_date, stored.update_datetime, system_config.motor_speed, "\
+    "system_config.relay_enabled FROM stored LEFT JOIN system_config ON "\
+    "system_config.orrery_id = %(orrery_id)s"
+
+UPSERT_NEWER_ORRERY_STATUS_SQL = "INSERT INTO system_state (orrery_id, "\
+    "motor_speed, motor_draw, rotations, start_date, update_datetime) VALUES "\
+    "(%(orrery_id)s, %(motor_speed)s, %(motor_draw)s, %(rotations)s, "\
+    "%(start_date)s, %(update_datetime)s) ON CONFLICT (orrery_id) DO UPDATE "\
+    "SET motor_speed=EXCLUDED.motor_speed, motor_draw=EXCLUDED.motor_draw, "\
+    "rotations=EXCLUDED.rotations, update_datetime=EXCLUDED.update_datetime "\
+    "WHERE system_state.update_datetime IS NULL OR "\
+    "system_state.update_datetime <= EXCLUDED.update_datetime "\
+    "RETURNING motor_speed, motor_draw, rotations, start_date, update_datetime"
 
 CREATE_ORRERY_STATUS_TABLE_SQL = "CREATE TABLE IF NOT EXISTS system_state "\
-    "(motor_speed real, motor_draw real, rotations real, start_date date, "\
+    "(orrery_id smallint NOT NULL DEFAULT 1, motor_speed real, "\
+    "motor_draw real, rotations real, start_date date, "\
     "update_datetime timestamp);"
 
+ADD_ORRERY_STATUS_KEY_SQL = "ALTER TABLE system_state ADD COLUMN IF NOT "\
+    "EXISTS orrery_id smallint NOT NULL DEFAULT 1;"
+
+DEDUPLICATE_ORRERY_STATUS_SQL = "DELETE FROM system_state WHERE ctid IN "\
+    "(SELECT ctid FROM (SELECT ctid, ROW_NUMBER() OVER (PARTITION BY "\
+    "orrery_id ORDER BY update_datetime DESC NULLS LAST, ctid DESC) AS rank "\
+    "FROM system_state) AS ranked WHERE rank > 1);"
+
+CREATE_ORRERY_STATUS_KEY_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS "\
+    "system_state_orrery_id_idx ON system_state (orrery_id);"
+
+
+INSERT_ORRERY_STATUS_HISTORY_SQL = "INSERT INTO system_state_history "\
+    "(orrery_id, motor_speed, motor_draw, rotations, start_date, "\
+    "update_datetime) VALUES "
+
+ORRERY_STATUS_HISTORY_VALUES_SQL = "(%(orrery_id)s, %(motor_speed)s, "\
+    "%(motor_draw)s, %(rotations)s, %(start_date)s, %(update_datetime)s)"
+
+READ_ORRERY_STATUS_HISTORY_SQL = "SELECT motor_speed, motor_draw, rotations, "\
+    "start_date, update_datetime FROM system_state_history WHERE "\
+    "orrery_id = %(orrery_id)s AND update_datetime >= %(start)s AND "\
+    "update_datetime < %(end)s ORDER BY update_datetime"
+
+ROLLUP_ORRERY_STATUS_HISTORY_SQL = "SELECT FLOOR(EXTRACT(EPOCH FROM "\
+    "update_datetime - %(start)s) / %(bucket_seconds)s) AS bucket, COUNT(*), "\
+    "MIN(motor_speed), MAX(motor_speed), AVG(motor_speed), "\
+    "MIN(motor_draw), MAX(motor_draw), AVG(motor_draw), "\
+    "MIN(rotations), MAX(rotations), AVG(rotations) "\
+    "FROM system_state_history WHERE orrery_id = %(orrery_id)s AND "\
+    "update_datetime >= %(start)s AND update_datetime < %(end)s "\
+    "GROUP BY bucket ORDER BY bucket"
+
+DELETE_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM system_state_history WHERE "\
+    "orrery_id = %(orrery_id)s"
+
+DELETE_ALL_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM system_state_history"
+
+READ_ORRERY_STATUS_HISTORY_KIND_SQL = "SELECT relkind FROM pg_class WHERE "\
+    "oid = to_regclass('system_state_history')"
+
+RENAME_LEGACY_ORRERY_STATUS_HISTORY_SQL = "ALTER TABLE system_state_history "\
+    "RENAME TO system_state_history_legacy;"
+
+RENAME_LEGACY_ORRERY_STATUS_HISTORY_INDEX_SQL = "ALTER INDEX IF EXISTS "\
+    "system_state_history_time_idx RENAME TO "\
+    "system_state_history_legacy_time_idx;"
+
+READ_LEGACY_ORRERY_STATUS_HISTORY_END_SQL = "SELECT MAX(update_datetime) "\
+    "FROM system_state_history_legacy"
+
+ATTACH_LEGACY_ORRERY_STATUS_HISTORY_SQL = "ALTER TABLE system_state_history "\
+    "ATTACH PARTITION system_state_history_legacy FOR VALUES FROM (MINVALUE) "\
+    "TO (%(end)s);"
+
+CREATE_ORRERY_STATUS_HISTORY_TABLE_SQL = "CREATE TABLE IF NOT EXISTS "\
+    "system_state_history (orrery_id smallint NOT NULL DEFAULT 1, "\
+    "motor_speed real, motor_draw real, rotations real, start_date date, "\
+    "update_datetime timestamp NOT NULL) PARTITION BY RANGE "\
+    "(update_datetime);"
+
+CREATE_ORRERY_STATUS_HISTORY_INDEX_SQL = "CREATE INDEX IF NOT EXISTS "\
+    "system_state_history_time_idx ON system_state_history "\
+    "(orrery_id, update_datetime);"
 
-COUNT_ORRERY_CONFIG_SQL = "SELECT COUNT(*) FROM system_config"
+CREATE_DEFAULT_ORRERY_STATUS_HISTORY_PARTITION_SQL = "CREATE TABLE IF NOT "\
+    "EXISTS system_state_history_default PARTITION OF system_state_history "\
+    "DEFAULT;"
 
-INSERT_ORRERY_CONFIG_SQL = "INSERT INTO system_config (motor_speed, "\
-    "relay_enabled) VALUES (%(motor_speed)s, %(relay_enabled)s)"
+DELETE_EXPIRED_DEFAULT_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_default WHERE update_datetime < %(end)s"
 
-READ_ORRERY_CONFIG_SQL = "SELECT motor_speed, relay_enabled FROM system_config"
+READ_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "SELECT bucket_start, "\
+    "sample_count, motor_speed_min, motor_speed_max, motor_speed_mean, "\
+    "motor_draw_min, motor_draw_max, motor_draw_mean, rotations_min, "\
+    "rotations_max, rotations_mean FROM system_state_history_compact WHERE "\
+    "orrery_id = %(orrery_id)s AND bucket_start >= %(start)s AND "\
+    "bucket_start < %(end)s ORDER BY bucket_start"
 
-UPDATE_ORRERY_CONFIG_SQL = "UPDATE system_config SET "\
-    "motor_speed=%(motor_speed)s, relay_enabled=%(relay_enabled)s"
+DELETE_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_compact WHERE orrery_id = %(orrery_id)s"
 
-DELETE_ORRERY_CONFIG_SQL = "DELETE FROM system_config"
+DELETE_ALL_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_compact"
+
+CREATE_COMPACTED_ORRERY_STATUS_HISTORY_TABLE_SQL = "CREATE TABLE IF NOT "\
+    "EXISTS system_state_history_compact (orrery_id smallint NOT NULL, "\
+    "bucket_start timestamp NOT NULL, sample_count integer NOT NULL, "\
+    "motor_speed_min real, motor_speed_max real, "\
+    "motor_speed_mean double precision, motor_draw_min real, "\
+    "motor_draw_max real, motor_draw_mean double precision, "\
+    "rotations_min real, rotations_max real, "\
+    "rotations_mean double precision) PARTITION BY RANGE (bucket_start);"
+
+CREATE_COMPACTED_ORRERY_STATUS_HISTORY_INDEX_SQL = "CREATE INDEX IF NOT "\
+    "EXISTS system_state_history_compact_time_idx ON "\
+    "system_state_history_compact (orrery_id, bucket_start);"
+
+# Statements on individual partitions name them with str.format placeholders
+# since identifiers cannot be passed as query parameters. Partition names are
+# generated by history_partitions and never come from requests.
+TRY_HISTORY_MAINTENANCE_LOCK_SQL = "SELECT pg_try_advisory_xact_lock("\
+    "%(lock_key)s)"
+
+READ_HISTORY_PARTITIONS_SQL = "SELECT child.relname, "\
+    "pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits JOIN "\
+    "pg_class child ON child.oid = pg_inherits.inhrelid WHERE "\
+    "pg_inherits.inhparent = to_regclass(%(table)s)"
+
+CREATE_HISTORY_PARTITION_SQL = "CREATE TABLE {partition} (LIKE {table} "\
+    "INCLUDING DEFAULTS INCLUDING CONSTRAINTS);"
+
+MOVE_DEFAULT_HISTORY_ROWS_SQL = "WITH moved AS (DELETE FROM {default} "\
+    "WHERE {column} >= %(start)s AND {column} < %(end)s RETURNING *) "\
+    "INSERT INTO {partition} SELECT * FROM moved"
+
+ATTACH_HISTORY_PARTITION_SQL = "ALTER TABLE {table} ATTACH PARTITION "\
+    "{partition} FOR VALUES FROM (%(start)s) TO (%(end)s);"
+
+DROP_HISTORY_PARTITION_SQL = "DROP TABLE {partition};"
+
+COMPACT_ORRERY_STATUS_HISTORY_SQL = "INSERT INTO "\
+    "system_state_history_compact (orrery_id, bucket_start, sample_count, "\
+    "motor_speed_min, motor_speed_max, motor_speed_mean, motor_draw_min, "\
+    "motor_draw_max, motor_draw_mean, rotations_min, rotations_max, "\
+    "rotations_mean) SELECT orrery_id, TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH "\
+    "FROM update_datetime) / %(bucket_seconds)s) * %(bucket_seconds)s) AT "\
+    "TIME ZONE 'UTC' AS bucket_start, COUNT(*), "\
+    "MIN(motor_speed), MAX(motor_speed), AVG(motor_speed), "\
+    "MIN(motor_draw), MAX(motor_draw), AVG(motor_draw), "\
+    "MIN(rotations), MAX(rotations), AVG(rotations) "\
+    "FROM {partition} WHERE update_datetime >= %(start)s AND "\
+    "update_datetime < %(end)s GROUP BY orrery_id, bucket_start"
+
+COUNT_ORRERY_CONFIG_SQL = "SELECT COUNT(*) FROM system_config WHERE "\
+    "orrery_id = %(orrery_id)s"
+
+INSERT_ORRERY_CONFIG_SQL = "INSERT INTO system_config (orrery_id, "\
+    "motor_speed, relay_enabled) VALUES (%(orrery_id)s, %(motor_speed)s, "\
+    "%(relay_enabled)s)"
+
+READ_ORRERY_CONFIG_SQL = "SELECT motor_speed, relay_enabled FROM "\
+    "system_config WHERE orrery_id = %(orrery_id)s LIMIT 2"
+
+UPDATE_ORRERY_CONFIG_SQL = "WITH updated AS (UPDATE system_config SET "\
+    "motor_speed=%(motor_speed)s, relay_enabled=%(relay_enabled)s "\
+    "WHERE orrery_id = %(orrery_id)s RETURNING 1) SELECT "\
+    "(SELECT COUNT(*) FROM updated), "\
+    "pg_notify('orrery_config_changed', %(notify_payload)s)"
+
+NOTIFY_ORRERY_CONFIG_SQL = "SELECT pg_notify('orrery_config_changed', "\
+    "%(notify_payload)s)"
+
+LISTEN_ORRERY_CONFIG_SQL = "LISTEN orrery_config_changed"
+
+DELETE_ORRERY_CONFIG_SQL = "DELETE FROM system_config WHERE "\
+    "orrery_id = %(orrery_id)s"
+
+DELETE_ALL_ORRERY_CONFIG_SQL = "DELETE FROM system_config"
 
 CREATE_ORRERY_CONFIG_TABLE_SQL = "CREATE TABLE IF NOT EXISTS system_config "\
-    "(motor_speed real, relay_enabled bool);"
+    "(orrery_id smallint NOT NULL DEFAULT 1, motor_speed real, "\
+    "relay_enabled bool);"
+
+ADD_ORRERY_CONFIG_KEY_SQL = "ALTER TABLE system_config ADD COLUMN IF NOT "\
+    "EXISTS orrery_id smallint NOT NULL DEFAULT 1;"
+
+DEDUPLICATE_ORRERY_CONFIG_SQL = "DELETE FROM system_config AS older USING "\
+    "system_config AS newer WHERE older.orrery_id = newer.orrery_id AND "\
+    "older.ctid < newer.ctid;"
+
+CREATE_ORRERY_CONFIG_KEY_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS "\
+    "system_config_orrery_id_idx ON system_config (orrery_id);"
@@ -0,0 +1,169 @@
+"""
+Collection of SQL statements for the SQLite storage backend.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+ENABLE_WAL_SQL = "PRAGMA journal_mode=WAL"
+
+SET_SYNCHRONOUS_SQL = "PRAGMA synchronous=NORMAL"
+
+BEGIN_SQL = "BEGIN"
+
+BEGIN_IMMEDIATE_SQL = "BEGIN IMMEDIATE"
+
+COMMIT_SQL = "COMMIT"
+
+ROLLBACK_SQL = "ROLLBACK"
+
+COUNT_ORRERY_STATUS_SQL = "SELECT COUNT(*) FROM system_state WHERE "\
+    "orrery_id=:orrery_id"
+
+INSERT_ORRERY_STATUS_SQL = "INSERT INTO system_state (orrery_id, "\
+    "motor_speed, motor_draw, rotations, start_date, update_datetime) VALUES "\
+    "(:orrery_id, :motor_speed, :motor_draw, :rotations, :start_date, "\
+    ":update_datetime)"
+
+READ_ORRERY_STATUS_SQL = "SELECT motor_speed, motor_draw, rotations, "\
+    "start_date, update_datetime FROM system_state WHERE "\
+    "orrery_id=:orrery_id LIMIT 2"
+
+UPDATE_ORRERY_STATUS_SQL = "UPDATE system_state SET "\
+    "motor_speed=:motor_speed, motor_draw=:motor_draw, "\
+    "rotations=:rotations, start_date=:start_date, "\
+    "update_datetime=:update_datetime WHERE orrery_id=:orrery_id"
+
+UPSERT_ORRERY_STATUS_SQL = "INSERT INTO system_state (orrery_id, "\
+    "motor_speed, motor_draw, rotations, start_date, update_datetime) VALUES "\
+    "(:orrery_id, :motor_speed, :motor_draw, :rotations, :start_date, "\
+    ":update_datetime) "\
+    "ON CONFLICT (orrery_id) DO UPDATE SET "\
+    "motor_speed=excluded.motor_speed, motor_draw=excluded.motor_draw, "\
+    "rotations=excluded.rotations, update_datetime=excluded.update_datetime"
+
+UPSERT_NEWER_ORRERY_STATUS_SQL = UPSERT_ORRERY_STATUS_SQL + " WHERE "\
+    "system_state.update_datetime IS NULL OR "\
+    "system_state.update_datetime <= excluded.update_datetime"
+
+DELETE_ORRERY_STATUS_SQL = "DELETE FROM system_state WHERE "\
+    "orrery_id=:orrery_id"
+
+DELETE_ALL_ORRERY_STATUS_SQL = "DELETE FROM system_state"
+
+CREATE_ORRERY_STATUS_TABLE_SQL = "CREATE TABLE IF NOT EXISTS system_state "\
+    "(orrery_id INTEGER NOT NULL DEFAULT 1, motor_speed REAL, "\
+    "motor_draw REAL, rotations REAL, start_date DATE, "\
+    "update_datetime TIMESTAMP)"
+
+CREATE_ORRERY_STATUS_KEY_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS "\
+    "system_state_orrery_id_idx ON system_state (orrery_id)"
+
+INSERT_ORRERY_STATUS_HISTORY_SQL = "INSERT INTO system_state_history "\
+    "(orrery_id, motor_speed, motor_draw, rotations, start_date, "\
+    "update_datetime) VALUES (:orrery_id, :motor_speed, :motor_draw, "\
+    ":rotations, :start_date, :update_datetime)"
+
+READ_ORRERY_STATUS_HISTORY_SQL = "SELECT motor_speed, motor_draw, rotations, "\
+    "start_date, update_datetime FROM system_state_history WHERE "\
+    "orrery_id=:orrery_id AND update_datetime >= :start AND "\
+    "update_datetime < :end ORDER BY update_datetime"
+
+DELETE_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM system_state_history WHERE "\
+    "orrery_id=:orrery_id"
+
+DELETE_ALL_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM system_state_history"
+
+CREATE_ORRERY_STATUS_HISTORY_TABLE_SQL = "CREATE TABLE IF NOT EXISTS "\
+    "system_state_history (orrery_id INTEGER NOT NULL DEFAULT 1, "\
+    "motor_speed REAL, motor_draw REAL, rotations REAL, start_date DATE, "\
+    "update_datetime TIMESTAMP NOT NULL)"
+
+CREATE_ORRERY_STATUS_HISTORY_INDEX_SQL = "CREATE INDEX IF NOT EXISTS "\
+    "system_state_history_time_idx ON system_state_history "\
+    "(orrery_id, update_datetime)"
+
+CREATE_ORRERY_STATUS_HISTORY_UPDATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS "\
+    "system_state_history_update_idx ON system_state_history "\
+    "(update_datetime)"
+
+READ_OLDEST_ORRERY_STATUS_HISTORY_SQL = "SELECT update_datetime FROM "\
+    "system_state_history ORDER BY update_datetime LIMIT 1"
+
+READ_FLEET_STATUS_HISTORY_SQL = "SELECT orrery_id, motor_speed, motor_draw, "\
+    "rotations, start_date, update_datetime FROM system_state_history WHERE "\
+    "update_datetime >= :start AND update_datetime < :end ORDER BY "\
+    "update_datetime"
+
+DELETE_EXPIRED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history WHERE update_datetime < :end"
+
+INSERT_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "INSERT INTO "\
+    "system_state_history_compact (orrery_id, bucket_start, sample_count, "\
+    "motor_speed_min, motor_speed_max, motor_speed_mean, motor_draw_min, "\
+    "motor_draw_max, motor_draw_mean, rotations_min, rotations_max, "\
+    "rotations_mean) VALUES (:orrery_id, :bucket_start, :count, "\
+    ":motor_speed_min, :motor_speed_max, :motor_speed_mean, "\
+    ":motor_draw_min, :motor_draw_max, :motor_draw_mean, :rotations_min, "\
+    ":rotations_max, :rotations_mean)"
+
+READ_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "SELECT bucket_start, "\
+    "sample_count, motor_speed_min, motor_speed_max, motor_speed_mean, "\
+    "motor_draw_min, motor_draw_max, motor_draw_mean, rotations_min, "\
+    "rotations_max, rotations_mean FROM system_state_history_compact WHERE "\
+    "orrery_id=:orrery_id AND bucket_start >= :start AND "\
+    "bucket_start < :end ORDER BY bucket_start"
+
+DELETE_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_compact WHERE orrery_id=:orrery_id"
+
+DELETE_ALL_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_compact"
+
+DELETE_EXPIRED_COMPACTED_ORRERY_STATUS_HISTORY_SQL = "DELETE FROM "\
+    "system_state_history_compact WHERE bucket_start < :end"
+
+CREATE_COMPACTED_ORRERY_STATUS_HISTORY_TABLE_SQL = "CREATE TABLE IF NOT "\
+    "EXISTS system_state_history_compact (orrery_id INTEGER NOT NULL, "\
+    "bucket_start TIMESTAMP NOT NULL, sample_count INTEGER NOT NULL, "\
+    "motor_speed_min REAL, motor_speed_max REAL, motor_speed_mean REAL, "\
+    "motor_draw_min REAL, motor_draw_max REAL, motor_draw_mean REAL, "\
+    "rotations_min REAL, rotations_max REAL, rotations_mean REAL)"
+
+CREATE_COMPACTED_ORRERY_STATUS_HISTORY_INDEX_SQL = "CREATE INDEX IF NOT "\
+    "EXISTS system_state_history_compact_time_idx ON "\
+    "system_state_history_compact (orrery_id, bucket_start)"
+
+COUNT_ORRERY_CONFIG_SQL = "SELECT COUNT(*) FROM system_config WHERE "\
+    "orrery_id=:orrery_id"
+
+INSERT_ORRERY_CONFIG_SQL = "INSERT INTO system_config (orrery_id, "\
+    "motor_speed, relay_enabled) VALUES (:orrery_id, :motor_speed, "\
+    ":relay_enabled)"
+
+READ_ORRERY_CONFIG_SQL = "SELECT motor_speed, relay_enabled FROM "\
+    "system_config WHERE orrery_id=:orrery_id LIMIT 2"
+
+UPDATE_ORRERY_CONFIG_SQL = "UPDATE system_config SET "\
+    "motor_speed=:motor_speed, relay_enabled=:relay_enabled WHERE "\
+    "orrery_id=:orrery_id"
+
+DELETE_ORRERY_CONFIG_SQL = "DELETE FROM system_config WHERE "\
+    "orrery_id=:orrery_id"
+
+DELETE_ALL_ORRERY_CONFIG_SQL = "DELETE FROM system_config"
+
+CREATE_ORRERY_CONFIG_TABLE_SQL = "CREATE TABLE IF NOT EXISTS system_config "\
+    "(orrery_id INTEGER NOT NULL DEFAULT 1, motor_speed REAL, "\
+    "relay_enabled BOOLEAN)"
+
+READ_ORRERY_CONFIG_COLUMNS_SQL = "PRAGMA table_info(system_config)"
+
+ADD_ORRERY_CONFIG_KEY_SQL = "ALTER TABLE system_config ADD COLUMN "\
+    "orrery_id INTEGER NOT NULL DEFAULT 1"
+
+DEDUPLICATE_ORRERY_CONFIG_SQL = "DELETE FROM system_config WHERE rowid NOT "\
+    "IN (SELECT MAX(rowid) FROM system_config GROUP BY orrery_id)"
+
+CREATE_ORRERY_CONFIG_KEY_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS "\
+    "system_config_orrery_id_idx ON system_config (orrery_id)"
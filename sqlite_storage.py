@@ -0,0 +1,704 @@
+"""
+SQLite storage backend for embedded single node deployments.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+
+import config
+import history_partitions
+import models
+import serialization
+import sqlite_statements
+
+
+class SqliteStorage:
+    """
+    Storage backend keeping the status, history, and configuration of every
+    orrery in a SQLite database file, each keyed by orrery ID.
+
+    Implements the storage functions of models with the same signatures and
+    semantics. The database runs in write-ahead logging mode so that readers
+    do not block the writer. Each thread of each process uses its own
+    connection and every operation runs in its own transaction. SQLite has no
+    table partitions, so history maintenance deletes expired samples one
+    config.HISTORY_PARTITION_PERIOD at a time to keep each write short.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, timeout):
+        """
+        Create a backend for a database file, creating the file if needed.
+
+        @param path: Path to the SQLite database file.
+        @type path: str
+        @param timeout: Seconds to wait for another connection's write lock.
+        @type timeout: float
+        """
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def get_connection(self):
+        """
+        Get the current thread's connection, opening it if needed.
+
+        Connections inherited from a parent process are not reused.
+
+        @return: Connection to the database file in autocommit mode.
+        @rtype: sqlite3.Connection
+        """
+        pid = os.getpid()
+        if getattr(self.local, "pid", None) != pid:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                isolation_level=None
+            )
+            conn.execute(sqlite_statements.ENABLE_WAL_SQL)
+            conn.execute(sqlite_statements.SET_SYNCHRONOUS_SQL)
+            self.local.conn = conn
+            self.local.pid = pid
+        return self.local.conn
+
+    def run_in_transaction(self, func, args, write=True):
+        """
+        Run a function in a transaction, committing if it succeeds.
+
+        Write transactions take the write lock when they start so that reads
+        followed by writes in the same operation are not interleaved with
+        other writers.
+
+        @param func: Function taking a cursor and the given arguments.
+        @type func: function
+        @param args: The arguments to call the function with after the cursor.
+        @type args: list or tuple
+        @param write: True if the function writes to the database and False if
+            it only reads.
+        @type write: bool
+        @return: Return value from passed function.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if write:
+            cursor.execute(sqlite_statements.BEGIN_IMMEDIATE_SQL)
+        else:
+            cursor.execute(sqlite_statements.BEGIN_SQL)
+        try:
+            ret_val = func(cursor, *args)
+        except:
+            cursor.execute(sqlite_statements.ROLLBACK_SQL)
+            raise
+        cursor.execute(sqlite_statements.COMMIT_SQL)
+        return ret_val
+
+    def read(self, sql, params=None):
+        """
+        Run a single query outside of an explicit transaction.
+
+        @param sql: The query to run.
+        @type sql: str
+        @param params: Values for the query's placeholders.
+        @type params: dict
+        @return: All rows returned by the query.
+        @rtype: list of tuple
+        """
+        return self.get_connection().execute(sql, params or {}).fetchall()
+
+    def check_orrery_table_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Check that an orrery has at most one status entry."""
+        entries = self.read(
+            sqlite_statements.COUNT_ORRERY_STATUS_SQL,
+            {"orrery_id": orrery_id}
+        )
+        num_entries = entries[0][0]
+        if num_entries > 1:
+            raise RuntimeError("Many orrery status entries.")
+        return num_entries == 1
+
+    def create_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create the status entry of an orrery."""
+        new_status_dict = serialization.orrery_status_to_dict(new_status)
+        new_status_dict["orrery_id"] = orrery_id
+        try:
+            self.get_connection().execute(
+                sqlite_statements.INSERT_ORRERY_STATUS_SQL,
+                new_status_dict
+            )
+        except sqlite3.IntegrityError as error:
+            raise models.DuplicateEntryError(str(error))
+
+    def read_orrery_status_raw(self, cursor, orrery_id):
+        """
+        Get the status of an orrery.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param orrery_id: The orrery to read the status of.
+        @type orrery_id: int
+        @return: Record of the orrery system status.
+        @rtype: models.OrreryStatus or None
+        @raises RuntimeError: Raised if more than one entry exists.
+        """
+        cursor.execute(
+            sqlite_statements.READ_ORRERY_STATUS_SQL,
+            {"orrery_id": orrery_id}
+        )
+        entries = cursor.fetchall()
+
+        if len(entries) == 0:
+            return None
+        if len(entries) > 1:
+            raise RuntimeError("Many orrery status entries.")
+
+        return models.OrreryStatus(*entries[0])
+
+    def read_orrery_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the status of an orrery."""
+        return self.read_orrery_status_raw(
+            self.get_connection().cursor(),
+            orrery_id
+        )
+
+    def update_orrery_status_raw(self, cursor, new_status, orrery_id):
+        """
+        Update the status of an orrery if an entry exists.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param new_status: Record of the system's status to persist.
+        @type new_status: models.OrreryStatus
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @raises RuntimeError: Raised if more than one entry was updated.
+        """
+        new_status_dict = serialization.orrery_status_to_dict(new_status)
+        new_status_dict["orrery_id"] = orrery_id
+        cursor.execute(
+            sqlite_statements.UPDATE_ORRERY_STATUS_SQL,
+            new_status_dict
+        )
+        if cursor.rowcount > 1:
+            raise RuntimeError("Many orrery status entries.")
+
+    def update_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Update the status of an orrery if an entry exists."""
+        self.run_in_transaction(
+            self.update_orrery_status_raw,
+            [new_status, orrery_id]
+        )
+
+    def upsert_orrery_status_raw(self, cursor, new_status, sql, orrery_id):
+        """
+        Create or update the status of an orrery and read it back.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param new_status: Record of the system's status to persist.
+        @type new_status: models.OrreryStatus
+        @param sql: The upsert statement to run.
+        @type sql: str
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @return: Record of the orrery system status as persisted.
+        @rtype: models.OrreryStatus
+        """
+        new_status_dict = serialization.orrery_status_to_dict(new_status)
+        new_status_dict["orrery_id"] = orrery_id
+        cursor.execute(sql, new_status_dict)
+        return self.read_orrery_status_raw(cursor, orrery_id)
+
+    def upsert_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create or update the status of an orrery keeping its start date."""
+        return self.run_in_transaction(
+            self.upsert_orrery_status_raw,
+            [new_status, sqlite_statements.UPSERT_ORRERY_STATUS_SQL, orrery_id]
+        )
+
+    def sync_orrery_status_raw(self, cursor, new_status, orrery_id):
+        """
+        Create or update the status of an orrery and read its configuration.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param new_status: Record of the system's status to persist.
+        @type new_status: models.OrreryStatus
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @return: Tuple of the orrery system status as persisted and the orrery
+            user configuration or None if the orrery has none.
+        @rtype: tuple
+        """
+        stored_status = self.upsert_orrery_status_raw(
+            cursor,
+            new_status,
+            sqlite_statements.UPSERT_ORRERY_STATUS_SQL,
+            orrery_id
+        )
+        return (stored_status, self.read_orrery_config_raw(cursor, orrery_id))
+
+    def sync_orrery_status(self, new_status,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create or update the status of an orrery and read its config."""
+        return self.run_in_transaction(
+            self.sync_orrery_status_raw,
+            [new_status, orrery_id]
+        )
+
+    def delete_orrery_status(self, orrery_id=None):
+        """Delete the status entry of an orrery or of every orrery."""
+        if orrery_id is None:
+            self.get_connection().execute(
+                sqlite_statements.DELETE_ALL_ORRERY_STATUS_SQL
+            )
+        else:
+            self.get_connection().execute(
+                sqlite_statements.DELETE_ORRERY_STATUS_SQL,
+                {"orrery_id": orrery_id}
+            )
+
+    def create_fleet_status_history_raw(self, cursor, samples):
+        """
+        Append status samples of any number of orreries to the history.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param samples: Tuples of the orrery ID and the record of that orrery's
+            status to append.
+        @type samples: list of tuple
+        """
+        values = []
+        for (orrery_id, status) in samples:
+            status_dict = serialization.orrery_status_to_dict(status)
+            status_dict["orrery_id"] = orrery_id
+            values.append(status_dict)
+        cursor.executemany(
+            sqlite_statements.INSERT_ORRERY_STATUS_HISTORY_SQL,
+            values
+        )
+
+    def create_orrery_status_history(self, statuses,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Append status samples of an orrery to the status history."""
+        self.run_in_transaction(
+            self.create_fleet_status_history_raw,
+            [[(orrery_id, status) for status in statuses]]
+        )
+
+    def create_fleet_status_history(self, samples):
+        """Append status samples of many orreries to the status history."""
+        self.run_in_transaction(
+            self.create_fleet_status_history_raw,
+            [samples]
+        )
+
+    def ingest_orrery_status_batch_raw(self, cursor, statuses, orrery_id):
+        """
+        Record a batch of status samples and advance the current status.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param statuses: Records of the system's status ordered by update time.
+        @type statuses: list of models.OrreryStatus
+        @param orrery_id: The orrery the samples belong to.
+        @type orrery_id: int
+        @return: Record of the orrery system status as persisted.
+        @rtype: models.OrreryStatus
+        """
+        stored_status = self.upsert_orrery_status_raw(
+            cursor,
+            statuses[-1],
+            sqlite_statements.UPSERT_NEWER_ORRERY_STATUS_SQL,
+            orrery_id
+        )
+        start_date = stored_status.start_date
+        self.create_fleet_status_history_raw(
+            cursor,
+            [
+                (orrery_id, status._replace(start_date=start_date))
+                for status in statuses
+            ]
+        )
+        return stored_status
+
+    def ingest_orrery_status_batch(self, statuses,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Record a batch of status samples and advance the current status."""
+        return self.run_in_transaction(
+            self.ingest_orrery_status_batch_raw,
+            [statuses, orrery_id]
+        )
+
+    def read_orrery_status_history(self, start, end,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the status samples of an orrery recorded within a time range."""
+        entries = self.read(
+            sqlite_statements.READ_ORRERY_STATUS_HISTORY_SQL,
+            {"orrery_id": orrery_id, "start": start, "end": end}
+        )
+        return [models.OrreryStatus(*entry) for entry in entries]
+
+    def stream_orrery_status_history(self, start, end, fetch_size,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Iterate over status history samples fetched in chunks."""
+        cursor = self.get_connection().execute(
+            sqlite_statements.READ_ORRERY_STATUS_HISTORY_SQL,
+            {"orrery_id": orrery_id, "start": start, "end": end}
+        )
+        try:
+            while True:
+                entries = cursor.fetchmany(fetch_size)
+                if not entries:
+                    break
+                for entry in entries:
+                    yield models.OrreryStatus(*entry)
+        finally:
+            cursor.close()
+
+    def rollup_orrery_status_history(self, start, end, bucket_seconds,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Summarize the status history in fixed-width time intervals."""
+        return models.summarize_orrery_status_history(
+            self.read_orrery_status_history(start, end, orrery_id),
+            start,
+            bucket_seconds
+        )
+
+    def delete_orrery_status_history_raw(self, cursor, orrery_id):
+        """
+        Delete the status history and compacted summaries of orreries.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param orrery_id: The orrery to delete the history of or None to
+            delete the history of every orrery.
+        @type orrery_id: int
+        """
+        if orrery_id is None:
+            cursor.execute(
+                sqlite_statements.DELETE_ALL_ORRERY_STATUS_HISTORY_SQL
+            )
+            cursor.execute(
+                sqlite_statements.DELETE_ALL_COMPACTED_ORRERY_STATUS_HISTORY_SQL
+            )
+        else:
+            cursor.execute(
+                sqlite_statements.DELETE_ORRERY_STATUS_HISTORY_SQL,
+                {"orrery_id": orrery_id}
+            )
+            cursor.execute(
+                sqlite_statements.DELETE_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+                {"orrery_id": orrery_id}
+            )
+
+    def delete_orrery_status_history(self, orrery_id=None):
+        """Delete the status history of an orrery or of every orrery."""
+        self.run_in_transaction(
+            self.delete_orrery_status_history_raw,
+            [orrery_id]
+        )
+
+    def read_compacted_orrery_status_history(self, start, end,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the compacted summaries of an orrery within a time range."""
+        entries = self.read(
+            sqlite_statements.READ_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+            {"orrery_id": orrery_id, "start": start, "end": end}
+        )
+        return [models.OrreryStatusRollup(*entry) for entry in entries]
+
+    def compact_oldest_history_period_raw(self, cursor, raw_cutoff,
+        compact_start):
+        """
+        Compact and delete the oldest period of samples past raw retention.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param raw_cutoff: The earliest update time to keep as raw samples.
+        @type raw_cutoff: datetime.datetime
+        @param compact_start: The earliest update time to keep in summaries.
+        @type compact_start: datetime.datetime
+        @return: Number of summaries written or None if no samples are past
+            the raw retention.
+        @rtype: int
+        """
+        cursor.execute(sqlite_statements.READ_OLDEST_ORRERY_STATUS_HISTORY_SQL)
+        entry = cursor.fetchone()
+        if entry is None or entry[0] >= raw_cutoff:
+            return None
+
+        period = config.HISTORY_PARTITION_PERIOD
+        end = min(
+            history_partitions.get_next_period_start(
+                history_partitions.get_period_start(entry[0], period),
+                period
+            ),
+            raw_cutoff
+        )
+        cursor.execute(
+            sqlite_statements.READ_FLEET_STATUS_HISTORY_SQL,
+            {"start": max(entry[0], compact_start), "end": end}
+        )
+        compacted = models.compact_orrery_status_history(
+            [
+                (row[0], models.OrreryStatus(*row[1:]))
+                for row in cursor.fetchall()
+            ],
+            config.HISTORY_COMPACT_BUCKET
+        )
+
+        values = []
+        for (orrery_id, rollup) in compacted:
+            rollup_dict = rollup._asdict()
+            rollup_dict["orrery_id"] = orrery_id
+            values.append(rollup_dict)
+        cursor.executemany(
+            sqlite_statements.INSERT_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+            values
+        )
+        cursor.execute(
+            sqlite_statements.DELETE_EXPIRED_ORRERY_STATUS_HISTORY_SQL,
+            {"end": end}
+        )
+        return len(compacted)
+
+    def maintain_orrery_status_history(self, now):
+        """
+        Compact samples past the raw retention and drop expired summaries.
+
+        Each period of expired samples is compacted and deleted in its own
+        transaction so that writers are only blocked briefly.
+
+        @param now: The current time.
+        @type now: datetime.datetime
+        @return: The changes made.
+        @rtype: history_partitions.HistoryMaintenanceResult
+        """
+        (raw_cutoff, compact_cutoff) = \
+            history_partitions.get_retention_cutoffs(now)
+        compact_start = history_partitions.get_compact_bucket_start(
+            compact_cutoff,
+            config.HISTORY_COMPACT_BUCKET
+        ) + datetime.timedelta(seconds=config.HISTORY_COMPACT_BUCKET)
+
+        num_rollups = 0
+        while True:
+            num_period_rollups = self.run_in_transaction(
+                self.compact_oldest_history_period_raw,
+                [raw_cutoff, compact_start]
+            )
+            if num_period_rollups is None:
+                break
+            num_rollups += num_period_rollups
+
+        self.get_connection().execute(
+            sqlite_statements.DELETE_EXPIRED_COMPACTED_ORRERY_STATUS_HISTORY_SQL,
+            {"end": compact_cutoff}
+        )
+        return history_partitions.HistoryMaintenanceResult(0, 0, num_rollups)
+
+    def check_orrery_config_table(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Check that an orrery has at most one user configuration entry."""
+        entries = self.read(
+            sqlite_statements.COUNT_ORRERY_CONFIG_SQL,
+            {"orrery_id": orrery_id}
+        )
+        num_entries = entries[0][0]
+        if num_entries > 1:
+            raise RuntimeError("Many orrery config entries.")
+        return num_entries == 1
+
+    def create_orrery_config_raw(self, cursor, new_config, orrery_id):
+        """
+        Create the user configuration entry of an orrery.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param new_config: New record of the system's user configuration.
+        @type new_config: models.OrreryConfig
+        @param orrery_id: The orrery the configuration belongs to.
+        @type orrery_id: int
+        """
+        new_config_dict = serialization.orrery_config_to_dict(new_config)
+        new_config_dict["orrery_id"] = orrery_id
+        cursor.execute(
+            sqlite_statements.INSERT_ORRERY_CONFIG_SQL,
+            new_config_dict
+        )
+
+    def create_orrery_config(self, new_config,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Create the user configuration entry of an orrery."""
+        try:
+            self.create_orrery_config_raw(
+                self.get_connection().cursor(),
+                new_config,
+                orrery_id
+            )
+        except sqlite3.IntegrityError as error:
+            raise models.DuplicateEntryError(str(error))
+
+    def read_orrery_config_raw(self, cursor, orrery_id):
+        """
+        Get the current user configuration of an orrery.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param orrery_id: The orrery to read the configuration of.
+        @type orrery_id: int
+        @return: Record of the orrery system user configuration.
+        @rtype: models.OrreryConfig or None
+        @raises RuntimeError: Raised if more than one entry exists.
+        """
+        cursor.execute(
+            sqlite_statements.READ_ORRERY_CONFIG_SQL,
+            {"orrery_id": orrery_id}
+        )
+        entries = cursor.fetchall()
+
+        if len(entries) == 0:
+            return None
+        if len(entries) > 1:
+            raise RuntimeError("Many orrery config entries.")
+
+        (motor_speed, relay_enabled) = entries[0]
+        return models.OrreryConfig(motor_speed, bool(relay_enabled))
+
+    def read_orrery_config(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the current user configuration of an orrery."""
+        return self.read_orrery_config_raw(
+            self.get_connection().cursor(),
+            orrery_id
+        )
+
+    def update_orrery_config_raw(self, cursor, new_config, orrery_id):
+        """
+        Update the user configuration of an orrery if an entry exists.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param new_config: New record of the system's user configuration.
+        @type new_config: models.OrreryConfig
+        @param orrery_id: The orrery the configuration belongs to.
+        @type orrery_id: int
+        @raises RuntimeError: Raised if more than one entry was updated.
+        """
+        new_config_dict = serialization.orrery_config_to_dict(new_config)
+        new_config_dict["orrery_id"] = orrery_id
+        cursor.execute(
+            sqlite_statements.UPDATE_ORRERY_CONFIG_SQL,
+            new_config_dict
+        )
+        if cursor.rowcount > 1:
+            raise RuntimeError("Many orrery config entries.")
+
+    def update_orrery_config(self, new_config,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """Update the user configuration of an orrery if an entry exists."""
+        self.run_in_transaction(
+            self.update_orrery_config_raw,
+            [new_config, orrery_id]
+        )
+
+    def delete_orrery_config(self, orrery_id=None):
+        """Delete the user configuration of an orrery or of every orrery."""
+        if orrery_id is None:
+            self.get_connection().execute(
+                sqlite_statements.DELETE_ALL_ORRERY_CONFIG_SQL
+            )
+        else:
+            self.get_connection().execute(
+                sqlite_statements.DELETE_ORRERY_CONFIG_SQL,
+                {"orrery_id": orrery_id}
+            )
+
+    def migrate_orrery_config_table_raw(self, cursor):
+        """
+        Key configuration tables created before entries had an orrery ID.
+
+        Existing entries are assigned to orrery 1 and only the most recently
+        inserted one is kept.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        """
+        cursor.execute(sqlite_statements.READ_ORRERY_CONFIG_COLUMNS_SQL)
+        columns = [entry[1] for entry in cursor.fetchall()]
+        if "orrery_id" not in columns:
+            cursor.execute(sqlite_statements.ADD_ORRERY_CONFIG_KEY_SQL)
+            cursor.execute(sqlite_statements.DEDUPLICATE_ORRERY_CONFIG_SQL)
+        cursor.execute(sqlite_statements.CREATE_ORRERY_CONFIG_KEY_SQL)
+
+    def initalize_database_raw(self, cursor):
+        """
+        Create tables if they do not exist and add the default configuration.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        """
+        for sql in [
+            sqlite_statements.CREATE_ORRERY_STATUS_TABLE_SQL,
+            sqlite_statements.CREATE_ORRERY_STATUS_KEY_SQL,
+            sqlite_statements.CREATE_ORRERY_STATUS_HISTORY_TABLE_SQL,
+            sqlite_statements.CREATE_ORRERY_STATUS_HISTORY_INDEX_SQL,
+            sqlite_statements.CREATE_ORRERY_STATUS_HISTORY_UPDATE_INDEX_SQL,
+            sqlite_statements.CREATE_COMPACTED_ORRERY_STATUS_HISTORY_TABLE_SQL,
+            sqlite_statements.CREATE_COMPACTED_ORRERY_STATUS_HISTORY_INDEX_SQL,
+            sqlite_statements.CREATE_ORRERY_CONFIG_TABLE_SQL
+        ]:
+            cursor.execute(sql)
+        self.migrate_orrery_config_table_raw(cursor)
+
+        cursor.execute(
+            sqlite_statements.COUNT_ORRERY_CONFIG_SQL,
+            {"orrery_id": models.DEFAULT_ORRERY_ID}
+        )
+        if cursor.fetchall()[0][0] == 0:
+            default_config = models.OrreryConfig(
+                config.DEFAULT_ORRERY_CONFIG_SPEED,
+                config.DEFAULT_RELAY_STATUS
+            )
+            self.create_orrery_config_raw(
+                cursor,
+                default_config,
+                models.DEFAULT_ORRERY_ID
+            )
+
+    def initalize_database(self):
+        """Create tables if they do not exist and add default entries."""
+        self.run_in_transaction(self.initalize_database_raw, [])
+
+    def get_orrery_config_and_status_raw(self, cursor, orrery_id):
+        """
+        Get the user configuration and status of an orrery together.
+
+        @param cursor: The cursor to use to execute the request.
+        @type cursor: sqlite3.Cursor
+        @param orrery_id: The orrery to read the entries of.
+        @type orrery_id: int
+        @return: Tuple of orrery user configuration and orrery system status
+            entries.
+        @rtype: tuple
+        """
+        return (
+            self.read_orrery_config_raw(cursor, orrery_id),
+            self.read_orrery_status_raw(cursor, orrery_id)
+        )
+
+    def get_orrery_config_and_status(self, orrery_id=config.DEFAULT_ORRERY_ID):
+        """Get the user configuration and status of an orrery together."""
+        return self.run_in_transaction(
+            self.get_orrery_config_and_status_raw,
+            [orrery_id],
+            write=False
+        )
@@ -0,0 +1,168 @@
+"""
+Parsing and validation of batched orrery status uploads.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import json
+import math
+
+import config
+import models
+
+
+NDJSON_CONTENT_TYPES = ["application/x-ndjson", "application/jsonlines"]
+
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S"
+]
+
+SAMPLE_FIELDS = ["motor_speed", "motor_draw", "rotations", "update_datetime"]
+
+
+class StatusBatchError(ValueError):
+    """Raised when a batch of status samples is malformed."""
+    pass
+
+
+def parse_epoch_seconds(seconds):
+    """
+    Convert seconds since the epoch to a local time.
+
+    @param seconds: Seconds since the epoch.
+    @type seconds: float
+    @return: The corresponding local time.
+    @rtype: datetime.datetime
+    @raises ValueError: Raised if the value is not finite or out of the range
+        supported by the platform.
+    """
+    if math.isnan(seconds) or math.isinf(seconds):
+        raise ValueError("Time is not finite: %r" % seconds)
+    try:
+        return datetime.datetime.fromtimestamp(seconds)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError("Time out of range: %r" % seconds)
+
+
+def parse_update_datetime(value):
+    """
+    Parse the time at which a status sample was taken.
+
+    @param value: Seconds since the epoch or a local time formatted as
+        "YYYY-MM-DD HH:MM:SS" with optional fractional seconds and an optional
+        "T" separator.
+    @type value: str or float
+    @return: The local time at which the sample was taken.
+    @rtype: datetime.datetime
+    @raises ValueError: Raised if the value is not a recognized time or is out
+        of range.
+    """
+    if isinstance(value, (int, float)):
+        return parse_epoch_seconds(value)
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        return parse_epoch_seconds(seconds)
+
+    for datetime_format in DATETIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, datetime_format)
+        except ValueError:
+            pass
+    raise ValueError("Unrecognized update_datetime: %r" % value)
+
+
+def read_ndjson_samples(body):
+    """
+    Read raw status samples from a newline delimited JSON document.
+
+    @param body: The request body with one JSON object per line.
+    @type body: str
+    @return: List of samples as (motor_speed, motor_draw, rotations,
+        update_datetime) tuples of unparsed values.
+    @rtype: list
+    @raises StatusBatchError: Raised if a line is not a JSON object with all
+        sample fields.
+    """
+    samples = []
+    for (line_num, line) in enumerate(body.splitlines()):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            sample_dict = json.loads(line)
+            samples.append(tuple(sample_dict[field] for field in SAMPLE_FIELDS))
+        except (ValueError, KeyError, TypeError):
+            raise StatusBatchError("Malformed sample on line %d." % line_num)
+    return samples
+
+
+def read_form_samples(form):
+    """
+    Read raw status samples from repeated form parameters.
+
+    @param form: Form with motor_speed, motor_draw, rotations, and
+        update_datetime each given once per sample in the same order.
+    @type form: werkzeug.datastructures.MultiDict
+    @return: List of samples as (motor_speed, motor_draw, rotations,
+        update_datetime) tuples of unparsed values.
+    @rtype: list
+    @raises StatusBatchError: Raised if the parameters have different counts.
+    """
+    columns = [form.getlist(field) for field in SAMPLE_FIELDS]
+    lengths = set(len(column) for column in columns)
+    if len(lengths) != 1:
+        raise StatusBatchError("Sample fields have different lengths.")
+    return list(zip(*columns))
+
+
+def parse_status_batch(request):
+    """
+    Parse and validate all status samples uploaded in a request.
+
+    @param request: Request with an NDJSON body or repeated form parameters.
+    @type request: flask.Request
+    @return: Records of the system's status ordered by update time. Start
+        dates are set to today and only used if no status entry exists yet.
+    @rtype: list of models.OrreryStatus
+    @raises StatusBatchError: Raised if the batch is empty, too large, or has
+        a malformed sample.
+    """
+    if request.mimetype in NDJSON_CONTENT_TYPES:
+        raw_samples = read_ndjson_samples(request.data.decode("utf-8"))
+    else:
+        raw_samples = read_form_samples(request.form)
+
+    if not raw_samples:
+        raise StatusBatchError("No samples provided.")
+    if len(raw_samples) > config.STATUS_BATCH_MAX_SAMPLES:
+        raise StatusBatchError(
+            "At most %d samples may be uploaded at once." %
+            config.STATUS_BATCH_MAX_SAMPLES
+        )
+
+    today = datetime.date.today()
+    statuses = []
+    for (index, raw_sample) in enumerate(raw_samples):
+        (motor_speed, motor_draw, rotations, update_datetime) = raw_sample
+        try:
+            statuses.append(models.OrreryStatus(
+                float(motor_speed),
+                float(motor_draw),
+                float(rotations),
+                today,
+                parse_update_datetime(update_datetime)
+            ))
+        except (ValueError, TypeError):
+            raise StatusBatchError("Malformed sample at index %d." % index)
+
+    statuses.sort(key=lambda status: status.update_datetime)
+    return statuses
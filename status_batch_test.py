@@ -0,0 +1,111 @@
+"""
+Tests for parsing batched orrery status uploads.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import json
+import unittest
+
+import flask
+
+import config
+import status_batch
+
+
+class TestStatusBatch(unittest.TestCase):
+    """Test parsing and validation of NDJSON and form uploads."""
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+
+    def parse(self, **kwargs):
+        with self.app.test_request_context("/", method="POST", **kwargs):
+            return status_batch.parse_status_batch(flask.request)
+
+    def test_ndjson(self):
+        lines = [
+            json.dumps({
+                "motor_speed": 200,
+                "motor_draw": 100,
+                "rotations": 2,
+                "update_datetime": "2013-02-13 10:00:01"
+            }),
+            "",
+            json.dumps({
+                "motor_speed": 200,
+                "motor_draw": 100,
+                "rotations": 1,
+                "update_datetime": "2013-02-13T10:00:00.5"
+            })
+        ]
+        statuses = self.parse(
+            data="\n".join(lines),
+            content_type="application/x-ndjson"
+        )
+        self.assertEqual([x.rotations for x in statuses], [1, 2])
+        self.assertEqual(
+            statuses[0].update_datetime,
+            datetime.datetime(2013, 2, 13, 10, 0, 0, 500000)
+        )
+
+    def test_form(self):
+        statuses = self.parse(data={
+            "motor_speed": ["200", "201"],
+            "motor_draw": ["100", "101"],
+            "rotations": ["1", "2"],
+            "update_datetime": ["1360774800", "1360774801.5"]
+        })
+        self.assertEqual([x.motor_speed for x in statuses], [200, 201])
+        self.assertEqual(
+            statuses[0].update_datetime,
+            datetime.datetime.fromtimestamp(1360774800)
+        )
+
+    def test_malformed(self):
+        with self.assertRaises(status_batch.StatusBatchError):
+            self.parse(
+                data='{"motor_speed": 1}',
+                content_type="application/x-ndjson"
+            )
+        with self.assertRaises(status_batch.StatusBatchError):
+            self.parse(data={
+                "motor_speed": ["200"],
+                "motor_draw": ["100"],
+                "rotations": ["x"],
+                "update_datetime": ["0"]
+            })
+        with self.assertRaises(status_batch.StatusBatchError):
+            self.parse(data={})
+
+    def test_out_of_range_time(self):
+        for update_datetime in ["1e20", "inf", "-inf", "nan"]:
+            with self.assertRaises(status_batch.StatusBatchError):
+                self.parse(data={
+                    "motor_speed": ["200"],
+                    "motor_draw": ["100"],
+                    "rotations": ["1"],
+                    "update_datetime": [update_datetime]
+                })
+        with self.assertRaises(status_batch.StatusBatchError):
+            self.parse(
+                data='{"motor_speed": 1, "motor_draw": 1, "rotations": 1, '
+                    '"update_datetime": 1e20}',
+                content_type="application/x-ndjson"
+            )
+
+    def test_max_samples(self):
+        num_samples = config.STATUS_BATCH_MAX_SAMPLES + 1
+        with self.assertRaises(status_batch.StatusBatchError):
+            self.parse(data={
+                "motor_speed": ["200"] * num_samples,
+                "motor_draw": ["100"] * num_samples,
+                "rotations": ["1"] * num_samples,
+                "update_datetime": ["0"] * num_samples
+            })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+Batched ingestion of orrery status samples into the status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import atexit
+import collections
+import logging
+import os
+import threading
+
+import config
+import models
+
+
+logger = logging.getLogger(__name__)
+
+
+class StatusHistoryBuffer:
+    """
+    Buffer that collects status samples and writes them to history in batches.
+
+    Samples of every orrery are appended from request handlers without touching
+    the database. A background thread writes the pending samples of all
+    orreries with one multi-row insert once enough samples have accumulated or
+    the flush interval passes. If writes fall behind, the oldest pending
+    samples are dropped so memory stays bounded.
+    """
+
+    def __init__(self, flush_func, batch_size, flush_interval, max_pending):
+        """
+        Create a new, empty history buffer.
+
+        @param flush_func: Function that persists a list of tuples of an
+            orrery ID and an OrreryStatus sample of that orrery.
+        @type flush_func: function
+        @param batch_size: Number of pending samples that triggers a flush.
+        @type batch_size: int
+        @param flush_interval: Maximum seconds a sample waits before a flush.
+        @type flush_interval: float
+        @param max_pending: Maximum number of samples held before the oldest
+            are dropped.
+        @type max_pending: int
+        """
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_needed = threading.Event()
+        self.pending = collections.deque()
+        self.flusher_pid = None
+
+        self.num_appended = 0
+        self.num_written = 0
+        self.num_dropped = 0
+        self.num_failed_flushes = 0
+
+    def ensure_flusher(self):
+        """
+        Start the background flush thread for this process if not running.
+
+        @note: Must be called with the buffer lock held.
+        """
+        pid = os.getpid()
+        if self.flusher_pid == pid:
+            return
+        self.flusher_pid = pid
+        self.flush_needed = threading.Event()
+        flusher = threading.Thread(target=self.run_flusher)
+        flusher.daemon = True
+        flusher.start()
+
+    def append(self, status, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Add a status sample to be written to history.
+
+        @param status: The status sample to record.
+        @type status: models.OrreryStatus
+        @param orrery_id: The orrery the sample belongs to.
+        @type orrery_id: int
+        """
+        self.extend([status], orrery_id)
+
+    def extend(self, statuses, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Add several status samples to be written to history.
+
+        @param statuses: The status samples to record, oldest first.
+        @type statuses: list of models.OrreryStatus
+        @param orrery_id: The orrery the samples belong to.
+        @type orrery_id: int
+        """
+        with self.lock:
+            self.ensure_flusher()
+            self.pending.extend((orrery_id, status) for status in statuses)
+            self.num_appended += len(statuses)
+            while len(self.pending) > self.max_pending:
+                self.pending.popleft()
+                self.num_dropped += 1
+            if len(self.pending) >= self.batch_size:
+                self.flush_needed.set()
+
+    def flush(self):
+        """
+        Write all pending samples to history.
+
+        Samples from a failed write are put back at the front of the buffer to
+        be retried on the next flush.
+
+        @return: Number of samples written.
+        @rtype: int
+        """
+        with self.flush_lock:
+            with self.lock:
+                samples = list(self.pending)
+                self.pending.clear()
+
+            if not samples:
+                return 0
+
+            try:
+                self.flush_func(samples)
+            except Exception:
+                logger.exception("Failed to write status history.")
+                with self.lock:
+                    self.num_failed_flushes += 1
+                    self.pending.extendleft(reversed(samples))
+                    while len(self.pending) > self.max_pending:
+                        self.pending.popleft()
+                        self.num_dropped += 1
+                return 0
+
+            with self.lock:
+                self.num_written += len(samples)
+            return len(samples)
+
+    def run_flusher(self):
+        """Flush pending samples whenever a batch fills or the interval ends."""
+        flush_needed = self.flush_needed
+        while True:
+            flush_needed.wait(self.flush_interval)
+            flush_needed.clear()
+            self.flush()
+
+    def get_stats(self):
+        """
+        Get counts of samples passing through the buffer.
+
+        @return: Dictionary of buffer statistics for this process.
+        @rtype: dict
+        """
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "appended": self.num_appended,
+                "written": self.num_written,
+                "dropped": self.num_dropped,
+                "failed_flushes": self.num_failed_flushes
+            }
+
+
+# Process-wide buffer feeding the status history table
+history_buffer = StatusHistoryBuffer(
+    models.create_fleet_status_history,
+    config.HISTORY_BATCH_SIZE,
+    config.HISTORY_FLUSH_INTERVAL,
+    config.HISTORY_MAX_PENDING
+)
+
+atexit.register(history_buffer.flush)
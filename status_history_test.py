@@ -0,0 +1,90 @@
+"""
+Tests for batched ingestion of orrery status history.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import time
+import unittest
+
+import models
+import status_history
+
+
+class TestStatusHistoryBuffer(unittest.TestCase):
+    """Test batching, retrying, and bounding of buffered history samples."""
+
+    def setUp(self):
+        self.batches = []
+        self.fail_flush = False
+        self.buffer = status_history.StatusHistoryBuffer(
+            self.record_batch,
+            100,
+            3600,
+            4
+        )
+
+    def record_batch(self, samples):
+        if self.fail_flush:
+            raise RuntimeError("Database unavailable.")
+        self.batches.append(samples)
+
+    def create_status(self, rotations):
+        return models.OrreryStatus(
+            400,
+            17.5,
+            rotations,
+            datetime.date.today(),
+            datetime.datetime.now()
+        )
+
+    def test_flush_batches(self):
+        self.buffer.append(self.create_status(1))
+        self.buffer.append(self.create_status(2))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual([x[1].rotations for x in self.batches[0]], [1, 2])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_batch_size_triggers_flush(self):
+        self.buffer.batch_size = 2
+        self.buffer.append(self.create_status(1))
+        self.buffer.append(self.create_status(2))
+
+        deadline = time.time() + 5
+        while not self.batches and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([x[1].rotations for x in self.batches[0]], [1, 2])
+
+    def test_failed_flush_requeues(self):
+        self.buffer.append(self.create_status(1))
+        self.fail_flush = True
+        self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.append(self.create_status(2))
+
+        self.fail_flush = False
+        self.buffer.flush()
+        self.assertEqual([x[1].rotations for x in self.batches[0]], [1, 2])
+        self.assertEqual(self.buffer.get_stats()["failed_flushes"], 1)
+
+    def test_max_pending(self):
+        self.buffer.extend([self.create_status(x) for x in range(6)])
+        self.buffer.flush()
+        self.assertEqual([x[1].rotations for x in self.batches[0]], [2, 3, 4, 5])
+        self.assertEqual(self.buffer.get_stats()["dropped"], 2)
+
+    def test_fleet(self):
+        self.buffer.append(self.create_status(1), 2)
+        self.buffer.extend([self.create_status(2)], 3)
+        self.buffer.append(self.create_status(3))
+        self.buffer.flush()
+        self.assertEqual(
+            [(x[0], x[1].rotations) for x in self.batches[0]],
+            [(2, 1), (3, 2), (models.DEFAULT_ORRERY_ID, 3)]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
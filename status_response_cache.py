@@ -0,0 +1,122 @@
+"""
+Per-process cache of encoded orrery status responses.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import collections
+import threading
+
+import api_view
+import config
+import http_cache
+
+
+# Named tuple to model an encoded status document and its cache validators.
+RenderedStatus = collections.namedtuple(
+    "RenderedStatus",
+    [
+        "body",
+        "etag",
+        "last_modified"
+    ]
+)
+
+
+class StatusResponseCache:
+    """
+    Cache of the encoded concise and full status documents of each orrery.
+
+    The rendered documents only change when a new status is reported or when
+    the real date rolls over, so one entry per orrery and document kind is
+    kept and keyed by the status record and the date it was rendered on. Reads
+    of a different status or on a different day replace the entry, and status
+    writes handled by this process drop the entries of the written orrery.
+    """
+
+    def __init__(self, enabled):
+        """
+        Create a new, empty status response cache.
+
+        @param enabled: True if rendered documents should be kept and False
+            if every request should render its document again.
+        @type enabled: bool
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_invalidations = 0
+
+    def get(self, record, render_full, today,
+        orrery_id=config.DEFAULT_ORRERY_ID):
+        """
+        Get the encoded status document, rendering it only if not cached.
+
+        @param record: The orrery status record being rendered.
+        @type record: models.OrreryStatus
+        @param render_full: True if the full status is rendered and False if
+            the concise status is rendered.
+        @type render_full: bool
+        @param today: The date rendered as the real date.
+        @type today: datetime.date
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @return: The encoded document and its cache validators.
+        @rtype: RenderedStatus
+        """
+        key = (record, today)
+        with self.lock:
+            entry = self.entries.get((orrery_id, render_full))
+            if entry is not None and entry[0] == key:
+                self.num_hits += 1
+                return entry[1]
+            self.num_misses += 1
+
+        body = api_view.render_orrery_status(record, render_full, today)
+        rendered = RenderedStatus(
+            body.encode("utf-8"),
+            http_cache.get_status_etag(record, render_full, today),
+            http_cache.get_status_last_modified(record, today)
+        )
+
+        if self.enabled:
+            with self.lock:
+                self.entries[(orrery_id, render_full)] = (key, rendered)
+        return rendered
+
+    def invalidate(self, orrery_id=None):
+        """
+        Drop cached documents after a status was written.
+
+        @param orrery_id: The orrery whose status was written or None to drop
+            the documents of every orrery.
+        @type orrery_id: int
+        """
+        with self.lock:
+            if orrery_id is None:
+                self.entries = {}
+            else:
+                for render_full in [True, False]:
+                    self.entries.pop((orrery_id, render_full), None)
+            self.num_invalidations += 1
+
+    def get_stats(self):
+        """
+        Get cache effectiveness statistics.
+
+        @return: Dictionary of cache statistics for this process.
+        @rtype: dict
+        """
+        with self.lock:
+            return {
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "invalidations": self.num_invalidations
+            }
+
+
+# Process-wide cache of encoded status documents
+status_response_cache = StatusResponseCache(config.STATUS_RESPONSE_CACHE)
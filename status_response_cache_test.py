@@ -0,0 +1,116 @@
+"""
+Tests for the per-process cache of encoded orrery status responses.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import json
+import unittest
+
+import api_view
+import http_cache
+import models
+import status_response_cache
+
+
+TEST_TODAY = datetime.date(2013, 2, 14)
+
+
+class TestStatusResponseCache(unittest.TestCase):
+    """Test reusing encoded status documents until the status or day change."""
+
+    def setUp(self):
+        self.cache = status_response_cache.StatusResponseCache(True)
+        self.status = models.OrreryStatus(
+            400,
+            17.5,
+            100,
+            datetime.date(2013, 2, 13),
+            datetime.datetime(2013, 2, 13, 10, 0, 0)
+        )
+        self.num_renders = 0
+        self.original_render = api_view.render_orrery_status
+        api_view.render_orrery_status = self.count_render
+
+    def tearDown(self):
+        api_view.render_orrery_status = self.original_render
+
+    def count_render(self, *args):
+        self.num_renders += 1
+        return self.original_render(*args)
+
+    def test_hit(self):
+        rendered = self.cache.get(self.status, True, TEST_TODAY)
+        self.assertTrue(self.cache.get(self.status, True, TEST_TODAY) is
+            rendered)
+        self.assertEqual(self.num_renders, 1)
+
+        body = json.loads(rendered.body.decode("utf-8"))
+        self.assertEqual(body["real_date"], "2013-02-14")
+        self.assertEqual(body["motor_draw"], 17.5)
+        self.assertEqual(
+            rendered.etag,
+            http_cache.get_status_etag(self.status, True, TEST_TODAY)
+        )
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_kinds(self):
+        full = self.cache.get(self.status, True, TEST_TODAY)
+        concise = self.cache.get(self.status, False, TEST_TODAY)
+        self.assertNotEqual(full.body, concise.body)
+        self.assertTrue(self.cache.get(self.status, False, TEST_TODAY) is
+            concise)
+        self.assertEqual(self.num_renders, 2)
+
+    def test_new_status(self):
+        self.cache.get(self.status, False, TEST_TODAY)
+        new_status = self.status._replace(
+            rotations=101,
+            update_datetime=datetime.datetime(2013, 2, 13, 10, 0, 1)
+        )
+        rendered = self.cache.get(new_status, False, TEST_TODAY)
+        self.assertEqual(json.loads(rendered.body.decode("utf-8"))["rotations"],
+            101)
+        self.assertEqual(self.num_renders, 2)
+
+    def test_new_day(self):
+        self.cache.get(self.status, False, TEST_TODAY)
+        tomorrow = TEST_TODAY + datetime.timedelta(days=1)
+        rendered = self.cache.get(self.status, False, tomorrow)
+        self.assertEqual(
+            json.loads(rendered.body.decode("utf-8"))["real_date"],
+            "2013-02-15"
+        )
+        self.assertEqual(self.num_renders, 2)
+
+    def test_invalidate(self):
+        self.cache.get(self.status, False, TEST_TODAY)
+        self.cache.invalidate()
+        self.cache.get(self.status, False, TEST_TODAY)
+        self.assertEqual(self.num_renders, 2)
+        self.assertEqual(self.cache.get_stats()["invalidations"], 1)
+
+    def test_fleet(self):
+        other_status = self.status._replace(rotations=7)
+        self.cache.get(self.status, False, TEST_TODAY)
+        rendered = self.cache.get(other_status, False, TEST_TODAY, 2)
+        self.assertTrue(self.cache.get(self.status, False, TEST_TODAY) is not
+            rendered)
+        self.assertEqual(self.num_renders, 2)
+
+        self.cache.invalidate(2)
+        self.cache.get(self.status, False, TEST_TODAY)
+        self.cache.get(other_status, False, TEST_TODAY, 2)
+        self.assertEqual(self.num_renders, 3)
+
+    def test_disabled(self):
+        cache = status_response_cache.StatusResponseCache(False)
+        cache.get(self.status, False, TEST_TODAY)
+        cache.get(self.status, False, TEST_TODAY)
+        self.assertEqual(self.num_renders, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
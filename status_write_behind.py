@@ -0,0 +1,302 @@
+"""
+Optional write-behind buffering of the current orrery system status.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+import config
+import models
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindFullError(RuntimeError):
+    """Raised when too many reports are waiting to be written."""
+    pass
+
+
+class StatusWriteBehind:
+    """
+    Buffer that acknowledges status reports before they reach the database.
+
+    Only the newest reported status of each orrery is kept. A background thread
+    writes each of them with a single upsert once enough reports have been
+    coalesced or the flush interval passes. Reports block once too many have
+    been acknowledged across all orreries without a successful write and fail
+    if the backlog does not drain in time.
+    """
+
+    def __init__(self, upsert_func, read_func, batch_size, flush_interval,
+        max_pending, timeout):
+        """
+        Create a new, empty write-behind buffer.
+
+        @param upsert_func: Function that persists an OrreryStatus for an
+            orrery ID and returns the record as persisted.
+        @type upsert_func: function
+        @param read_func: Function that reads the persisted OrreryStatus of an
+            orrery ID.
+        @type read_func: function
+        @param batch_size: Number of coalesced reports that triggers a flush.
+        @type batch_size: int
+        @param flush_interval: Maximum seconds a report waits before a flush.
+        @type flush_interval: float
+        @param max_pending: Maximum number of reports acknowledged but not yet
+            written before new reports block.
+        @type max_pending: int
+        @param timeout: Seconds a report may block before failing.
+        @type timeout: float
+        """
+        self.upsert_func = upsert_func
+        self.read_func = read_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self.condition = threading.Condition(threading.Lock())
+        self.flush_lock = threading.Lock()
+        self.flush_needed = threading.Event()
+        self.flusher_pid = None
+
+        self.pending_statuses = {}
+        self.pending_counts = {}
+        self.num_pending = 0
+        self.start_dates = {}
+
+        self.num_submitted = 0
+        self.num_flushes = 0
+        self.num_failed_flushes = 0
+        self.num_rejected = 0
+
+    def ensure_flusher(self):
+        """
+        Start the background flush thread for this process if not running.
+
+        @note: Must be called with the buffer lock held.
+        """
+        pid = os.getpid()
+        if self.flusher_pid == pid:
+            return
+        self.flusher_pid = pid
+        self.flush_needed = threading.Event()
+        flusher = threading.Thread(target=self.run_flusher)
+        flusher.daemon = True
+        flusher.start()
+
+    def load_start_date(self, orrery_id):
+        """
+        Get the start date the persisted status entry of an orrery will keep.
+
+        @param orrery_id: The orrery to get the start date of.
+        @type orrery_id: int
+        @return: The start date of the persisted entry or None if no entry has
+            been persisted yet.
+        @rtype: datetime.date
+        """
+        with self.condition:
+            start_date = self.start_dates.get(orrery_id)
+        if start_date is None:
+            stored_status = self.read_func(orrery_id)
+            if stored_status:
+                with self.condition:
+                    start_date = self.start_dates.setdefault(
+                        orrery_id,
+                        stored_status.start_date
+                    )
+        return start_date
+
+    def submit(self, new_status, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Accept a new status report to be written later.
+
+        @param new_status: Record of the system's status to persist. The start
+            date is only used if no entry exists yet.
+        @type new_status: models.OrreryStatus
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @return: Record of the orrery system status as it will be persisted.
+        @rtype: models.OrreryStatus
+        @raises WriteBehindFullError: Raised if the backlog of unwritten
+            reports did not drain in time.
+        """
+        start_date = self.load_start_date(orrery_id)
+        if start_date is not None:
+            new_status = new_status._replace(start_date=start_date)
+
+        deadline = time.time() + self.timeout
+        with self.condition:
+            self.ensure_flusher()
+
+            while self.num_pending >= self.max_pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.num_rejected += 1
+                    raise WriteBehindFullError(
+                        "Orrery status reports are not being written."
+                    )
+                self.flush_needed.set()
+                self.condition.wait(remaining)
+
+            self.pending_statuses[orrery_id] = new_status
+            self.pending_counts[orrery_id] = \
+                self.pending_counts.get(orrery_id, 0) + 1
+            self.num_pending += 1
+            self.num_submitted += 1
+            if self.num_pending >= self.batch_size:
+                self.flush_needed.set()
+
+        return new_status
+
+    def get_status(self, orrery_id=models.DEFAULT_ORRERY_ID):
+        """
+        Get the newest status report of an orrery not yet written.
+
+        @param orrery_id: The orrery to get the buffered status of.
+        @type orrery_id: int
+        @return: The buffered status or None if nothing is waiting to be
+            written.
+        @rtype: models.OrreryStatus
+        """
+        with self.condition:
+            return self.pending_statuses.get(orrery_id)
+
+    def flush_orrery(self, orrery_id, status, num_flushed):
+        """
+        Write the newest buffered status report of an orrery to the database.
+
+        @param orrery_id: The orrery the status belongs to.
+        @type orrery_id: int
+        @param status: The buffered status to write.
+        @type status: models.OrreryStatus
+        @param num_flushed: Number of reports the buffered status coalesced.
+        @type num_flushed: int
+        @return: True if the status was written and False otherwise.
+        @rtype: bool
+        @note: Must be called with the flush lock held.
+        """
+        try:
+            stored_status = self.upsert_func(status, orrery_id)
+        except Exception:
+            logger.exception("Failed to write orrery status.")
+            with self.condition:
+                self.num_failed_flushes += 1
+            return False
+
+        with self.condition:
+            self.start_dates[orrery_id] = stored_status.start_date
+            self.num_pending -= num_flushed
+            self.pending_counts[orrery_id] -= num_flushed
+            self.num_flushes += 1
+            pending_status = self.pending_statuses.get(orrery_id)
+            if pending_status is status:
+                del self.pending_statuses[orrery_id]
+                del self.pending_counts[orrery_id]
+            elif pending_status is not None:
+                self.pending_statuses[orrery_id] = pending_status._replace(
+                    start_date=stored_status.start_date
+                )
+            self.condition.notify_all()
+        return True
+
+    def flush(self):
+        """
+        Write the newest buffered status report of every orrery to the database.
+
+        @return: True if any status was written and False otherwise.
+        @rtype: bool
+        """
+        with self.flush_lock:
+            with self.condition:
+                pending = [
+                    (orrery_id, status, self.pending_counts[orrery_id])
+                    for (orrery_id, status) in self.pending_statuses.items()
+                ]
+
+            num_written = 0
+            for (orrery_id, status, num_flushed) in pending:
+                if self.flush_orrery(orrery_id, status, num_flushed):
+                    num_written += 1
+            return num_written > 0
+
+    def run_flusher(self):
+        """Flush buffered reports whenever a batch fills or the interval ends."""
+        flush_needed = self.flush_needed
+        while True:
+            flush_needed.wait(self.flush_interval)
+            flush_needed.clear()
+            self.flush()
+
+    def get_stats(self):
+        """
+        Get counts of reports passing through the buffer.
+
+        @return: Dictionary of buffer statistics for this process.
+        @rtype: dict
+        """
+        with self.condition:
+            return {
+                "pending": self.num_pending,
+                "submitted": self.num_submitted,
+                "flushes": self.num_flushes,
+                "failed_flushes": self.num_failed_flushes,
+                "rejected": self.num_rejected
+            }
+
+
+def store_orrery_status(new_status, orrery_id=models.DEFAULT_ORRERY_ID):
+    """
+    Persist a status report directly or through the write-behind buffer.
+
+    @param new_status: Record of the system's status to persist. The start
+        date is only used if no entry exists yet.
+    @type new_status: models.OrreryStatus
+    @param orrery_id: The orrery the status belongs to.
+    @type orrery_id: int
+    @return: Record of the orrery system status as persisted or as it will be
+        persisted.
+    @rtype: models.OrreryStatus
+    @raises WriteBehindFullError: Raised if write-behind is enabled and the
+        backlog of unwritten reports did not drain in time.
+    """
+    if config.STATUS_WRITE_BEHIND:
+        return status_write_behind.submit(new_status, orrery_id)
+    else:
+        return models.upsert_orrery_status(new_status, orrery_id)
+
+
+def read_orrery_status(orrery_id=models.DEFAULT_ORRERY_ID):
+    """
+    Get the status of an orrery including any report not yet written.
+
+    @param orrery_id: The orrery to read the status of.
+    @type orrery_id: int
+    @return: Record of the orrery system status.
+    @rtype: models.OrreryStatus
+    """
+    if config.STATUS_WRITE_BEHIND:
+        buffered_status = status_write_behind.get_status(orrery_id)
+        if buffered_status is not None:
+            return buffered_status
+    return models.read_orrery_status(orrery_id)
+
+
+# Process-wide write-behind buffer for the current orrery status
+status_write_behind = StatusWriteBehind(
+    models.upsert_orrery_status,
+    models.read_orrery_status,
+    config.STATUS_WRITE_BEHIND_BATCH_SIZE,
+    config.STATUS_WRITE_BEHIND_INTERVAL,
+    config.STATUS_WRITE_BEHIND_MAX_PENDING,
+    config.STATUS_WRITE_BEHIND_TIMEOUT
+)
+
+atexit.register(status_write_behind.flush)
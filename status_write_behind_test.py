@@ -0,0 +1,108 @@
+"""
+Tests for write-behind buffering of the orrery system status.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import unittest
+
+import models
+import status_write_behind
+
+
+class TestStatusWriteBehind(unittest.TestCase):
+    """Test coalescing, flushing, and backpressure of buffered reports."""
+
+    def setUp(self):
+        self.stored_status = None
+        self.fleet_statuses = {}
+        self.num_upserts = 0
+        self.fail_flush = False
+        self.start_date = datetime.date.today() - datetime.timedelta(days=3)
+        self.buffer = status_write_behind.StatusWriteBehind(
+            self.upsert,
+            self.read,
+            100,
+            3600,
+            3,
+            0.05
+        )
+
+    def upsert(self, new_status, orrery_id):
+        if self.fail_flush:
+            raise RuntimeError("Database unavailable.")
+        self.num_upserts += 1
+        if orrery_id != models.DEFAULT_ORRERY_ID:
+            self.fleet_statuses[orrery_id] = new_status
+            return new_status
+        if self.stored_status:
+            new_status = new_status._replace(
+                start_date=self.stored_status.start_date
+            )
+        self.stored_status = new_status
+        return new_status
+
+    def read(self, orrery_id):
+        if orrery_id != models.DEFAULT_ORRERY_ID:
+            return self.fleet_statuses.get(orrery_id)
+        return self.stored_status
+
+    def create_status(self, rotations):
+        return models.OrreryStatus(
+            400,
+            17.5,
+            rotations,
+            datetime.date.today(),
+            datetime.datetime.now()
+        )
+
+    def test_coalesce(self):
+        self.buffer.submit(self.create_status(1))
+        self.buffer.submit(self.create_status(2))
+        self.assertEqual(self.buffer.get_status().rotations, 2)
+
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.num_upserts, 1)
+        self.assertEqual(self.stored_status.rotations, 2)
+        self.assertEqual(self.buffer.get_status(), None)
+        self.assertFalse(self.buffer.flush())
+
+    def test_keeps_start_date(self):
+        self.stored_status = self.create_status(0)._replace(
+            start_date=self.start_date
+        )
+        ret_status = self.buffer.submit(self.create_status(1))
+        self.assertEqual(ret_status.start_date, self.start_date)
+
+    def test_backpressure(self):
+        self.fail_flush = True
+        for rotations in range(3):
+            self.buffer.submit(self.create_status(rotations))
+        with self.assertRaises(status_write_behind.WriteBehindFullError):
+            self.buffer.submit(self.create_status(3))
+
+        self.fail_flush = False
+        self.buffer.flush()
+        self.buffer.submit(self.create_status(4))
+        self.assertEqual(self.buffer.get_stats()["rejected"], 1)
+
+    def test_fleet(self):
+        self.buffer.submit(self.create_status(1))
+        self.buffer.submit(self.create_status(2), 2)
+        self.buffer.submit(self.create_status(3), 2)
+        self.assertEqual(self.buffer.get_status().rotations, 1)
+        self.assertEqual(self.buffer.get_status(2).rotations, 3)
+        self.assertEqual(self.buffer.get_stats()["pending"], 3)
+
+        self.assertTrue(self.buffer.flush())
+        self.assertEqual(self.num_upserts, 2)
+        self.assertEqual(self.stored_status.rotations, 1)
+        self.assertEqual(self.fleet_statuses[2].rotations, 3)
+        self.assertEqual(self.buffer.get_status(2), None)
+        self.assertEqual(self.buffer.get_stats()["pending"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
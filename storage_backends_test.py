@@ -0,0 +1,407 @@
+"""
+Tests for the in-memory and SQLite storage backends.
+
+@author: Sam Pottinger
+@license: GNU GPL v3
+"""
+
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import config
+import memory_storage
+import models
+import sqlite_storage
+
+
+class StorageBackendTests:
+    """Tests every storage backend must pass. Mixed into a TestCase."""
+
+    def create_backend(self):
+        raise NotImplementedError()
+
+    def setUp(self):
+        self.backend = self.create_backend()
+        self.backend.initalize_database()
+        self.backend.delete_orrery_status()
+        self.backend.delete_orrery_status_history()
+        self.backend.delete_orrery_config()
+
+        self.today = datetime.date(2013, 2, 13)
+        self.now = datetime.datetime(2013, 2, 13, 10, 0, 0, 250000)
+
+    def test_status_create_read(self):
+        self.assertEqual(self.backend.read_orrery_status(), None)
+        self.assertFalse(self.backend.check_orrery_table_status())
+
+        test_status = models.OrreryStatus(400, 17.5, 100, self.today, self.now)
+        self.backend.create_orrery_status(test_status)
+        self.assertEqual(self.backend.read_orrery_status(), test_status)
+        self.assertTrue(self.backend.check_orrery_table_status())
+
+        with self.assertRaises(models.DuplicateEntryError):
+            self.backend.create_orrery_status(test_status)
+
+        self.backend.delete_orrery_status()
+        self.assertEqual(self.backend.read_orrery_status(), None)
+
+    def test_status_update(self):
+        orig_status = models.OrreryStatus(400, 17.5, 100, self.today, self.now)
+        new_status = models.OrreryStatus(401, 18.5, 101, self.today, self.now)
+
+        self.backend.update_orrery_status(new_status)
+        self.assertEqual(self.backend.read_orrery_status(), None)
+
+        self.backend.create_orrery_status(orig_status)
+        self.backend.update_orrery_status(new_status)
+        self.assertEqual(self.backend.read_orrery_status(), new_status)
+
+    def test_status_upsert(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        orig_status = models.OrreryStatus(400, 17.5, 100, yesterday, self.now)
+        new_status = models.OrreryStatus(401, 18.5, 101, self.today, self.now)
+
+        self.assertEqual(
+            self.backend.upsert_orrery_status(orig_status),
+            orig_status
+        )
+        expected_status = new_status._replace(start_date=yesterday)
+        self.assertEqual(
+            self.backend.upsert_orrery_status(new_status),
+            expected_status
+        )
+        self.assertEqual(self.backend.read_orrery_status(), expected_status)
+
+    def test_sync(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        orig_status = models.OrreryStatus(400, 17.5, 100, yesterday, self.now)
+        new_status = models.OrreryStatus(401, 18.5, 101, self.today, self.now)
+        test_config = models.OrreryConfig(400, True)
+
+        self.assertEqual(
+            self.backend.sync_orrery_status(orig_status),
+            (orig_status, None)
+        )
+        self.backend.create_orrery_config(test_config)
+        self.assertEqual(
+            self.backend.sync_orrery_status(new_status),
+            (new_status._replace(start_date=yesterday), test_config)
+        )
+
+    def test_history(self):
+        statuses = [
+            models.OrreryStatus(200 + x, 100, x, self.today,
+                self.now + datetime.timedelta(seconds=x * 20))
+            for x in range(6)
+        ]
+        self.backend.create_orrery_status_history(list(reversed(statuses)))
+
+        history = self.backend.read_orrery_status_history(
+            statuses[1].update_datetime,
+            statuses[4].update_datetime
+        )
+        self.assertEqual(history, statuses[1:4])
+
+        rollups = self.backend.rollup_orrery_status_history(
+            self.now,
+            self.now + datetime.timedelta(minutes=2),
+            60
+        )
+        self.assertEqual([x.count for x in rollups], [3, 3])
+        self.assertEqual(rollups[1].bucket_start,
+            self.now + datetime.timedelta(minutes=1))
+        self.assertEqual(rollups[1].rotations_min, 3)
+        self.assertEqual(rollups[1].rotations_max, 5)
+        self.assertAlmostEqual(rollups[1].motor_speed_mean, 204)
+
+        rollups = self.backend.rollup_orrery_status_history(
+            self.now - datetime.timedelta(seconds=60),
+            self.now + datetime.timedelta(minutes=2),
+            50
+        )
+        self.assertEqual([x.count for x in rollups], [2, 3, 1])
+        self.assertEqual(
+            [x.bucket_start for x in rollups],
+            [
+                self.now + datetime.timedelta(seconds=x)
+                for x in [-10, 40, 90]
+            ]
+        )
+        self.assertEqual(rollups[1].rotations_min, 2)
+        self.assertEqual(rollups[1].rotations_max, 4)
+        self.assertAlmostEqual(rollups[1].motor_draw_mean, 100)
+        self.assertAlmostEqual(rollups[2].motor_speed_mean, 205)
+
+        self.backend.delete_orrery_status_history()
+        self.assertEqual(
+            self.backend.read_orrery_status_history(
+                self.now,
+                self.now + datetime.timedelta(minutes=2)
+            ),
+            []
+        )
+
+    def test_stream_history(self):
+        statuses = [
+            models.OrreryStatus(200 + x, 100, x, self.today,
+                self.now + datetime.timedelta(seconds=x))
+            for x in range(7)
+        ]
+        self.backend.create_orrery_status_history(statuses)
+
+        streamed = self.backend.stream_orrery_status_history(
+            statuses[1].update_datetime,
+            statuses[6].update_datetime,
+            2
+        )
+        self.assertEqual(list(streamed), statuses[1:6])
+
+    def test_ingest_batch(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        current = models.OrreryStatus(400, 17.5, 100, yesterday, self.now)
+        self.backend.create_orrery_status(current)
+
+        older = [
+            models.OrreryStatus(300, 10, x, self.today,
+                self.now - datetime.timedelta(seconds=10 - x))
+            for x in range(3)
+        ]
+        self.assertEqual(self.backend.ingest_orrery_status_batch(older),
+            current)
+
+        newer = [
+            models.OrreryStatus(300, 10, x, self.today,
+                self.now + datetime.timedelta(seconds=x + 1))
+            for x in range(3)
+        ]
+        stored_status = self.backend.ingest_orrery_status_batch(newer)
+        self.assertEqual(
+            stored_status,
+            newer[-1]._replace(start_date=yesterday)
+        )
+
+        history = self.backend.read_orrery_status_history(
+            self.now - datetime.timedelta(minutes=1),
+            self.now + datetime.timedelta(minutes=1)
+        )
+        self.assertEqual(len(history), 6)
+        self.assertTrue(all(x.start_date == yesterday for x in history))
+
+    def test_config(self):
+        self.assertEqual(self.backend.read_orrery_config(), None)
+        self.assertFalse(self.backend.check_orrery_config_table())
+
+        orig_config = models.OrreryConfig(400, True)
+        new_config = models.OrreryConfig(401, False)
+        self.backend.create_orrery_config(orig_config)
+        self.assertEqual(self.backend.read_orrery_config(), orig_config)
+        self.assertTrue(self.backend.check_orrery_config_table())
+
+        self.backend.update_orrery_config(new_config)
+        self.assertEqual(self.backend.read_orrery_config(), new_config)
+
+        with self.assertRaises(models.DuplicateEntryError):
+            self.backend.create_orrery_config(orig_config)
+        self.assertEqual(self.backend.read_orrery_config(), new_config)
+
+    def test_initialize(self):
+        self.backend.initalize_database()
+        self.backend.initalize_database()
+        self.assertEqual(
+            self.backend.read_orrery_config(),
+            models.OrreryConfig(
+                config.DEFAULT_ORRERY_CONFIG_SPEED,
+                config.DEFAULT_RELAY_STATUS
+            )
+        )
+
+    def test_config_and_status(self):
+        test_status = models.OrreryStatus(400, 17.5, 100, self.today, self.now)
+        test_config = models.OrreryConfig(400, True)
+        self.backend.create_orrery_status(test_status)
+        self.backend.create_orrery_config(test_config)
+        self.assertEqual(
+            self.backend.get_orrery_config_and_status(),
+            (test_config, test_status)
+        )
+
+    def test_fleet(self):
+        first_status = models.OrreryStatus(400, 17.5, 100, self.today, self.now)
+        second_status = models.OrreryStatus(500, 18.5, 7, self.today, self.now)
+        self.backend.create_orrery_status(first_status, 1)
+        self.backend.upsert_orrery_status(second_status, 2)
+        self.backend.create_orrery_config(models.OrreryConfig(400, True), 1)
+        self.backend.create_orrery_config(models.OrreryConfig(500, False), 2)
+
+        self.assertEqual(self.backend.read_orrery_status(1), first_status)
+        self.assertEqual(self.backend.read_orrery_status(2), second_status)
+        self.assertEqual(self.backend.read_orrery_status(3), None)
+        self.assertEqual(
+            self.backend.get_orrery_config_and_status(2),
+            (models.OrreryConfig(500, False), second_status)
+        )
+
+        samples = [
+            (x % 2 + 1, models.OrreryStatus(200, 100, x, self.today,
+                self.now + datetime.timedelta(seconds=x)))
+            for x in range(6)
+        ]
+        self.backend.create_fleet_status_history(samples)
+        history = self.backend.read_orrery_status_history(
+            self.now,
+            self.now + datetime.timedelta(minutes=1),
+            2
+        )
+        self.assertEqual([x.rotations for x in history], [1, 3, 5])
+
+        self.backend.delete_orrery_status(2)
+        self.backend.delete_orrery_status_history(2)
+        self.backend.delete_orrery_config(2)
+        self.assertEqual(self.backend.read_orrery_status(1), first_status)
+        self.assertEqual(self.backend.read_orrery_status(2), None)
+        self.assertEqual(self.backend.read_orrery_config(2), None)
+        self.assertEqual(
+            len(self.backend.read_orrery_status_history(
+                self.now,
+                self.now + datetime.timedelta(minutes=1),
+                1
+            )),
+            3
+        )
+
+    def test_maintenance(self):
+        hour_start = datetime.datetime(2013, 2, 13, 10)
+        recent = hour_start + datetime.timedelta(days=39)
+        expired = hour_start - datetime.timedelta(days=400)
+        samples = [
+            (x % 2 + 1, models.OrreryStatus(200 + x, 100, x, self.today,
+                hour_start + datetime.timedelta(minutes=x)))
+            for x in range(6)
+        ]
+        samples.append((1, models.OrreryStatus(0, 0, 0, self.today, recent)))
+        samples.append((1, models.OrreryStatus(0, 0, 0, self.today, expired)))
+        self.backend.create_fleet_status_history(samples)
+
+        maintenance_time = hour_start + datetime.timedelta(days=40)
+        result = self.backend.maintain_orrery_status_history(maintenance_time)
+        self.assertEqual(result.rollups_written, 2)
+
+        history = self.backend.read_orrery_status_history(
+            expired,
+            maintenance_time
+        )
+        self.assertEqual([x.update_datetime for x in history], [recent])
+        compacted = self.backend.read_compacted_orrery_status_history(
+            expired,
+            maintenance_time
+        )
+        self.assertEqual(len(compacted), 1)
+        self.assertEqual(compacted[0].bucket_start, hour_start)
+        self.assertEqual(compacted[0].count, 3)
+        self.assertEqual(compacted[0].rotations_max, 4)
+        self.assertAlmostEqual(compacted[0].motor_speed_mean, 202)
+
+        result = self.backend.maintain_orrery_status_history(maintenance_time)
+        self.assertEqual(result.rollups_written, 0)
+
+        self.backend.delete_orrery_status_history(2)
+        for (orrery_id, num_compacted) in [(1, 1), (2, 0)]:
+            compacted = self.backend.read_compacted_orrery_status_history(
+                expired,
+                maintenance_time,
+                orrery_id
+            )
+            self.assertEqual(len(compacted), num_compacted)
+
+    def test_concurrent_upserts(self):
+        def report(thread_num):
+            for x in range(50):
+                self.backend.upsert_orrery_status(models.OrreryStatus(
+                    thread_num, 0, x, self.today, self.now
+                ))
+
+        threads = [
+            threading.Thread(target=report, args=(x,)) for x in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.backend.read_orrery_status().rotations, 49)
+
+
+class TestMemoryStorage(StorageBackendTests, unittest.TestCase):
+    """Test the in-memory storage backend."""
+
+    def create_backend(self):
+        return memory_storage.MemoryStorage()
+
+
+class TestSqliteStorage(StorageBackendTests, unittest.TestCase):
+    """Test the SQLite storage backend."""
+
+    def create_backend(self):
+        self.temp_dir = tempfile.mkdtemp()
+        return sqlite_storage.SqliteStorage(
+            os.path.join(self.temp_dir, "orrery.db"),
+            30
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_migrate_config(self):
+        conn = self.backend.get_connection()
+        conn.execute("DROP TABLE system_config")
+        conn.execute("CREATE TABLE system_config (motor_speed REAL, "
+            "relay_enabled BOOLEAN)")
+        conn.execute("INSERT INTO system_config VALUES (100, 0)")
+        conn.execute("INSERT INTO system_config VALUES (200, 1)")
+
+        self.backend.initalize_database()
+        self.assertEqual(self.backend.read_orrery_config(),
+            models.OrreryConfig(200, True))
+        with self.assertRaises(Exception):
+            self.backend.create_orrery_config(models.OrreryConfig(300, True))
+
+    def test_wal(self):
+        conn = self.backend.get_connection()
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchall()[0][0]
+        self.assertEqual(journal_mode, "wal")
+
+
+class TestStorageSelection(unittest.TestCase):
+    """Test selecting the storage backend through config."""
+
+    def setUp(self):
+        self.original_backend = config.STORAGE_BACKEND
+
+    def tearDown(self):
+        config.STORAGE_BACKEND = self.original_backend
+
+    def test_select(self):
+        config.STORAGE_BACKEND = "memory"
+        backend = models.get_storage_backend()
+        self.assertEqual(backend.name, "memory")
+        self.assertTrue(models.get_storage_backend() is backend)
+
+        models.delete_orrery_config()
+        models.create_orrery_config(models.OrreryConfig(12, False))
+        self.assertEqual(backend.read_orrery_config(),
+            models.OrreryConfig(12, False))
+
+        config.STORAGE_BACKEND = "postgres"
+        self.assertEqual(models.get_storage_backend().name, "postgres")
+
+    def test_unknown(self):
+        config.STORAGE_BACKEND = "punch cards"
+        with self.assertRaises(ValueError):
+            models.get_storage_backend()
+
+
+if __name__ == "__main__":
+    unittest.main()